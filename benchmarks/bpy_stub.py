@@ -0,0 +1,215 @@
+"""Minimal stand-in for the parts of bpy the lipsync pipeline touches, so it can be benchmarked with a regular Python interpreter.
+
+Only enough of the API is provided to import the addon and to run FrameData, build_viseme_keyframes and write_viseme_keyframes. Keyframe points are stored in NumPy arrays, so keyframe writing measures the addon's own work rather than Blender's F-curve code.
+"""
+import sys
+import types
+
+import numpy as np
+
+class KeyframePoints:
+    ATTRIBUTES = {"co": (2, np.float32), "handle_left": (2, np.float32), "handle_right": (2, np.float32), "handle_left_type": (1, np.int32), "handle_right_type": (1, np.int32), "interpolation": (1, np.int32), "easing": (1, np.int32), "type": (1, np.int32)}
+    """Width and type of each attribute that can be read and written with foreach_get and foreach_set."""
+
+    INTERPOLATION_BEZIER = 2
+    """Value of 'BEZIER' in the interpolation enum, the default of new keyframe points."""
+
+    def __init__(self):
+        # Each attribute is an (n, width) matrix, e.g. co holds the keyframe coordinates
+        for attribute, (width, dtype) in self.ATTRIBUTES.items():
+            setattr(self, attribute, np.empty((0, width), dtype=dtype))
+
+    def __len__(self):
+        return len(self.co)
+
+    def __getitem__(self, index):
+        return index
+
+    def add(self, count):
+        for attribute, (width, dtype) in self.ATTRIBUTES.items():
+            padding = np.full((count, width), self.INTERPOLATION_BEZIER if attribute == "interpolation" else 0, dtype=dtype)
+            setattr(self, attribute, np.concatenate((getattr(self, attribute), padding)))
+
+    def remove(self, index, fast = False):
+        for attribute in self.ATTRIBUTES:
+            setattr(self, attribute, np.delete(getattr(self, attribute), index, axis=0))
+
+    def clear(self):
+        for attribute in self.ATTRIBUTES:
+            setattr(self, attribute, getattr(self, attribute)[:0])
+
+    def foreach_get(self, attribute, values):
+        values[:] = getattr(self, attribute).ravel()
+
+    def foreach_set(self, attribute, values):
+        width, dtype = self.ATTRIBUTES[attribute]
+        getattr(self, attribute)[:] = np.asarray(values, dtype=dtype).reshape(-1, width)
+
+class FCurve:
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self.keyframe_points = KeyframePoints()
+
+    def update(self):
+        order = np.argsort(self.keyframe_points.co[:, 0], kind="stable")
+        for attribute in KeyframePoints.ATTRIBUTES:
+            setattr(self.keyframe_points, attribute, getattr(self.keyframe_points, attribute)[order])
+
+class FCurves(list):
+    def find(self, data_path):
+        return next((fcurve for fcurve in self if fcurve.data_path == data_path), None)
+
+    def new(self, data_path):
+        fcurve = FCurve(data_path)
+        self.append(fcurve)
+        return fcurve
+
+class Action:
+    def __init__(self, name):
+        self.name = name
+        self.fcurves = FCurves()
+        self.users = 1
+
+class AnimationData:
+    def __init__(self):
+        self.action = None
+
+class Collection(list):
+    """CollectionProperty stand-in. Items are plain namespaces holding the property defaults."""
+
+    def __init__(self, **defaults):
+        super().__init__()
+        self.defaults = defaults
+
+    def add(self):
+        item = types.SimpleNamespace(**self.defaults)
+        self.append(item)
+        return item
+
+    def remove(self, index):
+        del self[index]
+
+    def clear(self):
+        del self[:]
+
+class IDCollection(dict):
+    """bpy.data collection stand-in, keyed by datablock name. Iterating yields the datablocks, like Blender does."""
+
+    def __init__(self, factory = None):
+        super().__init__()
+        self.factory = factory
+
+    def __iter__(self):
+        return iter(list(self.values()))
+
+    def new(self, name):
+        item = self.factory(name)
+        self[name] = item
+        return item
+
+    def remove(self, item):
+        self.pop(item.name, None)
+
+class KeyBlocks(list):
+    def get(self, name, default = None):
+        return next((shape for shape in self if shape.name == name), default)
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+class ShapeKey:
+    def __init__(self, key, name):
+        self.id_data = key
+        self.name = name
+        self.value = 0.0
+        self.slider_min = 0.0
+        self.slider_max = 1.0
+
+    def path_from_id(self, attribute):
+        return f'key_blocks["{self.name}"].{attribute}'
+
+    def keyframe_insert(self, data_path, frame):
+        fcurve = shapekey_fcurve(self)
+        fcurve.keyframe_points.add(1)
+        fcurve.keyframe_points.co[-1] = (frame, self.value)
+        fcurve.update()
+
+class Key:
+    def __init__(self, name, shapekey_names):
+        self.name = name
+        self.animation_data = None
+        self.key_blocks = KeyBlocks(ShapeKey(self, shapekey_name) for shapekey_name in ["Basis"] + list(shapekey_names))
+        self.reference_key = self.key_blocks[0]
+        self.lipsync_apply_records = Collection(clip="", shapekey="", signature="", start_frame=0, first_frame=0.0, last_frame=0.0)
+        DATA.shape_keys[name] = self
+
+    def animation_data_create(self):
+        self.animation_data = AnimationData()
+        return self.animation_data
+
+class Mesh:
+    def __init__(self, name, shapekey_names):
+        self.name = name
+        self.shape_keys = Key(name + "Key", shapekey_names)
+        self.viseme_mappings = Collection(viseme="", shapekey="", weight=1.0)
+        DATA.meshes[name] = self
+
+class Scene:
+    def __init__(self, fps, resample_mode = "NEAREST", simplify_tolerance = 0.0, use_bulk_keyframes = True):
+        self.render = types.SimpleNamespace(fps=fps, fps_base=1.0)
+        self.resample_mode = resample_mode
+        self.simplify_tolerance = simplify_tolerance
+        self.use_bulk_keyframes = use_bulk_keyframes
+        self.use_incremental_apply = False
+        self.lipsync_targets = Collection(mesh=None)
+        self.lipsync_smoothing = types.SimpleNamespace(enabled=False)
+
+DATA = types.SimpleNamespace(actions=IDCollection(Action), meshes=IDCollection(), shape_keys=IDCollection())
+"""bpy.data stand-in. Meshes and Keys register themselves by name when they are created, replacing any earlier one with the same name."""
+
+def shapekey_fcurve(shape):
+    key = shape.id_data
+    if (key.animation_data is None):
+        key.animation_data_create()
+    if (key.animation_data.action is None):
+        key.animation_data.action = DATA.actions.new(key.name + "Action")
+    data_path = shape.path_from_id("value")
+    return key.animation_data.action.fcurves.find(data_path) or key.animation_data.action.fcurves.new(data_path)
+
+def install():
+    """Registers the stub as the bpy and bpy_extras modules. Must be called before the addon is imported."""
+    bpy = types.ModuleType("bpy")
+    bpy.types = types.SimpleNamespace(
+        Operator=type("Operator", (), {}),
+        Panel=type("Panel", (), {}),
+        PropertyGroup=type("PropertyGroup", (), {}),
+        Mesh=Mesh,
+        Key=Key,
+        Scene=Scene)
+    bpy.props = types.ModuleType("bpy.props")
+    for name in ("PointerProperty", "StringProperty", "IntProperty", "FloatProperty", "EnumProperty", "BoolProperty", "CollectionProperty"):
+        setattr(bpy.props, name, lambda *args, **kwargs: None)
+    bpy.app = types.ModuleType("bpy.app")
+    bpy.app.handlers = types.ModuleType("bpy.app.handlers")
+    bpy.app.handlers.persistent = lambda function: function
+    bpy.app.handlers.load_post = []
+    bpy.app.handlers.load_pre = []
+    bpy.app.handlers.frame_change_pre = []
+    bpy.data = DATA
+    bpy.utils = types.SimpleNamespace(user_resource=lambda *args, **kwargs: None)
+    bpy.path = types.SimpleNamespace(abspath=lambda path: path)
+
+    bpy_extras = types.ModuleType("bpy_extras")
+    bpy_extras.io_utils = types.ModuleType("bpy_extras.io_utils")
+    bpy_extras.io_utils.ImportHelper = type("ImportHelper", (), {})
+    bpy_extras.io_utils.ExportHelper = type("ExportHelper", (), {})
+
+    sys.modules.update({
+        "bpy": bpy,
+        "bpy.props": bpy.props,
+        "bpy.app": bpy.app,
+        "bpy.app.handlers": bpy.app.handlers,
+        "bpy_extras": bpy_extras,
+        "bpy_extras.io_utils": bpy_extras.io_utils,
+    })
+    return bpy
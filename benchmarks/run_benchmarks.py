@@ -0,0 +1,265 @@
+"""Benchmarks the parse -> resample -> keyframe pipeline on synthetic ProcessWAV output, outside of Blender.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --long --save-baseline benchmarks/baselines/local.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baselines/reference.json
+
+Three stages are measured for each case:
+- parse: FrameData.get_viseme_values on a ProcessWAV output file
+- build: build_viseme_keyframes, which resamples to the scene frame rate and maps visemes to shapekeys
+- write: write_viseme_keyframes onto stub shapekey F-curves
+
+Each stage reports its best time over --repeat runs, throughput in viseme frames per second, peak memory traced during one extra run, and the number of keyframes it produced.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_FOLDER))
+
+import bpy_stub
+bpy_stub.install()
+import ovr_lipsync_release as addon
+
+BASELINE_VERSION = 1
+"""Version of the baseline JSON layout. Bump this whenever the layout changes."""
+
+DURATIONS = [10, 60, 600, 3600]
+"""Clip lengths in seconds benchmarked by default."""
+
+LONG_DURATIONS = [3 * 3600]
+"""Additional clip lengths in seconds benchmarked with --long."""
+
+SCENE_FPS = [24, 60]
+"""Scene frame rates benchmarked for the build and write stages."""
+
+MESH_COUNTS = [1, 4]
+"""Numbers of target meshes benchmarked for the build and write stages."""
+
+DEFAULT_REGRESSION_THRESHOLD = 0.25
+"""Fraction a stage may get slower than its baseline before --compare reports it."""
+
+def write_processwav_output(output_file_path, duration, frame_rate = addon.VISEME_FPS, seed = 0):
+    """Writes a synthetic viseme output file in the format produced by ProcessWAV. Rows are written in blocks, so hour long files do not need to be held in memory.
+
+    Args:
+        output_file_path (str): Path to output file
+        duration (float): Length of the clip in seconds
+        frame_rate (float, optional): Viseme frames per second. Defaults to VISEME_FPS.
+        seed (int, optional): Random seed, so files are the same between runs. Defaults to 0.
+    """
+    names = addon.analyzer.VISEME_NAMES
+    frame_count = int(duration * frame_rate)
+    random = np.random.default_rng(seed)
+    with open(output_file_path, "w") as f:
+        f.write("OVRLipSync ProcessWAV\n")
+        f.write(f"Frame rate: {frame_rate}\n")
+        f.write("Visemes:" + ";".join(names) + "\n")
+        f.write(f"Frames: {frame_count}\n")
+        f.write("\n")
+        block_size = 100000
+        for first in range(0, frame_count, block_size):
+            count = min(block_size, frame_count - first)
+            # Smooth, row-normalized values look like speech rather than noise to the simplifier
+            values = np.cumsum(random.normal(0.0, 0.05, (count, len(names))), axis=0)
+            values = np.exp(np.sin(values))
+            values /= values.sum(axis=1, keepdims=True)
+            rows = "\n".join(";".join(f"{value:.6f}" for value in row) for row in values)
+            f.write(rows + ("\n" if first + count < frame_count else ""))
+
+def synthetic_output_file(data_folder, duration):
+    """Gets the path of the synthetic output file for a clip length, generating it the first time.
+
+    Args:
+        data_folder (str): Folder synthetic files are kept in
+        duration (float): Length of the clip in seconds
+
+    Returns:
+        str: Path to output file
+    """
+    output_file_path = os.path.join(data_folder, f"visemes_{duration}s.txt")
+    if not (os.path.exists(output_file_path)):
+        print(f"Generating {duration}s of synthetic viseme output...")
+        write_processwav_output(output_file_path + ".tmp", duration)
+        os.replace(output_file_path + ".tmp", output_file_path)
+    return output_file_path
+
+def make_meshes(count):
+    """Builds stub meshes with every standard viseme mapped to its own shapekey.
+
+    Args:
+        count (int): Number of meshes
+
+    Returns:
+        list(bpy_stub.Mesh): Meshes
+    """
+    meshes = []
+    for index in range(count):
+        mesh = bpy_stub.Mesh(f"Mesh{index}", ["vrc.v_" + viseme for viseme in addon.MAPPED_VISEMES])
+        addon.set_viseme_mapping(mesh, {viseme: "vrc.v_" + viseme for viseme in addon.MAPPED_VISEMES})
+        meshes.append(mesh)
+    return meshes
+
+def measure(function, setup, repeat):
+    """Times a function and traces its peak memory use.
+
+    Args:
+        function (callable): Called with the result of setup
+        setup (callable): Called before each run to build fresh inputs, outside of the timed section
+        repeat (int): Number of timed runs
+
+    Returns:
+        tuple(float, int, object): A tuple containing 1. the best time in seconds, 2. the peak traced memory in bytes and 3. the result of the last run
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        argument = setup()
+        start = time.perf_counter()
+        result = function(argument)
+        best = min(best, time.perf_counter() - start)
+    argument = setup()
+    tracemalloc.start()
+    try:
+        result = function(argument)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (best, peak, result)
+
+def stage_result(stage, case, parameters, seconds, peak, viseme_frames, key_count):
+    return dict(
+        stage=stage,
+        case=case,
+        **parameters,
+        seconds=seconds,
+        frames_per_second=viseme_frames / seconds if seconds > 0 else float("inf"),
+        peak_memory_bytes=peak,
+        keyframes=key_count)
+
+def run_benchmarks(durations, scene_fps_list, mesh_counts, data_folder, repeat, resample_mode, simplify_tolerance):
+    """Runs every benchmark case.
+
+    Args:
+        durations (list(float)): Clip lengths in seconds
+        scene_fps_list (list(int)): Scene frame rates
+        mesh_counts (list(int)): Numbers of target meshes
+        data_folder (str): Folder synthetic files are kept in
+        repeat (int): Number of timed runs per stage
+        resample_mode (str): Resampling mode, one of RESAMPLE_MODES
+        simplify_tolerance (float): Keyframe simplification tolerance
+
+    Returns:
+        list(dict): One result per stage and case
+    """
+    results = []
+    for duration in durations:
+        output_file_path = synthetic_output_file(data_folder, duration)
+        seconds, peak, (names, frames) = measure(lambda _: addon.FrameData().get_viseme_values(output_file_path), lambda: None, repeat)
+        results.append(stage_result("parse", f"{duration}s", {"duration": duration}, seconds, peak, len(frames), 0))
+        print(f"parse {duration}s: {seconds:.3f}s")
+
+        frame_data = addon.FrameData()
+        frame_data.names = names
+        frame_data.name_index = {name: index for index, name in enumerate(names)}
+        frame_data.frames = frames
+        for scene_fps in scene_fps_list:
+            for mesh_count in mesh_counts:
+                case = f"{duration}s@{scene_fps}fps x{mesh_count}"
+                parameters = {"duration": duration, "scene_fps": scene_fps, "meshes": mesh_count}
+                scene = bpy_stub.Scene(scene_fps, resample_mode, simplify_tolerance)
+                meshes = make_meshes(mesh_count)
+                seconds, peak, (keyframes, _) = measure(lambda _: addon.build_viseme_keyframes(scene, meshes, frame_data, addon.VISEME_FPS, 0), lambda: None, repeat)
+                key_count = sum(len(frames) for _, frames, _ in keyframes)
+                results.append(stage_result("build", case, parameters, seconds, peak, len(frame_data.frames), key_count))
+
+                # Every write starts from empty F-curves on fresh meshes
+                def write_setup():
+                    fresh_meshes = make_meshes(mesh_count)
+                    return addon.build_viseme_keyframes(scene, fresh_meshes, frame_data, addon.VISEME_FPS, 0)[0]
+                seconds, peak, (written, _) = measure(lambda keyframes: addon.write_viseme_keyframes(scene, keyframes), write_setup, repeat)
+                results.append(stage_result("write", case, parameters, seconds, peak, len(frame_data.frames), written))
+                print(f"build/write {case}: {results[-2]['seconds']:.3f}s / {seconds:.3f}s, {written} keyframes")
+    return results
+
+def compare_results(results, baseline, threshold):
+    """Finds stages that got slower than a baseline.
+
+    Args:
+        results (list(dict)): Results from run_benchmarks
+        baseline (dict): Baseline JSON, as saved with --save-baseline
+        threshold (float): Fraction a stage may get slower before it counts as a regression
+
+    Returns:
+        list(str): Description of each regression
+    """
+    baseline_seconds = {(result["stage"], result["case"]): result["seconds"] for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline_seconds.get((result["stage"], result["case"]))
+        if (previous and result["seconds"] > previous * (1.0 + threshold)):
+            regressions.append(f"{result['stage']} {result['case']}: {result['seconds']:.3f}s, was {previous:.3f}s ({result['seconds'] / previous:.2f}x)")
+    return regressions
+
+def main(argv = None):
+    """Runs the benchmarks from the command line.
+
+    Args:
+        argv (list(str), optional): Arguments. Defaults to None, which reads them from sys.argv.
+
+    Returns:
+        int: 0 on success, 1 if --compare found a regression
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks the parse -> resample -> keyframe pipeline on synthetic ProcessWAV output.")
+    parser.add_argument("--duration", dest="durations", action="append", type=int, metavar="SECONDS", help="Clip length to benchmark. Can be repeated. Defaults to 10s, 1min, 10min and 1h")
+    parser.add_argument("--long", action="store_true", help="Also benchmarks a 3 hour clip")
+    parser.add_argument("--fps", dest="scene_fps", action="append", type=int, help="Scene frame rate to benchmark. Can be repeated. Defaults to 24 and 60")
+    parser.add_argument("--meshes", dest="mesh_counts", action="append", type=int, help="Number of target meshes to benchmark. Can be repeated. Defaults to 1 and 4")
+    parser.add_argument("--resample", default="NEAREST", choices=[item[0] for item in addon.RESAMPLE_MODES], help="Resampling mode")
+    parser.add_argument("--simplify", type=float, default=0.0, help="Keyframe simplification tolerance")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per stage. The best is reported")
+    parser.add_argument("--data-dir", help="Folder synthetic output files are generated in and reused from. Defaults to a folder in the system temp folder")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Writes the results to a baseline JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="Baseline JSON file to compare the results against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_REGRESSION_THRESHOLD, help="Fraction a stage may get slower than the baseline before it is reported")
+    args = parser.parse_args(argv)
+
+    durations = args.durations or DURATIONS + (LONG_DURATIONS if args.long else [])
+    data_folder = args.data_dir or os.path.join(tempfile.gettempdir(), "ovr_lipsync_benchmarks")
+    os.makedirs(data_folder, exist_ok=True)
+    results = run_benchmarks(durations, args.scene_fps or SCENE_FPS, args.mesh_counts or MESH_COUNTS, data_folder, args.repeat, args.resample, args.simplify)
+
+    report = {
+        "version": BASELINE_VERSION,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "resample_mode": args.resample,
+        "simplify_tolerance": args.simplify,
+        "results": results,
+    }
+    if (args.save_baseline):
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.save_baseline}")
+    if (args.compare):
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if (regressions):
+            return 1
+        print(f"No stage is more than {args.threshold:.0%} slower than {args.compare}")
+    return 0
+
+if (__name__ == "__main__"):
+    sys.exit(main())
@@ -6,274 +6,2632 @@ bl_info = {
     "blender" : (4, 0, 2),
     "location" : "3D View > Sidebar > OVR Lipsync",
     "doc_url" : "https://github.com/N1nDr0id/ovr-lipsync-blender",
-    "warning" : "This addon only works with mono .wav files.",
+    "warning" : "This addon only works with .wav files.",
     "category" : "3D View"
 }
 
 import bpy
-from bpy.props import PointerProperty, StringProperty, IntProperty, EnumProperty
-from bpy_extras.io_utils import ImportHelper
+from bpy.props import PointerProperty, StringProperty, IntProperty, FloatProperty, EnumProperty, BoolProperty, CollectionProperty
+from bpy.app.handlers import persistent
+from bpy_extras.io_utils import ImportHelper, ExportHelper
+import numpy as np
 import os
 import subprocess
+import time
+import hashlib
+import cProfile
+import csv
+import json
+import tempfile
+import threading
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from . import analyzer, audio, smoothing, tracks
+
+PROCESSWAV_PATH = os.path.join(os.path.dirname(__file__), "ProcessWAV.exe")
+"""Path to the ProcessWAV executable used to generate viseme values."""
+
+MAPPED_VISEMES = ["aa", "ch", "dd", "e", "ff", "ih", "kk", "nn", "oh", "ou", "pp", "rr", "ss", "th"]
+"""Standard Oculus visemes, in lowercase. Add Default Mappings creates a mapping for each of these, but any viseme column can be mapped."""
+
+VISEME_HEADER_LINES = 5
+"""Number of header lines at the start of a viseme output file."""
+
+VISEME_FPS = 100
+"""Frame rate viseme values are generated at before being resampled to the scene frame rate."""
+
+MODAL_TIMER_INTERVAL = 0.05
+"""Seconds between updates of a running Apply Keyframes operator."""
+
+MODAL_TIME_SLICE = 0.03
+"""Seconds of keyframe writing done per update of a running Apply Keyframes operator, so the UI stays responsive."""
+
+KEYFRAME_CHUNK_SIZE = 250
+"""Number of keyframes written per chunk when inserting keyframes one at a time in a running Apply Keyframes operator."""
+
+INTERPOLATION_LINEAR = 1
+"""Value of 'LINEAR' in the interpolation enum of keyframe points, as read and written by foreach_get and foreach_set."""
+
+CACHE_FORMAT_VERSION = 1
+"""Version of the cached viseme file format. Bump this to invalidate all existing cache entries."""
+
+RESAMPLE_MODES = [
+    ("NEAREST", "Nearest", "Picks the closest preceding viseme frame for each scene frame"),
+    ("LINEAR", "Linear", "Linearly interpolates between the two closest viseme frames"),
+    ("AREA", "Box Filter", "Averages all viseme frames covered by each scene frame"),
+    ("PEAK", "Peak Hold", "Keeps the highest value of all viseme frames covered by each scene frame. Preserves short visemes such as PP and FF"),
+]
+"""Resampling modes used when converting viseme frames to scene frames, in EnumProperty item format."""
+
+TRACK_QUANTIZATION_ITEMS = [
+    ("8", "8-bit", "Stores each key value in one byte. Steps of about 0.004 are invisible on most faces"),
+    ("16", "16-bit", "Stores each key value in two bytes"),
+]
+"""Value sizes for exported track files, in EnumProperty item format."""
+
+SMOOTHING_MODE_ITEMS = [
+    ("NONE", "None", "Keeps viseme values as they are"),
+    ("EXPONENTIAL", "Exponential", "Averages neighbouring frames with weights that fall off exponentially. Keeps sharp peaks better than Gaussian"),
+    ("GAUSSIAN", "Gaussian", "Averages neighbouring frames with Gaussian weights. Gives the softest curves"),
+]
+"""Smoothing filters applied to viseme values before keyframing, in EnumProperty item format."""
+
+def resampled_frame_count(frame_count, source_fps, target_fps):
+    """Gets the number of frames a clip has after resampling it to another frame rate. Consecutive clips are placed this many frames apart.
+
+    Args:
+        frame_count (int): Number of frames at the source frame rate
+        source_fps (float): Frame rate the frames were generated at
+        target_fps (float): Frame rate the frames are resampled to
+
+    Returns:
+        int: Number of whole target frames covered by the clip
+    """
+    # Dividing by the ratio can land just below a whole number, e.g. 1000 frames at 100 -> 24 fps gives 239.99999999999997
+    return int(np.floor(frame_count * float(target_fps) / float(source_fps) + 1e-9))
 
 class FrameData:
     def __init__(self):
         self.names = []
         """List of viseme names for this instance of FrameData."""
 
-        self.frames = []
-        """List of frames for this instance of FrameData. Each frame is a list containining floats that represent viseme values for said frame.
+        self.name_index = {}
+        """Dictionary mapping each viseme name to its column in the frames matrix."""
+
+        self.frames = np.empty((0, 0), dtype=np.float32)
+        """Contiguous (n_frames, n_visemes) float32 matrix of viseme values for this instance of FrameData. Each row holds the viseme values for one frame.
         
-        Refer to this object's names list (this_object.names) for which viseme corresponds to which index."""
+        Refer to this object's names list (this_object.names) or name_index dictionary (this_object.name_index) for which viseme corresponds to which column."""
 
-    # Initializes names and frames lists with appropriate values from output file
+    # Initializes names and frames with appropriate values from output file
     def get_viseme_values(self, text_file_path):
-        """Initializes names and frames lists with appropriate values from output file. Only to be used within from_wav_file.
+        """Initializes names and frames with appropriate values from output file. Only to be used within from_wav_file.
 
         Args:
             text_file_path (str): Path to text file
 
         Returns:
-            tuple(list(str), list(list(float))): A tuple containing 1. the list of viseme names and 2. a list of float lists representing viseme values for each frame
+            tuple(list(str), numpy.ndarray): A tuple containing 1. the list of viseme names and 2. a (n_frames, n_visemes) float32 matrix of viseme values for each frame
         """
-        lines = None
         with open(text_file_path) as f:
-            lines = f.readlines()
-
-        # Everything before line 5 is simply header data for readability
-        frame_values = []
-        for line in lines[5:]:
-            if line:
-                frame_values.append([float(item.strip()) for item in line.split(";")])
-        names = [item.strip() for item in lines[2][8:].split(";")]
-        return (names, frame_values)
+            # Everything before line 5 is simply header data for readability
+            header = [f.readline() for _ in range(VISEME_HEADER_LINES)]
+            body = f.read()
+        names = parse_viseme_names(header)
+        return (names, parse_viseme_rows(body, len(names)))
 
-    def from_wav_file(self, wav_file_path, desired_frame_rate, output_file_path = "visemes_output.txt", keep_output_file = False):
+    def from_wav_file(self, wav_file_path, desired_frame_rate, output_file_path = None, keep_output_file = False, cache_folder = None, cache_size_limit = 0, start_time = None, end_time = None, backend = None, stats = None):
         """Processes .wav file into viseme values for distinct frames. Must be called before FrameData can be used.
 
         Args:
             wav_file_path (str): Path to input .wav file
             desired_frame_rate (int): Target frame rate for visemes
+            output_file_path (str, optional): Path ProcessWAV writes the viseme output file to. Defaults to None, which uses a private temporary folder.
             keep_output_file (bool, optional): Determines whether or not viseme output file should be kept. Defaults to False.
+            cache_folder (str, optional): Folder holding cached results. If given, a cached result for the same audio and frame rate is used instead of running ProcessWAV, and new results are added to the cache. Defaults to None.
+            cache_size_limit (int, optional): Largest total size of the cache folder in bytes. Least recently used results are removed when it is exceeded. 0 means no limit. Defaults to 0.
+            start_time (float, optional): Time in seconds to start processing at. Defaults to None, which starts at the beginning of the file.
+            end_time (float, optional): Time in seconds to stop processing at. Defaults to None, which stops at the end of the file.
+            backend (VisemeBackend, optional): Backend used to process the audio. Defaults to None, which uses get_viseme_backend("AUTO").
+            stats (ApplyStats, optional): Stats to record the analysis timers and frame count in. Defaults to None.
         """
-        visemes_file_name = output_file_path
+        if (backend is None):
+            backend = get_viseme_backend()
         wav_file_name = wav_file_path
         frame_rate = float(desired_frame_rate)
+        cache_file_path = None
+        if (cache_folder):
+            cache_file_path = frame_data_cache_path(cache_folder, wav_file_name, frame_rate, start_time, end_time, backend.version())
+            load_start = time.perf_counter()
+            if (self.load_cache_file(cache_file_path)):
+                print("Using cached viseme values.")
+                if (stats is not None):
+                    stats.cache_hit = True
+                    stats.parse_seconds = time.perf_counter() - load_start
+                    stats.add_frame_data(self, frame_rate)
+                return self
         print("Processing audio file...")
-        subprocess.check_call([os.path.dirname(__file__) + "\\ProcessWAV.exe", str(frame_rate), wav_file_name, visemes_file_name])
+        if (stats is not None):
+            stats.backend = type(backend).__name__
+        stream = backend.start(wav_file_name, frame_rate, output_file_path, keep_output_file, start_time, end_time)
+        try:
+            self.from_stream(stream, frame_rate, cache_file_path, cache_size_limit, stats)
+        finally:
+            stream.close()
         print("Done processing.")
-        self.names, self.frames = self.get_viseme_values(visemes_file_name)
-        if (not keep_output_file):
-            os.remove(visemes_file_name)
         return self
 
-    def get_frame_values(self, frame_index):
-        """Gets the viseme values at a given frame index.
+    def from_stream(self, stream, frame_rate, cache_file_path = None, cache_size_limit = 0, stats = None):
+        """Initializes FrameData from a running or finished analysis, collecting its results as they become available. Blocks until the analysis has finished.
+
+        Args:
+            stream (VisemeJob): Analysis started by VisemeBackend.start
+            frame_rate (float): Frame rate the analysis was started with
+            cache_file_path (str, optional): Path the result should be cached at, or None to skip caching. Defaults to None.
+            cache_size_limit (int, optional): Largest total size of the cache folder in bytes. 0 means no limit. Defaults to 0.
+            stats (ApplyStats, optional): Stats to record the analysis timers and frame count in. Defaults to None.
+        """
+        blocks = list(stream.iter_blocks())
+        self.names = stream.names
+        self.name_index = {name: index for index, name in enumerate(self.names)}
+        if (blocks):
+            self.frames = np.concatenate(blocks)
+        else:
+            self.frames = np.empty((0, len(self.names)), dtype=np.float32)
+        if (stats is not None):
+            stats.add_job(stream)
+            stats.add_frame_data(self, frame_rate)
+        if (cache_file_path):
+            self.add_to_cache(cache_file_path, cache_size_limit)
+        return self
+
+    def postprocess(self, settings, frame_rate):
+        """Runs the post-processing chain on the whole frame matrix: per-viseme gain and threshold, top viseme selection, attack and release, then smoothing.
+
+        Args:
+            settings (SmoothingSettings): Post-processing settings, e.g. scene.lipsync_smoothing
+            frame_rate (float): Frame rate the viseme values were generated at
+
+        Returns:
+            FrameData: New FrameData holding the processed values
+        """
+        columns = {name.lower(): index for index, name in enumerate(self.names)}
+        gains = np.ones(len(self.names), dtype=np.float32)
+        thresholds = np.zeros(len(self.names), dtype=np.float32)
+        for row in settings.viseme_gains:
+            column = columns.get(row.viseme.lower())
+            if (column is not None):
+                gains[column] = row.gain
+                thresholds[column] = row.threshold
+        result = FrameData()
+        result.names = list(self.names)
+        result.name_index = dict(self.name_index)
+        result.frames = smoothing.postprocess_visemes(self.frames, frame_rate, gains, thresholds, settings.top_count, settings.attack_time, settings.release_time, settings.smoothing_mode, settings.smoothing_time)
+        return result
+
+    def to_track(self, source_fps, target_fps = None, mode = "NEAREST", tolerance = 0.0):
+        """Converts viseme values to a track of sparse keys per viseme, without keyframing anything.
+
+        Args:
+            source_fps (float): Frame rate the viseme values were generated at
+            target_fps (float, optional): Frame rate of the track. Defaults to None, which keeps source_fps.
+            mode (str, optional): Resampling mode used if target_fps differs from source_fps, one of the identifiers in RESAMPLE_MODES. Defaults to "NEAREST".
+            tolerance (float, optional): Keys that can be reproduced from their neighbours within this value difference are dropped. Defaults to 0.0.
+
+        Returns:
+            tracks.VisemeTrack: Track holding a channel per viseme
+        """
+        frame_data = self
+        if (target_fps is None):
+            target_fps = source_fps
+        elif (float(target_fps) != float(source_fps)):
+            frame_data = self.resample(source_fps, target_fps, mode)
+        frames = np.arange(len(frame_data.frames), dtype=np.float64)
+        track = tracks.VisemeTrack(target_fps, len(frame_data.frames))
+        for column, name in enumerate(frame_data.names):
+            values = frame_data.frames[:, column]
+            kept = simplify_keyframes(frames, values, tolerance) if tolerance > 0.0 else np.arange(len(values))
+            track.channels.append(tracks.TrackChannel(name, kept, values[kept]))
+        return track
+
+    def add_to_cache(self, cache_file_path, cache_size_limit = 0):
+        """Saves names and frames to the cache and evicts least recently used results if the cache grows past its size limit.
+
+        Args:
+            cache_file_path (str): Path from frame_data_cache_path
+            cache_size_limit (int, optional): Largest total size of the cache folder in bytes. 0 means no limit. Defaults to 0.
+        """
+        self.save_cache_file(cache_file_path)
+        trim_frame_data_cache(os.path.dirname(cache_file_path), cache_size_limit)
+
+    def load_cache_file(self, cache_file_path):
+        """Loads names and frames from a cached .npz file and marks it as recently used.
+
+        Args:
+            cache_file_path (str): Path to cached .npz file
+
+        Returns:
+            bool: True if the cached file was loaded, False if it does not exist or could not be read
+        """
+        try:
+            with np.load(cache_file_path) as data:
+                names = [str(name) for name in data["names"]]
+                frames = np.ascontiguousarray(data["frames"], dtype=np.float32)
+        except (OSError, KeyError, ValueError):
+            return False
+        self.names, self.frames = names, frames
+        self.name_index = {name: index for index, name in enumerate(self.names)}
+        # Modification time doubles as the last use time for LRU eviction
+        os.utime(cache_file_path)
+        return True
+
+    def save_cache_file(self, cache_file_path):
+        """Saves names and frames to a .npz file so they can be loaded with load_cache_file.
+
+        Args:
+            cache_file_path (str): Path to cached .npz file
+        """
+        os.makedirs(os.path.dirname(cache_file_path), exist_ok=True)
+        temp_file_path = f"{cache_file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file_path, "wb") as f:
+            np.savez(f, names=np.array(self.names), frames=self.frames)
+        os.replace(temp_file_path, cache_file_path)
+
+    def resample(self, source_fps, target_fps, mode = "NEAREST"):
+        """Resamples the whole frame matrix from the viseme frame rate to a target frame rate.
+
+        Args:
+            source_fps (float): Frame rate the viseme values were generated at
+            target_fps (float): Desired frame rate, e.g. the scene frame rate. Fractional rates such as 29.97 are supported
+            mode (str, optional): Resampling mode, one of the identifiers in RESAMPLE_MODES. Defaults to "NEAREST".
+
+        Raises:
+            ValueError: Throws an error if mode is not a valid resampling mode
+
+        Returns:
+            FrameData: New FrameData holding one row per target frame
+        """
+        ratio = float(source_fps) / float(target_fps)
+        source_count = len(self.frames)
+        target_count = resampled_frame_count(source_count, source_fps, target_fps)
+        # Position of the start of each target frame in source frame units
+        positions = np.arange(target_count, dtype=np.float64) * ratio
+        frames = self.frames
+        if (target_count == 0):
+            resampled = np.empty((0, frames.shape[1]), dtype=np.float32)
+        elif (mode == "NEAREST"):
+            indices = np.minimum(positions.astype(np.intp), source_count - 1)
+            resampled = frames[indices]
+        elif (mode == "LINEAR"):
+            lower = np.minimum(positions.astype(np.intp), source_count - 1)
+            upper = np.minimum(lower + 1, source_count - 1)
+            weights = (positions - lower)[:, np.newaxis]
+            resampled = frames[lower] * (1.0 - weights) + frames[upper] * weights
+        elif (mode == "AREA"):
+            # Integrate the piecewise-constant source signal so that each target frame
+            # averages exactly the (possibly fractional) span of source frames it covers
+            integral = np.zeros((source_count + 1, frames.shape[1]), dtype=np.float64)
+            np.cumsum(frames, axis=0, out=integral[1:])
+            def integrate(x):
+                whole = np.minimum(x.astype(np.intp), source_count - 1)
+                return integral[whole] + (x - whole)[:, np.newaxis] * frames[whole]
+            ends = np.minimum(positions + ratio, source_count)
+            resampled = (integrate(ends) - integrate(positions)) / (ends - positions)[:, np.newaxis]
+        elif (mode == "PEAK"):
+            # Every source frame belongs to exactly one target frame, so short peaks are never skipped
+            starts = np.minimum(positions.astype(np.intp), source_count - 1)
+            end = min(int(np.ceil(target_count * ratio)), source_count)
+            resampled = np.maximum.reduceat(frames[:end], starts, axis=0)
+        else:
+            raise ValueError(f"Unknown resampling mode {mode}. Valid modes are {', '.join(item[0] for item in RESAMPLE_MODES)}")
+        result = FrameData()
+        result.names = list(self.names)
+        result.name_index = dict(self.name_index)
+        result.frames = np.ascontiguousarray(resampled, dtype=np.float32)
+        return result
+
+    def get_frame_values(self, frame_index):
+        """Gets the viseme values at a given frame index.
+
+        Args:
+            frame_index (int): Index of desired frame
+
+        Raises:
+            IndexError: Throws an error if frame_index is outside of valid range
+
+        Returns:
+            numpy.ndarray: View of the viseme values for the given frame
+        """
+        if ((frame_index < 0) or (frame_index >= len(self.frames))):
+            raise IndexError(f"Outside of valid frame range. Valid range is 0 to {len(self.frames) - 1}")
+        return self.frames[frame_index]
+
+    def print_frame(self, frame_index):
+        """Pretty print for a given frame. Prints out the viseme names and values for a given frame.
+
+        Args:
+            frame_index (int): Index of desired frame
+
+        Raises:
+            IndexError: Throws an error if frame_index is outside of valid range
+        """
+        if ((frame_index < 0) or (frame_index >= len(self.frames))):
+            raise IndexError(f"Outside of valid frame range. Valid range is 0 to {len(self.frames) - 1}")
+        frame = self.frames[frame_index]
+        for i in range(len(self.names)):
+            print(f"{self.names[i]}: {frame[i]}")
+
+class ApplyStats:
+    """Stage timers and counters for one apply. Shown in the Statistics panel and the operator report, and written to the JSON log."""
+
+    def __init__(self, clip = ""):
+        self.clip = clip
+        """Path to the applied .wav file."""
+
+        self.backend = ""
+        """Class name of the backend that processed the audio. Empty if the result came from the cache."""
+
+        self.cache_hit = False
+        """Whether viseme values were loaded from the cache instead of processing the audio."""
+
+        self.audio_seconds = 0.0
+        """Length of the processed audio in seconds."""
+
+        self.frames_parsed = 0
+        """Number of viseme frames read from the analysis or the cache."""
+
+        self.conversion_seconds = 0.0
+        """Time spent converting audio into a format ProcessWAV can read."""
+
+        self.analysis_seconds = 0.0
+        """Wall time of the ProcessWAV subprocess or the built-in analyzer."""
+
+        self.parse_seconds = 0.0
+        """Time spent parsing viseme output or loading the cache. ProcessWAV output is parsed while it is written, so this overlaps with analysis_seconds."""
+
+        self.build_seconds = 0.0
+        """Time spent resampling and mapping viseme values to keyframes."""
+
+        self.write_seconds = 0.0
+        """Time spent writing keyframes onto F-curves."""
+
+        self.keyframes_written = 0
+        """Number of keyframes written."""
+
+        self.keyframes_removed = 0
+        """Number of keyframes removed by simplification."""
+
+        self.keyframes_kept = 0
+        """Number of keyframes kept from the last apply of the clip by incremental apply."""
+
+        self.meshes = 0
+        """Number of meshes keyed."""
+
+        self.total_seconds = 0.0
+        """Wall time of the whole apply."""
+
+    def add_job(self, job):
+        """Copies the timers of a finished analysis.
+
+        Args:
+            job (VisemeJob): Finished analysis
+        """
+        self.conversion_seconds = job.conversion_time
+        self.analysis_seconds = job.analysis_time
+        self.parse_seconds = job.parse_time
+
+    def add_frame_data(self, frame_data, frame_rate):
+        """Records the size of the processed viseme values.
+
+        Args:
+            frame_data (FrameData): Processed viseme values
+            frame_rate (float): Frame rate frame_data was generated at
+        """
+        self.frames_parsed = len(frame_data.frames)
+        self.audio_seconds = len(frame_data.frames) / frame_rate
+
+    def add_track(self, track):
+        """Records the length of a loaded viseme track.
+
+        Args:
+            track (tracks.VisemeTrack): Loaded viseme track
+        """
+        self.frames_parsed = track.frame_count
+        self.audio_seconds = track.frame_count / track.frame_rate
+
+    def to_dict(self):
+        """Gets the stats as a JSON serializable dictionary.
+
+        Returns:
+            dict: Stats keyed by attribute name
+        """
+        return dict(vars(self))
+
+    def summary(self):
+        """Gets a one line summary of where the time went.
+
+        Returns:
+            str: Summary text
+        """
+        if (self.cache_hit):
+            source = f"cache in {self.parse_seconds:.2f}s"
+        else:
+            source = f"{self.backend} in {self.conversion_seconds + self.analysis_seconds:.2f}s (parse {self.parse_seconds:.2f}s)"
+        return f"{self.audio_seconds:.1f}s of audio ({self.frames_parsed} frames) from {source}, build {self.build_seconds:.3f}s, write {self.write_seconds:.3f}s, total {self.total_seconds:.2f}s"
+
+LAST_APPLY_STATS = None
+"""ApplyStats of the most recent apply in this session, shown in the Statistics panel."""
+
+def record_apply_stats(scene, stats):
+    """Stores the stats of a finished apply for the Statistics panel and appends them to the scene's JSON log, if one is set.
+
+    Args:
+        scene (bpy.types.Scene): Scene providing the log settings
+        stats (ApplyStats): Stats of the apply
+
+    Returns:
+        str: Description of why the stats could not be appended to the log, or None if they were or no log is set
+    """
+    global LAST_APPLY_STATS
+    LAST_APPLY_STATS = stats
+    if (scene.stats_log_path):
+        entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "event": "apply"}
+        entry.update(stats.to_dict())
+        try:
+            with open(bpy.path.abspath(scene.stats_log_path), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            return f"Could not write stats log: {e}"
+    return None
+
+def save_apply_profile(scene, profile):
+    """Stops a profile from start_apply_profile and saves it as a .prof file, next to the JSON log if one is set and in the temp folder otherwise. Open it with pstats or snakeviz.
+
+    Args:
+        scene (bpy.types.Scene): Scene providing the log settings
+        profile (cProfile.Profile): Running profile
+
+    Returns:
+        str: Path the profile was saved to
+    """
+    profile.disable()
+    profile_folder = os.path.dirname(bpy.path.abspath(scene.stats_log_path)) if scene.stats_log_path else tempfile.gettempdir()
+    profile_path = os.path.join(profile_folder, f"ovr_lipsync_{time.strftime('%Y%m%d_%H%M%S')}.prof")
+    profile.dump_stats(profile_path)
+    return profile_path
+
+def start_apply_profile(scene):
+    """Starts profiling an apply if profiling is enabled on the scene.
+
+    Args:
+        scene (bpy.types.Scene): Scene providing the profiling setting
+
+    Returns:
+        cProfile.Profile: Running profile to be passed to save_apply_profile, or None if profiling is disabled
+    """
+    if not (scene.use_apply_profiling):
+        return None
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+def get_cache_folder():
+    """Gets the folder used to cache processed viseme values, creating it if needed.
+
+    Returns:
+        str: Path to cache folder
+    """
+    return bpy.utils.user_resource('DATAFILES', path="ovr_lipsync_cache", create=True)
+
+def processwav_version():
+    """Gets a string identifying the installed ProcessWAV executable, so cached results are invalidated when it changes.
+
+    Returns:
+        str: Version string built from the size and modification time of ProcessWAV.exe
+    """
+    try:
+        stat = os.stat(PROCESSWAV_PATH)
+    except OSError:
+        return "missing"
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+def frame_data_cache_key(wav_file_path, frame_rate, start_time = None, end_time = None, backend_version = ""):
+    """Builds the cache key for a .wav file processed at a given frame rate. The key depends on the contents of the file rather than its path.
+
+    Args:
+        wav_file_path (str): Path to .wav file
+        frame_rate (float): Frame rate the visemes are generated at
+        start_time (float, optional): Start of the processed time range in seconds. Defaults to None.
+        end_time (float, optional): End of the processed time range in seconds. Defaults to None.
+        backend_version (str, optional): Version of the backend that produced the result, from VisemeBackend.version. Defaults to "".
+
+    Returns:
+        str: Hex digest identifying the cached result
+    """
+    digest = hashlib.sha256()
+    with open(wav_file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(f"|{float(frame_rate)!r}|{start_time!r}|{end_time!r}|{backend_version}|{CACHE_FORMAT_VERSION}".encode())
+    return digest.hexdigest()
+
+def frame_data_cache_path(cache_folder, wav_file_path, frame_rate, start_time = None, end_time = None, backend_version = ""):
+    """Gets the path a .wav file processed at a given frame rate is cached at.
+
+    Args:
+        cache_folder (str): Path to cache folder
+        wav_file_path (str): Path to .wav file
+        frame_rate (float): Frame rate the visemes are generated at
+        start_time (float, optional): Start of the processed time range in seconds. Defaults to None.
+        end_time (float, optional): End of the processed time range in seconds. Defaults to None.
+        backend_version (str, optional): Version of the backend that produced the result, from VisemeBackend.version. Defaults to "".
+
+    Returns:
+        str: Path to cached .npz file, which may not exist yet
+    """
+    return os.path.join(cache_folder, frame_data_cache_key(wav_file_path, frame_rate, start_time, end_time, backend_version) + ".npz")
+
+def start_processwav(wav_file_path, frame_rate, output_file_path):
+    """Launches ProcessWAV in the background to process a .wav file into a viseme output file.
+
+    Args:
+        wav_file_path (str): Path to input .wav file
+        frame_rate (float): Target frame rate for visemes
+        output_file_path (str): Path the viseme output file is written to
+
+    Returns:
+        subprocess.Popen: The running ProcessWAV process
+    """
+    return subprocess.Popen([PROCESSWAV_PATH, str(float(frame_rate)), wav_file_path, output_file_path])
+
+def parse_viseme_names(header_lines):
+    """Gets the viseme names from the header lines of a viseme output file.
+
+    Args:
+        header_lines (list(str)): The first VISEME_HEADER_LINES lines of the file
+
+    Returns:
+        list(str): List of viseme names, in column order
+    """
+    return [item.strip() for item in header_lines[2][8:].split(";")]
+
+def parse_viseme_rows(text, viseme_count):
+    """Parses semicolon separated viseme rows into a matrix in one vectorized pass.
+
+    Args:
+        text (str): One or more complete rows of a viseme output file, without header lines
+        viseme_count (int): Number of values in each row
+
+    Returns:
+        numpy.ndarray: (n_frames, viseme_count) float32 matrix of viseme values
+    """
+    return np.fromstring(text.replace(";", " "), dtype=np.float32, sep=" ").reshape(-1, viseme_count)
+
+class VisemeJob:
+    """Base class for a running viseme analysis started by VisemeBackend.start. Subclasses fill in names, blocks and frame_count as results become available."""
+
+    def __init__(self):
+        self.names = None
+        """List of viseme names, available once known."""
+
+        self.blocks = []
+        """List of (n_frames, n_visemes) float32 matrices produced so far, in frame order."""
+
+        self.frame_count = 0
+        """Number of frames produced so far."""
+
+        self.done = False
+        """Whether the analysis has finished and all of its output is in blocks."""
+
+        self.start_time = time.perf_counter()
+        """perf_counter time the analysis was started at."""
+
+        self.converting = False
+        """Whether audio is still being converted before the analysis can start."""
+
+        self.conversion_time = 0.0
+        """Time spent converting audio before the analysis could start, in seconds."""
+
+        self.analysis_time = 0.0
+        """Wall time of the analysis in seconds, set once it has finished."""
+
+        self.parse_time = 0.0
+        """Time spent parsing analysis output in seconds."""
+
+    def poll(self):
+        """Collects any new results without blocking.
+
+        Returns:
+            bool: True once the analysis has finished and all of its output is in blocks
+        """
+        raise NotImplementedError
+
+    def iter_blocks(self, poll_interval = 0.01):
+        """Generator yielding each block of viseme rows as soon as it has been parsed. Blocks until the analysis has finished.
+
+        Args:
+            poll_interval (float, optional): Seconds to wait between checks for new output. Defaults to 0.01.
+
+        Yields:
+            numpy.ndarray: (n_frames, n_visemes) float32 matrix of newly parsed viseme values
+        """
+        yielded = 0
+        while True:
+            done = self.poll()
+            while (yielded < len(self.blocks)):
+                yield self.blocks[yielded]
+                yielded += 1
+            if (done):
+                return
+            time.sleep(poll_interval)
+
+    def close(self):
+        """Stops the analysis if it is still running and releases its resources."""
+        pass
+
+class VisemeOutputStream(VisemeJob):
+    """Runs ProcessWAV and parses its viseme rows while they are being written, so parsing overlaps with the analysis instead of waiting for it to finish.
+
+    ProcessWAV can only write to a file, so by default its output goes to a private temporary folder that is read from as it grows and removed afterwards.
+    Audio that ProcessWAV cannot read directly, such as stereo or 24-bit files, is first converted into the same folder on a background thread, and ProcessWAV is launched by poll once it is done."""
+
+    def __init__(self, wav_file_path, frame_rate, output_file_path = None, keep_output_file = False, start_time = None, end_time = None):
+        """Launches ProcessWAV in the background, or starts converting the audio for it.
+
+        Args:
+            wav_file_path (str): Path to input .wav file
+            frame_rate (float): Target frame rate for visemes
+            output_file_path (str, optional): Path the viseme output file is written to. Defaults to None, which uses a private temporary folder.
+            keep_output_file (bool, optional): Determines whether or not viseme output file should be kept after close. Defaults to False.
+            start_time (float, optional): Time in seconds to start processing at. Defaults to None, which starts at the beginning of the file.
+            end_time (float, optional): Time in seconds to stop processing at. Defaults to None, which stops at the end of the file.
+        """
+        self.temp_folder = tempfile.mkdtemp(prefix="ovr_lipsync_")
+        if (output_file_path is None):
+            output_file_path = os.path.join(self.temp_folder, "visemes_output.txt")
+        self.output_file_path = output_file_path
+        self.keep_output_file = keep_output_file
+        self.wav_file_path = wav_file_path
+        """Path to the .wav file ProcessWAV reads, which is the converted file if the audio needed converting."""
+
+        self.frame_rate = frame_rate
+        self.process = None
+        """The running ProcessWAV process, or None while the audio is still being converted."""
+
+        super().__init__()
+        self._file = None
+        self._header = []
+        self._pending = ""
+        self._conversion = None
+        self._error = None
+        self._cancelled = False
+        try:
+            if (audio.needs_conversion(wav_file_path, start_time, end_time)):
+                self.wav_file_path = os.path.join(self.temp_folder, "audio.wav")
+                self._conversion = threading.Thread(target=self._convert, args=(wav_file_path, start_time, end_time), daemon=True)
+                self.converting = True
+                self._conversion.start()
+            else:
+                self.process = start_processwav(wav_file_path, frame_rate, output_file_path)
+        except BaseException:
+            shutil.rmtree(self.temp_folder, ignore_errors=True)
+            raise
+
+    def _conversion_progress(self, seconds):
+        if (self._cancelled):
+            raise InterruptedError("Conversion cancelled")
+
+    def _convert(self, wav_file_path, start_time, end_time):
+        try:
+            audio.convert_for_processwav(wav_file_path, self.wav_file_path, start_time, end_time, self._conversion_progress)
+            self.conversion_time = time.perf_counter() - self.start_time
+        except Exception as e:
+            self._error = e
+
+    def _parse(self, text):
+        parse_start = time.perf_counter()
+        lines = (self._pending + text).split("\n")
+        # The last piece is an incomplete row unless the text ended with a newline
+        self._pending = lines.pop()
+        while (lines and len(self._header) < VISEME_HEADER_LINES):
+            self._header.append(lines.pop(0))
+        if (self.names is None and len(self._header) == VISEME_HEADER_LINES):
+            self.names = parse_viseme_names(self._header)
+        if (lines and self.names is not None):
+            block = parse_viseme_rows("\n".join(lines), len(self.names))
+            if (len(block)):
+                self.blocks.append(block)
+                self.frame_count += len(block)
+        self.parse_time += time.perf_counter() - parse_start
+
+    def poll(self):
+        """Parses any viseme rows written since the last call without blocking.
+
+        Raises:
+            subprocess.CalledProcessError: Throws an error if ProcessWAV exited with a non-zero exit code
+            OSError: Throws an error if ProcessWAV finished without writing an output file
+            Exception: Rethrows any error raised while converting the audio
+
+        Returns:
+            bool: True once ProcessWAV has finished and all of its output has been parsed
+        """
+        if (self.done):
+            return True
+        if (self.process is None):
+            if (self._conversion.is_alive()):
+                return False
+            self.converting = False
+            if (self._error is not None):
+                raise self._error
+            self.process = start_processwav(self.wav_file_path, self.frame_rate, self.output_file_path)
+        # Checked before reading, so that nothing written before exiting is missed
+        finished = self.process.poll() is not None
+        if (self._file is None and os.path.exists(self.output_file_path)):
+            self._file = open(self.output_file_path)
+        if (self._file is not None):
+            self._parse(self._file.read())
+        if (not finished):
+            return False
+        self.analysis_time = time.perf_counter() - self.start_time - self.conversion_time
+        if (self.process.returncode != 0):
+            raise subprocess.CalledProcessError(self.process.returncode, self.process.args)
+        if (self._file is None):
+            raise FileNotFoundError(f"ProcessWAV did not write {self.output_file_path}")
+        self._parse("\n")
+        if (self.names is None):
+            raise ValueError(f"{self.output_file_path} is missing its header")
+        self.done = True
+        return True
+
+    def close(self):
+        """Stops the conversion and ProcessWAV if they are still running and removes the output file and temporary folder, unless the output file should be kept."""
+        if (self._conversion is not None):
+            # The conversion stops after its current chunk, before the temporary folder is removed
+            self._cancelled = True
+            self._conversion.join()
+        if (self.process is not None and self.process.poll() is None):
+            self.process.kill()
+            self.process.wait()
+        if (self._file is not None):
+            self._file.close()
+            self._file = None
+        if (self.keep_output_file and os.path.dirname(self.output_file_path) == self.temp_folder):
+            return
+        if (not self.keep_output_file and os.path.exists(self.output_file_path)):
+            os.remove(self.output_file_path)
+        shutil.rmtree(self.temp_folder, ignore_errors=True)
+
+class AnalysisThread(VisemeJob):
+    """Runs the NumPy reference analyzer on a background thread."""
+
+    def __init__(self, wav_file_path, frame_rate, start_time = None, end_time = None):
+        """Starts analysing a .wav file in the background.
+
+        Args:
+            wav_file_path (str): Path to input .wav file
+            frame_rate (float): Target frame rate for visemes
+            start_time (float, optional): Time in seconds to start processing at. Defaults to None.
+            end_time (float, optional): Time in seconds to stop processing at. Defaults to None.
+        """
+        super().__init__()
+        self._error = None
+        self._cancelled = False
+        self._thread = threading.Thread(target=self._run, args=(wav_file_path, frame_rate, start_time, end_time), daemon=True)
+        self._thread.start()
+
+    def _progress(self, frame_count):
+        if (self._cancelled):
+            raise InterruptedError("Analysis cancelled")
+        self.frame_count = frame_count
+
+    def _run(self, wav_file_path, frame_rate, start_time, end_time):
+        try:
+            samples, sample_rate = audio.load_mono_audio(wav_file_path, analyzer.ANALYSIS_SAMPLE_RATE, start_time, end_time)
+            frames = analyzer.analyze_visemes(samples, sample_rate, frame_rate, self._progress)
+            self.blocks.append(frames)
+            self.names = list(analyzer.VISEME_NAMES)
+        except Exception as e:
+            self._error = e
+
+    def poll(self):
+        """Checks whether the analysis has finished without blocking.
+
+        Raises:
+            Exception: Rethrows any error raised during the analysis
+
+        Returns:
+            bool: True once the analysis has finished
+        """
+        if (self._thread.is_alive()):
+            return False
+        if (self._error is not None):
+            raise self._error
+        if not (self.done):
+            self.analysis_time = time.perf_counter() - self.start_time
+        self.done = True
+        return True
+
+    def close(self):
+        """Asks the analysis to stop at its next progress update."""
+        self._cancelled = True
+
+class VisemeBackend:
+    """Base class for the ways viseme values can be generated from audio. FrameData.from_wav_file uses one of these to process audio."""
+
+    label = ""
+    """Name shown in the UI."""
+
+    def version(self):
+        """Gets a string identifying this backend and the version of its analysis, so cached results are invalidated when it changes.
+
+        Returns:
+            str: Version string
+        """
+        raise NotImplementedError
+
+    def is_available(self):
+        """Checks whether this backend can run on this machine.
+
+        Returns:
+            bool: True if the backend can be used
+        """
+        return True
+
+    def start(self, wav_file_path, frame_rate, output_file_path = None, keep_output_file = False, start_time = None, end_time = None):
+        """Starts processing a .wav file in the background.
+
+        Args:
+            wav_file_path (str): Path to input .wav file
+            frame_rate (float): Target frame rate for visemes
+            output_file_path (str, optional): Path an intermediate viseme output file is written to, for backends that use one. Defaults to None.
+            keep_output_file (bool, optional): Determines whether or not the intermediate viseme output file should be kept. Defaults to False.
+            start_time (float, optional): Time in seconds to start processing at. Defaults to None.
+            end_time (float, optional): Time in seconds to stop processing at. Defaults to None.
+
+        Returns:
+            VisemeJob: The running analysis
+        """
+        raise NotImplementedError
+
+class ProcessWAVBackend(VisemeBackend):
+    label = "Oculus Lipsync (ProcessWAV)"
+
+    def version(self):
+        return "processwav-" + processwav_version()
+
+    def is_available(self):
+        return os.name == "nt" and os.path.exists(PROCESSWAV_PATH)
+
+    def start(self, wav_file_path, frame_rate, output_file_path = None, keep_output_file = False, start_time = None, end_time = None):
+        return VisemeOutputStream(wav_file_path, frame_rate, output_file_path, keep_output_file, start_time, end_time)
+
+class NumpyBackend(VisemeBackend):
+    label = "Built-in (NumPy)"
+
+    def version(self):
+        return f"numpy-{analyzer.ANALYZER_VERSION}"
+
+    def start(self, wav_file_path, frame_rate, output_file_path = None, keep_output_file = False, start_time = None, end_time = None):
+        return AnalysisThread(wav_file_path, frame_rate, start_time, end_time)
+
+VISEME_BACKENDS = {
+    "PROCESSWAV": ProcessWAVBackend(),
+    "NUMPY": NumpyBackend(),
+}
+"""Available viseme backends, keyed by identifier."""
+
+VISEME_BACKEND_ITEMS = [
+    ("AUTO", "Automatic", "Uses Oculus Lipsync where it is available, and the built-in analyzer everywhere else"),
+    ("PROCESSWAV", "Oculus Lipsync", "Uses ProcessWAV.exe and Oculus Lipsync. Only available on Windows"),
+    ("NUMPY", "Built-in", "Uses a CPU-only analyzer built on audio energy and spectral features. Runs on any platform, but is less accurate than Oculus Lipsync"),
+]
+"""Viseme backend choices, in EnumProperty item format."""
+
+def get_viseme_backend(identifier = "AUTO"):
+    """Gets a viseme backend by identifier.
+
+    Args:
+        identifier (str, optional): One of the identifiers in VISEME_BACKEND_ITEMS. Defaults to "AUTO", which picks ProcessWAV when it is available and the NumPy analyzer otherwise.
+
+    Raises:
+        ValueError: Throws an error if identifier is not a valid backend
+
+    Returns:
+        VisemeBackend: The requested backend
+    """
+    if (identifier == "AUTO"):
+        if (VISEME_BACKENDS["PROCESSWAV"].is_available()):
+            return VISEME_BACKENDS["PROCESSWAV"]
+        return VISEME_BACKENDS["NUMPY"]
+    if (identifier not in VISEME_BACKENDS):
+        raise ValueError(f"Unknown viseme backend {identifier}. Valid backends are AUTO, {', '.join(VISEME_BACKENDS)}")
+    return VISEME_BACKENDS[identifier]
+
+def trim_frame_data_cache(cache_folder, size_limit):
+    """Removes least recently used cache files until the cache folder fits within a size limit.
+
+    Args:
+        cache_folder (str): Path to cache folder
+        size_limit (int): Largest total size of the cache folder in bytes. 0 means no limit.
+
+    Returns:
+        int: Number of bytes freed
+    """
+    if (size_limit <= 0):
+        return 0
+    entries = []
+    for entry in os.scandir(cache_folder):
+        if (entry.is_file() and entry.name.endswith(".npz")):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total_size = sum(size for _, size, _ in entries)
+    freed = 0
+    for _, size, path in sorted(entries):
+        if (total_size - freed <= size_limit):
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Already evicted by another batch worker
+            pass
+        freed += size
+    return freed
+
+def clear_frame_data_cache(cache_folder):
+    """Removes every cached result from the cache folder.
+
+    Args:
+        cache_folder (str): Path to cache folder
+
+    Returns:
+        int: Number of bytes freed
+    """
+    freed = 0
+    for entry in os.scandir(cache_folder):
+        if (entry.is_file() and entry.name.endswith((".npz", ".tmp"))):
+            freed += entry.stat().st_size
+            os.remove(entry.path)
+    return freed
+
+def search_viseme_names(self, context, edit_text):
+    """Lists the viseme names matching the text typed into a viseme field, for StringProperty search."""
+    return [name for name in analyzer.VISEME_NAMES if edit_text.lower() in name.lower()]
+
+class VisemeMapping(bpy.types.PropertyGroup):
+    viseme: StringProperty(
+        name = "Viseme",
+        description = "Name of the viseme column driving the shapekey, e.g. aa. Not case sensitive",
+        search = search_viseme_names
+    )
+    shapekey: StringProperty(
+        name = "Shapekey",
+        description = "Shapekey driven by the viseme"
+    )
+    weight: FloatProperty(
+        name = "Weight",
+        description = "Multiplier applied to the viseme value before it is keyed",
+        default = 1.0,
+        min = 0.0,
+        soft_max = 2.0
+    )
+
+def viseme_mapping_problem(mesh):
+    """Checks whether the viseme mapping of a mesh can be applied.
+
+    Args:
+        mesh (bpy.types.Mesh): Mesh to check
+
+    Returns:
+        str: Description of the first problem found, or None if the mapping is complete
+    """
+    if not (mesh.shape_keys):
+        return f"Mesh \"{mesh.name}\" has no shapekeys"
+    if (len(mesh.viseme_mappings) == 0):
+        return f"Mesh \"{mesh.name}\" has no viseme mappings"
+    key_blocks = mesh.shape_keys.key_blocks
+    basis_name = mesh.shape_keys.reference_key.name
+    viseme_names = {name.lower() for name in analyzer.VISEME_NAMES}
+    for mapping in mesh.viseme_mappings:
+        if not (mapping.viseme):
+            return f"A viseme mapping on mesh \"{mesh.name}\" has no viseme name"
+        if (mapping.viseme.lower() not in viseme_names):
+            return f"Viseme {mapping.viseme} on mesh \"{mesh.name}\" is not one of {', '.join(analyzer.VISEME_NAMES)}"
+        if (mapping.shapekey not in key_blocks or mapping.shapekey == basis_name):
+            return f"Viseme {mapping.viseme} on mesh \"{mesh.name}\" must be mapped to a shapekey other than the Basis shapekey"
+    return None
+
+def build_viseme_channel_map(mesh, names):
+    """Resolves the viseme mappings of a mesh against the viseme columns of a FrameData once, so no names are compared per frame.
+
+    Args:
+        mesh (bpy.types.Mesh): Mesh with viseme mappings
+        names (list(str)): Viseme names in FrameData column order
+
+    Returns:
+        list(tuple(int, bpy.types.ShapeKey, float)): A (column, shapekey, weight) entry for each mapping whose viseme and shapekey both exist. A viseme mapped to several shapekeys has one entry per shapekey
+    """
+    columns = {name.lower(): index for index, name in enumerate(names)}
+    key_blocks = mesh.shape_keys.key_blocks
+    channel_map = []
+    for mapping in mesh.viseme_mappings:
+        column = columns.get(mapping.viseme.lower())
+        shape = key_blocks.get(mapping.shapekey)
+        if (column is not None and shape is not None):
+            channel_map.append((column, shape, mapping.weight))
+    return channel_map
+
+def set_viseme_mapping(mesh, mapping):
+    """Maps visemes to shapekeys by name, for use from scripts where the Viseme Mapping panel is not available.
+
+    Args:
+        mesh (bpy.types.Mesh): Mesh with shapekeys
+        mapping (dict(str, str or list(str))): Shapekey name, or list of shapekey names, for each viseme, keyed by viseme name (e.g. {"aa": "vrc.v_aa"}). Existing mappings of these visemes are replaced, other visemes keep their current mappings
+
+    Raises:
+        ValueError: Throws an error if a shapekey does not exist on mesh
+    """
+    key_blocks = mesh.shape_keys.key_blocks if mesh.shape_keys else {}
+    for viseme, shapekey_names in mapping.items():
+        if (isinstance(shapekey_names, str)):
+            shapekey_names = [shapekey_names]
+        for shapekey_name in shapekey_names:
+            if (shapekey_name not in key_blocks):
+                raise ValueError(f"Mesh \"{mesh.name}\" has no shapekey named \"{shapekey_name}\"")
+        for index in reversed(range(len(mesh.viseme_mappings))):
+            if (mesh.viseme_mappings[index].viseme.lower() == viseme.lower()):
+                mesh.viseme_mappings.remove(index)
+        for shapekey_name in shapekey_names:
+            item = mesh.viseme_mappings.add()
+            item.viseme = viseme
+            item.shapekey = shapekey_name
+
+def guess_viseme_mapping(mesh):
+    """Guesses a shapekey for each of MAPPED_VISEMES from shapekey names, e.g. "vrc.v_aa" or "Viseme_AA" for aa.
+
+    Args:
+        mesh (bpy.types.Mesh): Mesh with shapekeys
+
+    Returns:
+        dict(str, str): Shapekey name keyed by viseme. Visemes with no matching shapekey map to an empty string
+    """
+    key_blocks = list(mesh.shape_keys.key_blocks)[1:] if mesh.shape_keys else []
+    guesses = {}
+    for viseme in MAPPED_VISEMES:
+        guesses[viseme] = ""
+        for shape in key_blocks:
+            name = shape.name.lower()
+            if (name == viseme or name.endswith(("_" + viseme, "." + viseme, " " + viseme))):
+                guesses[viseme] = shape.name
+                break
+    return guesses
+
+def migrate_legacy_viseme_mapping(mesh):
+    """Converts the my_shapekey_<viseme> properties saved by earlier versions of the addon into viseme mappings.
+
+    Args:
+        mesh (bpy.types.Mesh): Mesh that may hold legacy properties
+
+    Returns:
+        bool: True if any legacy mapping was converted
+    """
+    if (len(mesh.viseme_mappings) > 0 or not mesh.shape_keys):
+        return False
+    key_blocks = mesh.shape_keys.key_blocks
+    migrated = False
+    for viseme in MAPPED_VISEMES:
+        # Enum properties are stored as the index of the selected item, which was the shapekey index
+        index = mesh.get("my_shapekey_" + viseme)
+        if (isinstance(index, int) and 0 < index < len(key_blocks)):
+            item = mesh.viseme_mappings.add()
+            item.viseme = viseme
+            item.shapekey = key_blocks[index].name
+            migrated = True
+    return migrated
+
+@persistent
+def migrate_legacy_viseme_mappings(_):
+    """Runs migrate_legacy_viseme_mapping on every mesh after a .blend file is loaded."""
+    for mesh in bpy.data.meshes:
+        migrate_legacy_viseme_mapping(mesh)
+
+
+class OT_TestOpenFilebrowserWav(bpy.types.Operator, ImportHelper): 
+    bl_idname = "filepicker.open_filebrowser"
+    bl_label = "Pick .wav File"
+    bl_description = "Opens a file picker to pick a .wav file for lipsync"
+    
+    filter_glob: StringProperty( 
+        default='*.wav', 
+        options={'HIDDEN'} 
+    )
+    
+    def execute(self, context):
+        """Do something with the selected file(s)."""
+        filename, extension = os.path.splitext(self.filepath)
+        print('Selected file:', self.filepath)
+        print('File name:', filename)
+        print('File extension:', extension)
+        if not (extension.lower() == ".blend"):
+            context.scene.audio_file_path = self.filepath
+        return {'FINISHED'}
+
+
+def insert_shapekey_keyframes(shape, frames, values, linear = False):
+    """Inserts keyframes on a shapekey one at a time using keyframe_insert. Slow for long clips, but kept as a fallback for the bulk writer.
+
+    Args:
+        shape (bpy.types.ShapeKey): Shapekey to be keyframed
+        frames (numpy.ndarray): Scene frames to insert keyframes at
+        values (numpy.ndarray): Shapekey values for each frame
+        linear (bool, optional): Sets the inserted keyframes to linear interpolation. Defaults to False, which keeps the default interpolation.
+    """
+    for frame, value in zip(frames, values):
+        shape.value = float(value)
+        shape.keyframe_insert(data_path='value', frame=float(frame))
+    if (linear and len(frames)):
+        for point in shapekey_fcurve(shape).keyframe_points:
+            if (frames[0] <= point.co[0] <= frames[-1]):
+                point.interpolation = 'LINEAR'
+
+def shapekey_fcurve(shape, create = False):
+    """Finds the F-curve animating the value of a shapekey.
+
+    Args:
+        shape (bpy.types.ShapeKey): Shapekey
+        create (bool, optional): Creates the Action and F-curve if they do not exist yet. Defaults to False.
+
+    Returns:
+        bpy.types.FCurve: F-curve of the shapekey value, or None if it does not exist and create is False
+    """
+    key = shape.id_data
+    action = key.animation_data.action if key.animation_data else None
+    if (action is None):
+        if not (create):
+            return None
+        if (key.animation_data is None):
+            key.animation_data_create()
+        action = key.animation_data.action = bpy.data.actions.new(name=key.name + "Action")
+    data_path = shape.path_from_id("value")
+    fcurve = action.fcurves.find(data_path)
+    if (fcurve is None and create):
+        fcurve = action.fcurves.new(data_path)
+    return fcurve
+
+KEYFRAME_POINT_ATTRIBUTES = {"co": 2, "handle_left": 2, "handle_right": 2, "handle_left_type": 1, "handle_right_type": 1, "interpolation": 1, "easing": 1, "type": 1}
+"""Keyframe point attributes kept when points are rewritten in bulk, with the number of values each has per point. Single values are enums, read and written as integers."""
+
+def read_keyframe_points(keyframe_points):
+    """Reads every attribute in KEYFRAME_POINT_ATTRIBUTES of all keyframe points with one foreach_get call each.
+
+    Args:
+        keyframe_points (bpy.types.FCurveKeyframePoints): Keyframe points to read
+
+    Returns:
+        dict(str, numpy.ndarray): (n_points, width) matrix of each attribute
+    """
+    points = {}
+    for attribute, width in KEYFRAME_POINT_ATTRIBUTES.items():
+        values = np.empty(len(keyframe_points) * width, dtype=np.float32 if width == 2 else np.int32)
+        keyframe_points.foreach_get(attribute, values)
+        points[attribute] = values.reshape(-1, width)
+    return points
+
+def write_keyframe_points(keyframe_points, points):
+    """Replaces all keyframe points with points read by read_keyframe_points, with one foreach_set call per attribute.
+
+    Args:
+        keyframe_points (bpy.types.FCurveKeyframePoints): Keyframe points to overwrite
+        points (dict(str, numpy.ndarray)): Attribute matrices from read_keyframe_points
+    """
+    count = len(points["co"])
+    if (len(keyframe_points) != count):
+        keyframe_points.clear()
+        keyframe_points.add(count)
+    for attribute, values in points.items():
+        keyframe_points.foreach_set(attribute, values.ravel())
+
+def replace_keyframe_points(fcurve, keep, new_co = None, new_interpolation = None):
+    """Removes keyframe points and appends new ones without an RNA call per point. Points are read with foreach_get, filtered with NumPy and written back with foreach_set.
+
+    Args:
+        fcurve (bpy.types.FCurve): F-curve to change
+        keep (numpy.ndarray): Boolean mask of the existing points to keep
+        new_co (numpy.ndarray, optional): (n, 2) matrix of the frame and value of each new point. Defaults to None, which adds no points.
+        new_interpolation (int, optional): Interpolation enum value of the new points. Defaults to None, which keeps the default interpolation.
+    """
+    keyframe_points = fcurve.keyframe_points
+    new_count = 0 if new_co is None else len(new_co)
+    if (keep.all() and new_count == 0):
+        return
+    kept = {attribute: values[keep] for attribute, values in read_keyframe_points(keyframe_points).items()}
+    kept_count = len(kept["co"])
+    keyframe_points.clear()
+    keyframe_points.add(kept_count + new_count)
+    # New points keep the defaults add() gave them for everything but their coordinates
+    points = read_keyframe_points(keyframe_points)
+    for attribute, values in kept.items():
+        points[attribute][:kept_count] = values
+    if (new_count):
+        points["co"][kept_count:] = new_co
+        if (new_interpolation is not None):
+            points["interpolation"][kept_count:] = new_interpolation
+    write_keyframe_points(keyframe_points, points)
+    fcurve.update()
+
+def insert_shapekey_keyframes_bulk(shape, frames, values, linear = False):
+    """Writes keyframes for a shapekey directly onto the F-curve of its shape key Action. All points are written at once with one foreach_set call per attribute.
+
+    Existing keyframes on the F-curve that fall within the written frame range are replaced, matching the behaviour of keyframe_insert.
+
+    Args:
+        shape (bpy.types.ShapeKey): Shapekey to be keyframed
+        frames (numpy.ndarray): Scene frames to insert keyframes at, in ascending order
+        values (numpy.ndarray): Shapekey values for each frame
+        linear (bool, optional): Sets the written keyframes to linear interpolation. Defaults to False, which keeps the default interpolation.
+    """
+    if (len(frames) == 0):
+        return
+    fcurve = shapekey_fcurve(shape, create=True)
+    keyframe_points = fcurve.keyframe_points
+
+    # Keys that keyframe_insert would have overwritten are dropped
+    existing_co = np.empty(len(keyframe_points) * 2, dtype=np.float32)
+    keyframe_points.foreach_get("co", existing_co)
+    keep = (existing_co[0::2] < frames[0]) | (existing_co[0::2] > frames[-1])
+    new_co = np.empty((len(frames), 2), dtype=np.float32)
+    new_co[:, 0] = frames
+    new_co[:, 1] = values
+    replace_keyframe_points(fcurve, keep, new_co, INTERPOLATION_LINEAR if linear else None)
+
+class LipsyncApplyRecord(bpy.types.PropertyGroup):
+    clip: StringProperty(
+        name = "Clip",
+        description = "Clip the keyframes were applied from, from apply_clip_key"
+    )
+    shapekey: StringProperty(
+        name = "Shapekey",
+        description = "Shapekey the keyframes were written to"
+    )
+    signature: StringProperty(
+        name = "Signature",
+        description = "Hash of the keyframes relative to the start frame, from keyframe_signature"
+    )
+    start_frame: IntProperty(
+        name = "Start Frame",
+        description = "Scene frame the clip started on"
+    )
+    first_frame: FloatProperty(
+        name = "First Frame",
+        description = "First keyframe written"
+    )
+    last_frame: FloatProperty(
+        name = "Last Frame",
+        description = "Last keyframe written"
+    )
+
+def apply_clip_key(wav_file_path):
+    """Identifies a clip for incremental re-apply. This uses the path rather than the file contents, so re-applying an edited recording replaces the keyframes of its earlier version.
+
+    Args:
+        wav_file_path (str): Path to .wav file
+
+    Returns:
+        str: Clip key
+    """
+    return os.path.normcase(os.path.abspath(wav_file_path))
+
+def keyframe_signature(frames, values, start_frame):
+    """Hashes the keyframes of one shapekey relative to the frame they start on, so keyframes that were only moved have the same signature.
+
+    Args:
+        frames (numpy.ndarray): Scene frames of the keyframes
+        values (numpy.ndarray): Shapekey values for each frame
+        start_frame (int): Scene frame the clip starts on
+
+    Returns:
+        str: Hex digest of the keyframes
+    """
+    digest = hashlib.sha1()
+    digest.update((np.asarray(frames, dtype=np.float64) - start_frame).astype(np.float32).tobytes())
+    digest.update(np.asarray(values, dtype=np.float32).tobytes())
+    return digest.hexdigest()
+
+def remove_shapekey_keyframes(shape, first_frame, last_frame):
+    """Removes the keyframes of a shapekey within a frame range.
+
+    Args:
+        shape (bpy.types.ShapeKey): Shapekey to remove keyframes from
+        first_frame (float): First frame of the range
+        last_frame (float): Last frame of the range, inclusive
+
+    Returns:
+        int: Number of keyframes removed
+    """
+    fcurve = shapekey_fcurve(shape)
+    if (fcurve is None):
+        return 0
+    co = np.empty(len(fcurve.keyframe_points) * 2, dtype=np.float32)
+    fcurve.keyframe_points.foreach_get("co", co)
+    in_range = (co[0::2] >= first_frame) & (co[0::2] <= last_frame)
+    replace_keyframe_points(fcurve, ~in_range)
+    return int(in_range.sum())
+
+def recorded_keyframes_intact(shape, first_frame, last_frame, start_frame, signature, key_count):
+    """Checks whether the keyframes an earlier apply recorded are still on the F-curve of a shapekey, unchanged. They can be gone or different if the keyframes were cleared, edited, or overwritten by another apply.
+
+    Args:
+        shape (bpy.types.ShapeKey): Shapekey to check
+        first_frame (float): First frame the earlier apply wrote
+        last_frame (float): Last frame the earlier apply wrote, inclusive
+        start_frame (int): Start frame of the earlier apply
+        signature (str): Signature the earlier apply recorded
+        key_count (int): Number of keyframes the earlier apply wrote
+
+    Returns:
+        bool: True if the F-curve holds exactly the recorded keyframes over the range
+    """
+    fcurve = shapekey_fcurve(shape)
+    if (fcurve is None):
+        return key_count == 0
+    co = np.empty(len(fcurve.keyframe_points) * 2, dtype=np.float32)
+    fcurve.keyframe_points.foreach_get("co", co)
+    in_range = (co[0::2] >= first_frame) & (co[0::2] <= last_frame)
+    if (int(in_range.sum()) != key_count):
+        return False
+    return keyframe_signature(co[0::2][in_range], co[1::2][in_range], start_frame) == signature
+
+def shift_shapekey_keyframes(shape, first_frame, last_frame, offset):
+    """Moves the keyframes of a shapekey within a frame range by a number of frames. Other keyframes in the range they are moved to are removed, matching the behaviour of insert_shapekey_keyframes_bulk.
+
+    Args:
+        shape (bpy.types.ShapeKey): Shapekey whose keyframes are moved
+        first_frame (float): First frame of the range
+        last_frame (float): Last frame of the range, inclusive
+        offset (float): Number of frames to move the keyframes by
+
+    Returns:
+        int: Number of keyframes moved
+    """
+    fcurve = shapekey_fcurve(shape)
+    if (fcurve is None):
+        return 0
+    points = read_keyframe_points(fcurve.keyframe_points)
+    x = points["co"][:, 0]
+    moved = (x >= first_frame) & (x <= last_frame)
+    overwritten = (x >= first_frame + offset) & (x <= last_frame + offset) & ~moved
+    points = {attribute: values[~overwritten] for attribute, values in points.items()}
+    moved = moved[~overwritten]
+    for attribute in ("co", "handle_left", "handle_right"):
+        points[attribute][moved, 0] += offset
+    write_keyframe_points(fcurve.keyframe_points, points)
+    fcurve.update()
+    return int(moved.sum())
+
+def apply_record_shapes(keyframes, clip_key):
+    """Lists the shapekeys an incremental re-apply of a clip may change: those about to be keyframed, and those the last apply of the clip wrote to on the same shapekey datablocks.
+
+    Args:
+        keyframes (list(tuple(bpy.types.ShapeKey, numpy.ndarray, numpy.ndarray))): (shapekey, frames, values) entries about to be written
+        clip_key (str): Clip key from apply_clip_key
+
+    Returns:
+        list(bpy.types.ShapeKey): Shapekeys, e.g. for snapshot_shapekey_fcurves
+    """
+    shapes = {}
+    for shape, _, _ in keyframes:
+        shapes[(shape.id_data.name, shape.name)] = shape
+        for record in shape.id_data.lipsync_apply_records:
+            recorded_shape = shape.id_data.key_blocks.get(record.shapekey)
+            if (record.clip == clip_key and recorded_shape is not None):
+                shapes[(shape.id_data.name, record.shapekey)] = recorded_shape
+    return list(shapes.values())
+
+def prepare_incremental_write(keyframes, clip_key, start_frame):
+    """Compares keyframes with what the last apply of the same clip wrote, so only changed shapekeys have to be written again.
+
+    Keyframes of shapekeys whose values did not change, and that are still on their F-curves as written, are moved in place if the start frame changed. Keyframes of shapekeys whose values changed, or that the clip no longer drives, are removed over the range they were written to, so a shorter clip leaves no stale keyframes behind.
+
+    Args:
+        keyframes (list(tuple(bpy.types.ShapeKey, numpy.ndarray, numpy.ndarray))): (shapekey, frames, values) entries from build_viseme_keyframes
+        clip_key (str): Clip key from apply_clip_key
+        start_frame (int): Scene frame the clip starts on
+
+    Returns:
+        tuple(list(tuple(bpy.types.ShapeKey, numpy.ndarray, numpy.ndarray)), list(tuple), int): A tuple containing 1. the entries that still have to be written, 2. records to be passed to save_apply_records once they are written and 3. the number of keyframes kept or moved instead of written
+    """
+    previous_records = {}
+    for shape, _, _ in keyframes:
+        key = shape.id_data
+        for record in key.lipsync_apply_records:
+            if (record.clip == clip_key):
+                previous_records[(key.name, record.shapekey)] = (key, record.signature, record.start_frame, record.first_frame, record.last_frame)
+
+    pending = []
+    records = []
+    reused_count = 0
+    for shape, frames, values in keyframes:
+        signature = keyframe_signature(frames, values, start_frame)
+        previous = previous_records.pop((shape.id_data.name, shape.name), None)
+        if (previous is not None and previous[1] == signature and recorded_keyframes_intact(shape, previous[3], previous[4], previous[2], signature, len(frames))):
+            offset = start_frame - previous[2]
+            if (offset != 0):
+                shift_shapekey_keyframes(shape, previous[3], previous[4], offset)
+            reused_count += len(frames)
+        else:
+            if (previous is not None):
+                remove_shapekey_keyframes(shape, previous[3], previous[4])
+            pending.append((shape, frames, values))
+        first_frame = float(frames[0]) if len(frames) else float(start_frame)
+        last_frame = float(frames[-1]) if len(frames) else float(start_frame)
+        records.append((shape, signature, first_frame, last_frame))
+
+    # Shapekeys the clip drove last time, but no longer does
+    for (_, shapekey_name), (key, _, _, first_frame, last_frame) in previous_records.items():
+        shape = key.key_blocks.get(shapekey_name)
+        if (shape is not None):
+            remove_shapekey_keyframes(shape, first_frame, last_frame)
+    return (pending, records, reused_count)
+
+def save_apply_records(clip_key, start_frame, records):
+    """Replaces the records of a clip on the shapekey datablocks it was applied to.
+
+    Args:
+        clip_key (str): Clip key from apply_clip_key
+        start_frame (int): Scene frame the clip starts on
+        records (list(tuple)): Records from prepare_incremental_write
+    """
+    keys = {shape.id_data.name: shape.id_data for shape, _, _, _ in records}
+    for key in keys.values():
+        for index in reversed(range(len(key.lipsync_apply_records))):
+            if (key.lipsync_apply_records[index].clip == clip_key):
+                key.lipsync_apply_records.remove(index)
+    for shape, signature, first_frame, last_frame in records:
+        record = shape.id_data.lipsync_apply_records.add()
+        record.clip = clip_key
+        record.shapekey = shape.name
+        record.signature = signature
+        record.start_frame = start_frame
+        record.first_frame = first_frame
+        record.last_frame = last_frame
+
+def simplify_keyframes(frames, values, tolerance):
+    """Finds the keyframes of a single viseme channel that are needed to reproduce it within a given error tolerance, using the Ramer-Douglas-Peucker algorithm.
+
+    The error of a dropped keyframe is measured as the vertical distance between its value and the straight line between the surrounding kept keyframes.
+
+    Args:
+        frames (numpy.ndarray): Frame number of each keyframe, in ascending order
+        values (numpy.ndarray): Shapekey value of each keyframe
+        tolerance (float): Largest allowed difference in shapekey value for dropped keyframes
+
+    Returns:
+        numpy.ndarray: Indices of the keyframes to keep, in ascending order
+    """
+    count = len(values)
+    if (count <= 2):
+        return np.arange(count)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+    segments = [(0, count - 1)]
+    while segments:
+        first, last = segments.pop()
+        if (last - first < 2):
+            continue
+        t = (frames[first + 1:last] - frames[first]) / (frames[last] - frames[first])
+        line = values[first] + (values[last] - values[first]) * t
+        errors = np.abs(values[first + 1:last] - line)
+        worst = int(np.argmax(errors))
+        if (errors[worst] > tolerance):
+            split = first + 1 + worst
+            keep[split] = True
+            segments.append((first, split))
+            segments.append((split, last))
+    return np.flatnonzero(keep)
+
+def audio_time_range(scene):
+    """Gets the part of the audio file to be processed, based on the audio range settings of the scene.
+
+    Args:
+        scene (bpy.types.Scene): Scene providing the audio range settings
+
+    Returns:
+        tuple(float, float): A tuple containing 1. the start time and 2. the end time in seconds. Either is None if the range is not limited on that side
+    """
+    if not (scene.use_audio_range):
+        return (None, None)
+    end_time = scene.audio_end_time if scene.audio_end_time > scene.audio_start_time else None
+    return (scene.audio_start_time, end_time)
+
+class VisemeGain(bpy.types.PropertyGroup):
+    viseme: StringProperty(
+        name = "Viseme",
+        description = "Name of the viseme column, e.g. aa. Not case sensitive",
+        search = search_viseme_names
+    )
+    gain: FloatProperty(
+        name = "Gain",
+        description = "Multiplier applied to the viseme after thresholding",
+        default = 1.0,
+        min = 0.0,
+        soft_max = 4.0
+    )
+    threshold: FloatProperty(
+        name = "Threshold",
+        description = "Viseme values below this are set to 0",
+        default = 0.0,
+        min = 0.0,
+        max = 1.0
+    )
+
+class SmoothingSettings(bpy.types.PropertyGroup):
+    enabled: BoolProperty(
+        name = "Post-Processing",
+        description = "Post-processes viseme values before they are keyed or exported",
+        default = False
+    )
+    viseme_gains: CollectionProperty(type=VisemeGain)
+    top_count: IntProperty(
+        name = "Top Visemes",
+        description = "Number of strongest visemes kept on each frame. The rest are set to 0 and the kept ones scaled up to the frame's original total. 0 keeps all of them",
+        default = 0,
+        min = 0,
+        max = len(analyzer.VISEME_NAMES)
+    )
+    attack_time: FloatProperty(
+        name = "Attack",
+        description = "Time a viseme takes to fade in ahead of each of its peaks, so the mouth starts forming a shape before it is heard",
+        default = 0.0,
+        min = 0.0,
+        soft_max = 0.5,
+        subtype = 'TIME_ABSOLUTE',
+        unit = 'TIME_ABSOLUTE'
+    )
+    release_time: FloatProperty(
+        name = "Release",
+        description = "Time a viseme takes to fade out after each of its peaks",
+        default = 0.0,
+        min = 0.0,
+        soft_max = 0.5,
+        subtype = 'TIME_ABSOLUTE',
+        unit = 'TIME_ABSOLUTE'
+    )
+    smoothing_mode: EnumProperty(
+        name = "Smoothing",
+        description = "Filter used to smooth viseme values over time",
+        items = SMOOTHING_MODE_ITEMS,
+        default = "NONE"
+    )
+    smoothing_time: FloatProperty(
+        name = "Width",
+        description = "Time constant of exponential smoothing, or standard deviation of Gaussian smoothing",
+        default = 0.03,
+        min = 0.0,
+        soft_max = 0.2,
+        subtype = 'TIME_ABSOLUTE',
+        unit = 'TIME_ABSOLUTE'
+    )
+
+def copy_smoothing_settings(source, target):
+    """Copies post-processing settings, e.g. between scene.lipsync_smoothing and a preset in scene.smoothing_presets. The name of target is kept.
+
+    Args:
+        source (SmoothingSettings): Settings to copy
+        target (SmoothingSettings): Settings to overwrite
+    """
+    for attribute in ("enabled", "top_count", "attack_time", "release_time", "smoothing_mode", "smoothing_time"):
+        setattr(target, attribute, getattr(source, attribute))
+    target.viseme_gains.clear()
+    for row in source.viseme_gains:
+        item = target.viseme_gains.add()
+        item.viseme = row.viseme
+        item.gain = row.gain
+        item.threshold = row.threshold
+
+def load_smoothing_preset(scene, name):
+    """Makes a post-processing preset stored on the scene the active settings.
+
+    Args:
+        scene (bpy.types.Scene): Scene holding the preset
+        name (str): Name of the preset
+
+    Raises:
+        ValueError: Throws an error if the scene has no preset with that name
+    """
+    preset = scene.smoothing_presets.get(name)
+    if (preset is None):
+        raise ValueError(f"Scene \"{scene.name}\" has no post-processing preset named \"{name}\"")
+    copy_smoothing_settings(preset, scene.lipsync_smoothing)
+
+def filter_callback(self, object):
+    return object.name in bpy.data.meshes.keys()
+
+class LipsyncTarget(bpy.types.PropertyGroup):
+    mesh: PointerProperty(
+        name = "Mesh",
+        description = "Additional mesh keyed from the same audio, using its own viseme mapping",
+        type = bpy.types.Mesh,
+        poll = filter_callback
+    )
+
+def lipsync_target_meshes(scene, mesh = None):
+    """Lists the meshes an apply writes to: the main mesh followed by the scene's extra targets.
+
+    Args:
+        scene (bpy.types.Scene): Scene holding the targets
+        mesh (bpy.types.Mesh, optional): Main mesh. Defaults to None, which uses the Mesh selected in the panel.
+
+    Returns:
+        list(bpy.types.Mesh): Target meshes without duplicates
+    """
+    meshes = []
+    for target in [mesh or scene.my_collection_meshes] + [target.mesh for target in scene.lipsync_targets]:
+        if (target is not None and target not in meshes):
+            meshes.append(target)
+    return meshes
+
+def lipsync_targets_problem(meshes):
+    """Checks whether every target mesh of an apply has a complete viseme mapping.
+
+    Args:
+        meshes (list(bpy.types.Mesh)): Target meshes
+
+    Returns:
+        str: Description of the first problem found, or None if all targets can be applied
+    """
+    if (not meshes):
+        return "No mesh selected"
+    for mesh in meshes:
+        mapping_problem = viseme_mapping_problem(mesh)
+        if (mapping_problem):
+            return mapping_problem
+    return None
+
+def build_shapekey_keyframes(meshes, names, build_channel):
+    """Works out the keyframes for each mapped viseme shapekey of a set of meshes. Visemes mapped to the same shapekey add up, and shapekeys driven by the same visemes, weights and slider range share their keyframe arrays.
+
+    Args:
+        meshes (list(bpy.types.Mesh)): Meshes with viseme mappings
+        names (list(str)): Viseme names in column order
+        build_channel (callable): Called with the (column, weight) pairs driving a shapekey and its slider minimum and maximum. Returns a tuple containing 1. the frames, 2. the values and 3. the number of keyframes removed by simplification
+
+    Returns:
+        tuple(list(tuple(bpy.types.ShapeKey, numpy.ndarray, numpy.ndarray)), int): A tuple containing 1. a (shapekey, frames, values) entry for each mapped shapekey and 2. the number of keyframes removed by simplification
+    """
+    saved_count = 0
+    keyframes = []
+    # Keyframe arrays and removed key counts keyed by the (column, weight) pairs driving a shapekey and its slider range
+    channel_keyframes = {}
+    for mesh in meshes:
+        shape_channels = {}
+        for column, shape, weight in build_viseme_channel_map(mesh, names):
+            shape_channels.setdefault(shape.name, (shape, []))[1].append((column, weight))
+        for shape, channels in shape_channels.values():
+            channel_key = (tuple(sorted(channels)), shape.slider_min, shape.slider_max)
+            if (channel_key not in channel_keyframes):
+                channel_keyframes[channel_key] = build_channel(channels, shape.slider_min, shape.slider_max)
+            shape_frames, values, removed_count = channel_keyframes[channel_key]
+            saved_count += removed_count
+            keyframes.append((shape, shape_frames, values))
+    return (keyframes, saved_count)
+
+def build_viseme_keyframes(scene, meshes, frame_data, viseme_fps, start_frame):
+    """Resamples viseme values to the scene frame rate and works out the keyframes for each mapped viseme shapekey of a set of meshes, using the post-processing, resampling and simplification settings of the scene. Nothing is written to the meshes.
+
+    Resampling is done once for all meshes, and shapekeys driven by the same visemes and weights share their keyframe arrays.
+
+    Args:
+        scene (bpy.types.Scene): Scene providing the frame rate and apply settings
+        meshes (list(bpy.types.Mesh)): Meshes with viseme mappings
+        frame_data (FrameData): Processed viseme values
+        viseme_fps (float): Frame rate frame_data was generated at
+        start_frame (int): Scene frame the first viseme frame is keyed on
+
+    Returns:
+        tuple(list(tuple(bpy.types.ShapeKey, numpy.ndarray, numpy.ndarray)), int): A tuple containing 1. a (shapekey, frames, values) entry for each mapped shapekey and 2. the number of keyframes removed by simplification
+    """
+    scene_fps = scene.render.fps / scene.render.fps_base
+    if (scene.lipsync_smoothing.enabled):
+        frame_data = frame_data.postprocess(scene.lipsync_smoothing, viseme_fps)
+    scene_frame_data = frame_data.resample(viseme_fps, scene_fps, mode=scene.resample_mode)
+    frames = np.arange(len(scene_frame_data.frames), dtype=np.float64) + start_frame
+    tolerance = scene.simplify_tolerance
+    def build_channel(channels, slider_min, slider_max):
+        values = np.zeros(len(frames), dtype=np.float32)
+        for column, weight in channels:
+            values += scene_frame_data.frames[:, column] * weight
+        values = np.clip(values, slider_min, slider_max)
+        if (tolerance <= 0.0):
+            return (frames, values, 0)
+        kept = simplify_keyframes(frames, values, tolerance)
+        return (frames[kept], values[kept], len(frames) - len(kept))
+    return build_shapekey_keyframes(meshes, frame_data.names, build_channel)
+
+def build_track_keyframes(scene, meshes, track, start_frame):
+    """Works out the keyframes for each mapped viseme shapekey of a set of meshes straight from the sparse keys of a track, using the simplification setting of the scene. Nothing is written to the meshes.
+
+    The track is not expanded to every frame. Keys are placed on the scene frames matching their track frames, which only rescales them if the track and scene frame rates differ. A shapekey driven by several visemes is keyed on every frame any of them has a key on.
+
+    Args:
+        scene (bpy.types.Scene): Scene providing the frame rate and apply settings
+        meshes (list(bpy.types.Mesh)): Meshes with viseme mappings
+        track (tracks.VisemeTrack): Loaded viseme track
+        start_frame (int): Scene frame the first track frame is keyed on
+
+    Returns:
+        tuple(list(tuple(bpy.types.ShapeKey, numpy.ndarray, numpy.ndarray)), int): A tuple containing 1. a (shapekey, frames, values) entry for each mapped shapekey and 2. the number of keyframes removed by simplification
+    """
+    scene_fps = scene.render.fps / scene.render.fps_base
+    # Track values are linearly interpolated between keys, so moving the keys keeps the curve
+    frame_scale = scene_fps / track.frame_rate
+    names = [channel.name for channel in track.channels]
+    tolerance = scene.simplify_tolerance
+    def build_channel(channels, slider_min, slider_max):
+        track_frames = np.unique(np.concatenate([track.channels[column].frames for column, _ in channels]))
+        values = np.zeros(len(track_frames), dtype=np.float32)
+        for column, weight in channels:
+            channel = track.channels[column]
+            if (len(channel.frames)):
+                values += np.interp(track_frames, channel.frames, channel.values).astype(np.float32) * weight
+        values = np.clip(values, slider_min, slider_max)
+        frames = track_frames * frame_scale + start_frame
+        kept = simplify_keyframes(frames, values, tolerance) if tolerance > 0.0 else np.arange(len(frames))
+        return (frames[kept], values[kept], len(frames) - len(kept))
+    return build_shapekey_keyframes(meshes, names, build_channel)
+
+KEYFRAME_WRITE_TIMES = {"bulk": [0, 0.0], "per-key": [0, 0.0]}
+"""Total keyframes written and seconds spent by each keyframe write method in this session, so the apply report can compare them."""
+
+def keyframe_write_comparison(use_bulk_keyframes, key_count, write_seconds):
+    """Compares the time a keyframe write took with the other write method, from the rate measured in this session.
+    Nothing is compared until the other method has been used, so the report only holds measured times.
+
+    Args:
+        use_bulk_keyframes (bool): Whether the write used the bulk writer
+        key_count (int): Number of keyframes written
+        write_seconds (float): Time spent writing them
+
+    Returns:
+        str: Comparison text, or an empty string if there is nothing to compare with
+    """
+    other_keys, other_seconds = KEYFRAME_WRITE_TIMES["per-key" if use_bulk_keyframes else "bulk"]
+    if (key_count == 0 or write_seconds <= 0.0 or other_keys == 0 or other_seconds <= 0.0):
+        return ""
+    other_write_seconds = key_count * other_seconds / other_keys
+    if (use_bulk_keyframes):
+        return f"{other_write_seconds / write_seconds:.0f}x faster than per-key insert ({other_write_seconds:.2f}s measured)"
+    return f"{write_seconds / other_write_seconds:.0f}x slower than bulk F-curve write ({other_write_seconds:.3f}s measured)"
+
+def write_viseme_keyframes(scene, keyframes, linear = None):
+    """Writes keyframes from build_viseme_keyframes onto their shapekeys, using the keyframe write and simplification settings of the scene. Keyframes left by simplification use linear interpolation, which the simplification tolerance is measured against.
+
+    Args:
+        scene (bpy.types.Scene): Scene providing the apply settings
+        keyframes (list(tuple(bpy.types.ShapeKey, numpy.ndarray, numpy.ndarray))): (shapekey, frames, values) entries to be written
+        linear (bool, optional): Whether the keyframes use linear interpolation. Defaults to None, which uses linear interpolation if the scene simplifies keyframes.
+
+    Returns:
+        tuple(int, float): A tuple containing 1. the number of keyframes written and 2. the time spent writing them in seconds
+    """
+    key_count = 0
+    write_start = time.perf_counter()
+    if (linear is None):
+        # Simplification measures its error against straight lines, which Bezier handles would bend
+        linear = scene.simplify_tolerance > 0.0
+    for shape, frames, values in keyframes:
+        if (scene.use_bulk_keyframes):
+            insert_shapekey_keyframes_bulk(shape, frames, values, linear)
+        else:
+            insert_shapekey_keyframes(shape, frames, values, linear)
+        key_count += len(frames)
+    write_time = time.perf_counter() - write_start
+    totals = KEYFRAME_WRITE_TIMES["bulk" if scene.use_bulk_keyframes else "per-key"]
+    totals[0] += key_count
+    totals[1] += write_time
+    return (key_count, write_time)
+
+def apply_viseme_keyframes(scene, meshes, frame_data, viseme_fps, start_frame, clip_key = None, stats = None):
+    """Resamples viseme values to the scene frame rate and keyframes them onto the mapped viseme shapekeys of a set of meshes, using the resampling, simplification and keyframe write settings of the scene.
+
+    Args:
+        scene (bpy.types.Scene): Scene providing the frame rate and apply settings
+        meshes (list(bpy.types.Mesh)): Meshes with viseme mappings
+        frame_data (FrameData): Processed viseme values
+        viseme_fps (float): Frame rate frame_data was generated at
+        start_frame (int): Scene frame the first viseme frame is keyed on
+        clip_key (str, optional): Clip key from apply_clip_key. If given and the scene has incremental apply enabled, only shapekeys that changed since the last apply of the clip are written. Defaults to None.
+        stats (ApplyStats, optional): Stats to record the build and write timers and keyframe counts in. Defaults to None.
+
+    Returns:
+        tuple(int, int, float, int): A tuple containing 1. the number of keyframes written, 2. the number of keyframes removed by simplification, 3. the time spent writing keyframes in seconds and 4. the number of keyframes kept from the last apply of the clip
+    """
+    build_start = time.perf_counter()
+    keyframes, saved_count = build_viseme_keyframes(scene, meshes, frame_data, viseme_fps, start_frame)
+    return write_built_keyframes(scene, meshes, keyframes, saved_count, time.perf_counter() - build_start, start_frame, clip_key, stats)
+
+def write_built_keyframes(scene, meshes, keyframes, saved_count, build_time, start_frame, clip_key = None, stats = None, linear = None):
+    """Writes keyframes from build_viseme_keyframes or build_track_keyframes, skipping shapekeys that did not change since the last apply of the clip if the scene has incremental apply enabled.
+
+    Args:
+        scene (bpy.types.Scene): Scene providing the apply settings
+        meshes (list(bpy.types.Mesh)): Meshes the keyframes were built for
+        keyframes (list(tuple(bpy.types.ShapeKey, numpy.ndarray, numpy.ndarray))): (shapekey, frames, values) entries to be written
+        saved_count (int): Number of keyframes removed by simplification while building
+        build_time (float): Time spent building the keyframes in seconds
+        start_frame (int): Scene frame the clip starts on
+        clip_key (str, optional): Clip key from apply_clip_key. Defaults to None, which always writes every shapekey.
+        stats (ApplyStats, optional): Stats to record the build and write timers and keyframe counts in. Defaults to None.
+        linear (bool, optional): Whether the keyframes use linear interpolation. Defaults to None, which uses linear interpolation if the scene simplifies keyframes.
+
+    Returns:
+        tuple(int, int, float, int): A tuple containing 1. the number of keyframes written, 2. the number of keyframes removed by simplification, 3. the time spent writing keyframes in seconds and 4. the number of keyframes kept from the last apply of the clip
+    """
+    reused_count = 0
+    prepare_time = 0.0
+    records = None
+    if (clip_key is not None and scene.use_incremental_apply):
+        prepare_start = time.perf_counter()
+        keyframes, records, reused_count = prepare_incremental_write(keyframes, clip_key, start_frame)
+        prepare_time = time.perf_counter() - prepare_start
+    key_count, write_time = write_viseme_keyframes(scene, keyframes, linear)
+    if (records is not None):
+        save_apply_records(clip_key, start_frame, records)
+    if (stats is not None):
+        stats.build_seconds = build_time
+        stats.write_seconds = prepare_time + write_time
+        stats.keyframes_written = key_count
+        stats.keyframes_removed = saved_count
+        stats.keyframes_kept = reused_count
+        stats.meshes = len(meshes)
+    return (key_count, saved_count, prepare_time + write_time, reused_count)
+
+def apply_lipsync(scene, meshes, wav_file_path, start_frame, backend = None, cache_folder = None, cache_size_limit = 0, start_time = None, end_time = None, stats = None):
+    """Processes an audio file once and keyframes the result onto the mapped viseme shapekeys of one or more meshes. This does not depend on any panel or UI state, so it can be used from scripts and in background mode.
+
+    Args:
+        scene (bpy.types.Scene): Scene providing the frame rate and apply settings
+        meshes (list(bpy.types.Mesh)): Meshes with viseme mappings
+        wav_file_path (str): Path to .wav file
+        start_frame (int): Scene frame the audio starts on
+        backend (VisemeBackend, optional): Backend used to process the audio. Defaults to None, which uses get_viseme_backend("AUTO").
+        cache_folder (str, optional): Folder holding cached results, or None to disable caching. Defaults to None.
+        cache_size_limit (int, optional): Largest total size of the cache folder in bytes. 0 means no limit. Defaults to 0.
+        start_time (float, optional): Time in seconds to start processing the audio at. Defaults to None.
+        end_time (float, optional): Time in seconds to stop processing the audio at. Defaults to None.
+        stats (ApplyStats, optional): Stats to record stage timers and counters in. Defaults to None.
+
+    Raises:
+        ValueError: Throws an error if the viseme mapping of any mesh is incomplete
+
+    Returns:
+        tuple(FrameData, int, int, float, float, int): A tuple containing 1. the processed viseme values, 2. the number of keyframes written, 3. the number of keyframes removed by simplification, 4. the time spent processing audio, 5. the time spent writing keyframes, both in seconds, and 6. the number of keyframes kept from the last apply of the clip
+    """
+    mapping_problem = lipsync_targets_problem(meshes)
+    if (mapping_problem):
+        raise ValueError(mapping_problem)
+    analysis_start = time.perf_counter()
+    frame_data = FrameData().from_wav_file(wav_file_path, VISEME_FPS, keep_output_file=False, cache_folder=cache_folder, cache_size_limit=cache_size_limit, start_time=start_time, end_time=end_time, backend=backend, stats=stats)
+    analysis_time = time.perf_counter() - analysis_start
+    key_count, saved_count, write_time, reused_count = apply_viseme_keyframes(scene, meshes, frame_data, VISEME_FPS, start_frame, apply_clip_key(wav_file_path), stats)
+    if (stats is not None):
+        stats.clip = wav_file_path
+        stats.total_seconds = time.perf_counter() - analysis_start
+    return (frame_data, key_count, saved_count, analysis_time, write_time, reused_count)
+
+def is_track_file(file_path):
+    """Checks whether a path names a viseme track file rather than audio, based on its extension.
+
+    Args:
+        file_path (str): Path to check
+
+    Returns:
+        bool: True for .ovlt and .json files
+    """
+    return os.path.splitext(file_path)[1].lower() in (tracks.TRACK_FILE_EXTENSION, ".json")
+
+def export_viseme_track(scene, wav_file_path, track_file_path, backend = None, cache_folder = None, cache_size_limit = 0, start_time = None, end_time = None):
+    """Processes an audio file and saves the viseme values as a track file, without keyframing anything. Uses the track export, post-processing, resampling and simplification settings of the scene.
+
+    Args:
+        scene (bpy.types.Scene): Scene providing the frame rate and export settings
+        wav_file_path (str): Path to .wav file
+        track_file_path (str): Path to save the track to. A .json extension saves the JSON layout, anything else the binary layout
+        backend (VisemeBackend, optional): Backend used to process the audio. Defaults to None, which uses get_viseme_backend("AUTO").
+        cache_folder (str, optional): Folder holding cached results, or None to disable caching. Defaults to None.
+        cache_size_limit (int, optional): Largest total size of the cache folder in bytes. 0 means no limit. Defaults to 0.
+        start_time (float, optional): Time in seconds to start processing the audio at. Defaults to None.
+        end_time (float, optional): Time in seconds to stop processing the audio at. Defaults to None.
+
+    Returns:
+        tuple(tracks.VisemeTrack, int): A tuple containing 1. the saved track and 2. the size of the track file in bytes
+    """
+    frame_data = FrameData().from_wav_file(wav_file_path, VISEME_FPS, keep_output_file=False, cache_folder=cache_folder, cache_size_limit=cache_size_limit, start_time=start_time, end_time=end_time, backend=backend)
+    if (scene.lipsync_smoothing.enabled):
+        frame_data = frame_data.postprocess(scene.lipsync_smoothing, VISEME_FPS)
+    target_fps = scene.render.fps / scene.render.fps_base if scene.track_use_scene_fps else None
+    track = frame_data.to_track(VISEME_FPS, target_fps, scene.resample_mode, scene.simplify_tolerance)
+    return (track, tracks.save_track(track, track_file_path, int(scene.track_quantization)))
+
+def import_viseme_track(scene, meshes, track_file_path, start_frame, stats = None):
+    """Loads a track file and keyframes its keys onto the mapped viseme shapekeys of one or more meshes.
+
+    Keys are written as they are stored, with linear interpolation like in the track, instead of being expanded to every scene frame. The track already holds the post-processing and resampling it was exported with, so neither is applied again.
+
+    Args:
+        scene (bpy.types.Scene): Scene providing the frame rate and apply settings
+        meshes (list(bpy.types.Mesh)): Meshes with viseme mappings
+        track_file_path (str): Path to track file saved by export_viseme_track
+        start_frame (int): Scene frame the track starts on
+        stats (ApplyStats, optional): Stats to record stage timers and counters in. Defaults to None.
+
+    Raises:
+        ValueError: Throws an error if the viseme mapping of any mesh is incomplete or the file is not a track
+
+    Returns:
+        tuple(tracks.VisemeTrack, int, int, float, float, int): A tuple containing 1. the loaded track, 2. the number of keyframes written, 3. the number of keyframes removed by simplification, 4. the time spent loading the track, 5. the time spent writing keyframes, both in seconds, and 6. the number of keyframes kept from the last apply of the track
+    """
+    mapping_problem = lipsync_targets_problem(meshes)
+    if (mapping_problem):
+        raise ValueError(mapping_problem)
+    load_start = time.perf_counter()
+    track = tracks.load_track(track_file_path)
+    load_time = time.perf_counter() - load_start
+    if (stats is not None):
+        stats.backend = "track file"
+        stats.parse_seconds = load_time
+        stats.add_track(track)
+    build_start = time.perf_counter()
+    keyframes, saved_count = build_track_keyframes(scene, meshes, track, start_frame)
+    key_count, saved_count, write_time, reused_count = write_built_keyframes(scene, meshes, keyframes, saved_count, time.perf_counter() - build_start, start_frame, apply_clip_key(track_file_path), stats, linear=True)
+    if (stats is not None):
+        stats.clip = track_file_path
+        stats.total_seconds = time.perf_counter() - load_start
+    return (track, key_count, saved_count, load_time, write_time, reused_count)
+
+def apply_report(scene, stats):
+    """Builds the report shown after keyframes have been applied.
+
+    Args:
+        scene (bpy.types.Scene): Scene providing the apply settings
+        stats (ApplyStats): Stats of the apply
+
+    Returns:
+        str: Report text
+    """
+    method = "bulk F-curve write" if scene.use_bulk_keyframes else "per-key insert"
+    keys_per_second = stats.keyframes_written / stats.write_seconds if stats.write_seconds > 0 else float("inf")
+    report = f"Inserted {stats.keyframes_written} keyframes in {stats.write_seconds:.3f}s using {method} ({keys_per_second:.0f} keys/s)"
+    comparison = keyframe_write_comparison(scene.use_bulk_keyframes, stats.keyframes_written, stats.write_seconds)
+    if (comparison):
+        report += ", " + comparison
+    if (scene.simplify_tolerance > 0.0):
+        report += f", {stats.keyframes_removed} redundant keyframes removed by simplification"
+    if (stats.keyframes_kept > 0):
+        report += f", {stats.keyframes_kept} unchanged keyframes kept from the last apply"
+    return report + ". " + stats.summary()
+
+def shapekey_reference(shape):
+    """Gets a reference to a shapekey by name. Unlike the shapekey itself, it can be kept across event loop ticks, as undo does not leave it dangling.
+
+    Args:
+        shape (bpy.types.ShapeKey): Shapekey
+
+    Returns:
+        tuple(str, str): Names of the shapekey's Key datablock and of the shapekey
+    """
+    return (shape.id_data.name, shape.name)
+
+def find_shapekey(reference):
+    """Looks up a shapekey from a reference made by shapekey_reference.
+
+    Args:
+        reference (tuple(str, str)): Names of the Key datablock and of the shapekey
+
+    Returns:
+        bpy.types.ShapeKey: Shapekey, or None if it no longer exists
+    """
+    key = bpy.data.shape_keys.get(reference[0])
+    return key.key_blocks.get(reference[1]) if key is not None else None
+
+def snapshot_shapekey_fcurves(shapes):
+    """Records the keyframes on the F-curves of a set of shapekeys, so that a partly applied lipsync can be rolled back with restore_shapekey_fcurves.
+    Datablocks are recorded by name, so the snapshot can be kept across event loop ticks.
+
+    Args:
+        shapes (list(bpy.types.ShapeKey)): Shapekeys about to be keyframed
+
+    Returns:
+        list(tuple): Snapshot to be passed to restore_shapekey_fcurves
+    """
+    snapshot = []
+    for shape in shapes:
+        key = shape.id_data
+        action = key.animation_data.action if key.animation_data else None
+        data_path = shape.path_from_id("value")
+        fcurve = action.fcurves.find(data_path) if action else None
+        points = read_keyframe_points(fcurve.keyframe_points) if fcurve is not None else None
+        snapshot.append((key.name, action.name if action else None, data_path, points))
+    return snapshot
+
+def restore_shapekey_fcurves(snapshot):
+    """Restores shapekey F-curves to the state recorded by snapshot_shapekey_fcurves. F-curves and Actions created since the snapshot are removed.
+    Shapekeys that no longer exist are skipped.
+
+    Args:
+        snapshot (list(tuple)): Snapshot from snapshot_shapekey_fcurves
+    """
+    for key_name, action_name, data_path, points in snapshot:
+        key = bpy.data.shape_keys.get(key_name)
+        current_action = key.animation_data.action if key is not None and key.animation_data else None
+        if (current_action is None):
+            continue
+        fcurve = current_action.fcurves.find(data_path)
+        if (points is None):
+            if (fcurve is not None):
+                current_action.fcurves.remove(fcurve)
+            if (action_name is None):
+                key.animation_data.action = None
+                if (current_action.users == 0):
+                    bpy.data.actions.remove(current_action)
+            continue
+        if (fcurve is None):
+            fcurve = current_action.fcurves.new(data_path)
+        write_keyframe_points(fcurve.keyframe_points, points)
+        fcurve.update()
+
+class LipsyncPreview:
+    """Drives shapekey values straight from viseme values while the timeline is scrubbed or played, without writing keyframes."""
+
+    def __init__(self, scene, meshes, frame_data, viseme_fps, clip):
+        self.scene_name = scene.name
+        """Name of the scene being previewed. Frame changes of other scenes are ignored."""
+
+        self.mesh_names = [mesh.name for mesh in meshes]
+        """Names of the previewed meshes. Meshes and shapekeys are looked up by name, so undo cannot leave stale references behind."""
+
+        self.frame_data = frame_data
+        """Viseme values as processed, before post-processing. Used by Commit."""
+
+        self.viseme_fps = viseme_fps
+        """Frame rate frame_data was generated at."""
+
+        self.clip = clip
+        """Path to the previewed .wav file."""
+
+        frames = frame_data.frames
+        if (scene.lipsync_smoothing.enabled):
+            frames = frame_data.postprocess(scene.lipsync_smoothing, viseme_fps).frames
+        # A copy of the last row lets interpolation always read row + 1
+        self.frames = np.concatenate((frames, frames[-1:])) if len(frames) else np.zeros((2, len(frame_data.names)), dtype=np.float32)
+        """Post-processed viseme values with the last row repeated once."""
+
+        self.shapes = []
+        """(mesh name, shapekey name) of each driven shapekey."""
+
+        self.weights = np.zeros((len(frame_data.names), 0), dtype=np.float32)
+        """(n_visemes, n_shapes) matrix turning a row of viseme values into shapekey values."""
+
+        self.slider_min = np.zeros(0, dtype=np.float32)
+        self.slider_max = np.zeros(0, dtype=np.float32)
+        self.last_values = np.zeros(0, dtype=np.float32)
+        """Values written on the last update. Only shapekeys whose value changed are written again."""
+
+        self.mapping_signature = None
+        """Viseme mappings the weight matrix was built from, so it is rebuilt when a mapping is edited during the preview."""
+
+        self.original_values = {}
+        """Value of each driven shapekey before the preview started, restored when it stops."""
+
+    def meshes(self):
+        """Looks up the previewed meshes that still exist and have shapekeys."""
+        return [mesh for mesh in (bpy.data.meshes.get(name) for name in self.mesh_names) if mesh is not None and mesh.shape_keys]
+
+    def bind(self, meshes, signature):
+        """Resolves the viseme mappings of the previewed meshes into the weight matrix.
+
+        Args:
+            meshes (list(bpy.types.Mesh)): Previewed meshes
+            signature (tuple): Mapping signature the matrix is built from
+        """
+        shape_indices = {}
+        shapes = []
+        channels = []
+        for mesh in meshes:
+            for column, shape, weight in build_viseme_channel_map(mesh, self.frame_data.names):
+                shape_id = (mesh.name, shape.name)
+                if (shape_id not in shape_indices):
+                    # Visemes mapped to the same shapekey add up, like in build_viseme_keyframes
+                    shape_indices[shape_id] = len(shapes)
+                    shapes.append(shape)
+                    self.original_values.setdefault(shape_id, shape.value)
+                channels.append((column, shape_indices[shape_id], weight))
+        self.shapes = list(shape_indices)
+        self.weights = np.zeros((len(self.frame_data.names), len(shapes)), dtype=np.float32)
+        for column, index, weight in channels:
+            self.weights[column, index] += weight
+        self.slider_min = np.array([shape.slider_min for shape in shapes], dtype=np.float32)
+        self.slider_max = np.array([shape.slider_max for shape in shapes], dtype=np.float32)
+        self.last_values = np.full(len(self.shapes), np.nan, dtype=np.float32)
+        self.mapping_signature = signature
+
+    def values_at(self, scene):
+        """Looks up the shapekey values for the current frame of a scene, linearly interpolating between the two nearest viseme frames.
+
+        Args:
+            scene (bpy.types.Scene): Previewed scene
+
+        Returns:
+            numpy.ndarray: Value of each driven shapekey
+        """
+        scene_fps = scene.render.fps / scene.render.fps_base
+        position = (scene.frame_current + scene.frame_subframe - scene.start_frame) / scene_fps * self.viseme_fps
+        position = min(max(position, 0.0), len(self.frames) - 2)
+        index = int(position)
+        t = position - index
+        row = self.frames[index] * (1.0 - t) + self.frames[index + 1] * t
+        return np.clip(row @ self.weights, self.slider_min, self.slider_max)
+
+    def update(self, scene):
+        """Writes the shapekey values for the current frame of a scene.
+
+        Args:
+            scene (bpy.types.Scene): Scene whose frame changed
+        """
+        meshes = self.meshes()
+        signature = tuple(tuple((mapping.viseme, mapping.shapekey, mapping.weight) for mapping in mesh.viseme_mappings) for mesh in meshes)
+        if (signature != self.mapping_signature):
+            self.bind(meshes, signature)
+        values = self.values_at(scene)
+        # Writing a shapekey value re-evaluates the mesh, so unchanged values are skipped
+        changed = np.flatnonzero(~(np.abs(values - self.last_values) < 1e-5))
+        for index in changed:
+            mesh_name, shape_name = self.shapes[index]
+            shape = bpy.data.meshes[mesh_name].shape_keys.key_blocks.get(shape_name)
+            if (shape is not None):
+                shape.value = float(values[index])
+        self.last_values[changed] = values[changed]
+
+    def restore(self):
+        """Puts every driven shapekey back to its value from before the preview."""
+        for (mesh_name, shape_name), value in self.original_values.items():
+            mesh = bpy.data.meshes.get(mesh_name)
+            shape = mesh.shape_keys.key_blocks.get(shape_name) if mesh and mesh.shape_keys else None
+            if (shape is not None):
+                shape.value = value
+
+LIPSYNC_PREVIEW = None
+"""LipsyncPreview currently running in this session, or None."""
+
+def lipsync_preview_frame_change(scene, depsgraph = None):
+    if (LIPSYNC_PREVIEW is not None and scene.name == LIPSYNC_PREVIEW.scene_name):
+        LIPSYNC_PREVIEW.update(scene)
+
+def start_lipsync_preview(scene, meshes, frame_data, viseme_fps, clip):
+    """Starts previewing viseme values on the mapped shapekeys of a set of meshes, replacing any running preview.
+
+    Args:
+        scene (bpy.types.Scene): Scene to preview on
+        meshes (list(bpy.types.Mesh)): Meshes with viseme mappings
+        frame_data (FrameData): Processed viseme values
+        viseme_fps (float): Frame rate frame_data was generated at
+        clip (str): Path to the previewed .wav file
+
+    Returns:
+        LipsyncPreview: Running preview
+    """
+    global LIPSYNC_PREVIEW
+    stop_lipsync_preview()
+    LIPSYNC_PREVIEW = LipsyncPreview(scene, meshes, frame_data, viseme_fps, clip)
+    if (lipsync_preview_frame_change not in bpy.app.handlers.frame_change_pre):
+        bpy.app.handlers.frame_change_pre.append(lipsync_preview_frame_change)
+    LIPSYNC_PREVIEW.update(scene)
+    return LIPSYNC_PREVIEW
+
+def stop_lipsync_preview():
+    """Stops the running preview, if any, and restores the shapekey values it changed.
+
+    Returns:
+        LipsyncPreview: Preview that was stopped, or None if none was running
+    """
+    global LIPSYNC_PREVIEW
+    if (lipsync_preview_frame_change in bpy.app.handlers.frame_change_pre):
+        bpy.app.handlers.frame_change_pre.remove(lipsync_preview_frame_change)
+    preview = LIPSYNC_PREVIEW
+    LIPSYNC_PREVIEW = None
+    if (preview is not None):
+        preview.restore()
+    return preview
+
+@persistent
+def stop_lipsync_preview_on_load(_):
+    """Stops the running preview before another .blend file is loaded, since its shapekeys belong to the file being closed."""
+    stop_lipsync_preview()
+
+LIPSYNC_APPLY = None
+"""insert_keyframes operator applying keyframes in the background in this session, or None."""
+
+def lipsync_apply_running(operator):
+    """Checks whether keyframes are being applied in the background, and reports a warning on an operator that would change the same keyframes.
+    Changing them before the apply finishes would mix with its rollback if it is cancelled.
+
+    Args:
+        operator (bpy.types.Operator): Operator to report the warning on
+
+    Returns:
+        bool: True if an apply is running and the operator should be cancelled
+    """
+    if (LIPSYNC_APPLY is None):
+        return False
+    operator.report({"WARNING"}, "Keyframes are still being applied. Wait for them to finish or press ESC to cancel")
+    return True
+
+class insert_keyframes(bpy.types.Operator):
+    bl_idname = "test_keyframe.func1"
+    bl_label = "Apply Keyframes"
+    bl_description = "Applies viseme keyframes for the given audio. Requires all visemes to be properly selected and a valid .wav file to be chosen. Press ESC to cancel while running"
+
+    def check_inputs(self, context):
+        if (lipsync_apply_running(self)):
+            return False
+        if not (context.scene.audio_file_path.endswith(".wav")):
+            self.report({"WARNING"}, "Selected audio file is not a .wav file!")
+            return False
+        mapping_problem = lipsync_targets_problem(lipsync_target_meshes(context.scene))
+        if (mapping_problem):
+            self.report({"WARNING"}, mapping_problem + "!")
+            return False
+        return bool(context.scene.my_collection_meshes and context.scene.audio_file_path)
+
+    def execute(self, context):
+        if not (self.check_inputs(context)):
+            return {"CANCELLED"}
+        context.scene.audio_folder_path = os.path.dirname(context.scene.audio_file_path)
+        cache_folder = get_cache_folder() if context.scene.use_cache else None
+        cache_size_limit = context.scene.cache_size_limit * 1024 * 1024
+        start_time, end_time = audio_time_range(context.scene)
+        backend = get_viseme_backend(context.scene.viseme_backend)
+        stats = ApplyStats(context.scene.audio_file_path)
+        profile = start_apply_profile(context.scene)
+        try:
+            apply_lipsync(context.scene, lipsync_target_meshes(context.scene), context.scene.audio_file_path, context.scene.start_frame, backend, cache_folder, cache_size_limit, start_time, end_time, stats)
+        except BaseException:
+            if (profile is not None):
+                profile.disable()
+            raise
+        self.report_stats(context.scene, stats, profile)
+        return {'FINISHED'}
+
+    def report_stats(self, scene, stats, profile):
+        log_problem = record_apply_stats(scene, stats)
+        self.report({"INFO"}, apply_report(scene, stats))
+        if (log_problem):
+            self.report({"WARNING"}, log_problem)
+        if (profile is not None):
+            self.report({"INFO"}, f"Saved profile to {save_apply_profile(scene, profile)}")
 
-        Args:
-            frame_index (int): Index of desired frame
+    def invoke(self, context, event):
+        if not (self.check_inputs(context)):
+            return {"CANCELLED"}
+        scene = context.scene
+        scene.audio_folder_path = os.path.dirname(scene.audio_file_path)
+        self._cache_file_path = None
+        self._cache_size_limit = scene.cache_size_limit * 1024 * 1024
+        self._frame_data = None
+        self._stream = None
+        self._work = None
+        self._snapshot = None
+        self._records = None
+        # Settings that pick what is keyframed are read once, so changing them while the audio is processed has no effect on this apply
+        self._clip = scene.audio_file_path
+        self._clip_key = apply_clip_key(self._clip)
+        self._start_frame = scene.start_frame
+        self._mesh_names = [mesh.name for mesh in lipsync_target_meshes(scene)]
+        self._stats = ApplyStats(self._clip)
+        self._profile = start_apply_profile(scene)
+        self._start_time = time.perf_counter()
+        start_time, end_time = audio_time_range(scene)
+        backend = get_viseme_backend(scene.viseme_backend)
+        try:
+            if (scene.use_cache):
+                # Hashes the audio file, so a missing or unreadable file is reported here
+                self._cache_file_path = frame_data_cache_path(get_cache_folder(), self._clip, VISEME_FPS, start_time, end_time, backend.version())
+                frame_data = FrameData()
+                if (frame_data.load_cache_file(self._cache_file_path)):
+                    self._frame_data = frame_data
+                    self._stats.cache_hit = True
+                    self._stats.parse_seconds = time.perf_counter() - self._start_time
+                    self._stats.add_frame_data(frame_data, VISEME_FPS)
+            if (self._frame_data is None):
+                self._stats.backend = type(backend).__name__
+                self._stream = backend.start(self._clip, VISEME_FPS, start_time=start_time, end_time=end_time)
+        except (OSError, ValueError) as e:
+            if (self._profile is not None):
+                self._profile.disable()
+            self.report({"ERROR"}, f"Could not process audio: {e}")
+            return {'CANCELLED'}
+        window_manager = context.window_manager
+        self._timer = window_manager.event_timer_add(MODAL_TIMER_INTERVAL, window=context.window)
+        window_manager.modal_handler_add(self)
+        window_manager.progress_begin(0, 100)
+        global LIPSYNC_APPLY
+        LIPSYNC_APPLY = self
+        return {'RUNNING_MODAL'}
 
-        Raises:
-            IndexError: Throws an error if frame_index is outside of valid range
+    def modal(self, context, event):
+        if (event.type == 'ESC' and event.value == 'PRESS'):
+            self.cancel(context)
+            self.report({"WARNING"}, "Lipsync cancelled. No keyframes were changed")
+            return {'CANCELLED'}
+        if (event.type != 'TIMER'):
+            return {'PASS_THROUGH'}
 
-        Returns:
-            list(float): List of viseme values
-        """
-        if ((frame_index < 0) or (frame_index >= len(self.frames))):
-            raise IndexError(f"Outside of valid frame range. Valid range is 0 to {len(self.frames) - 1}")
-        return self.frames[frame_index]
+        if (self._frame_data is None):
+            try:
+                if not (self._stream.poll()):
+                    if (self._stream.converting):
+                        context.workspace.status_text_set(f"Converting audio... {time.perf_counter() - self._start_time:.0f}s (ESC to cancel)")
+                        return {'PASS_THROUGH'}
+                    context.workspace.status_text_set(f"Processing audio... {self._stream.frame_count / VISEME_FPS:.1f}s analysed in {time.perf_counter() - self._start_time:.0f}s (ESC to cancel)")
+                    return {'PASS_THROUGH'}
+                self._frame_data = FrameData().from_stream(self._stream, VISEME_FPS, cache_file_path=self._cache_file_path, cache_size_limit=self._cache_size_limit, stats=self._stats)
+            except (OSError, ValueError, InterruptedError, subprocess.CalledProcessError) as e:
+                self.cancel(context)
+                self.report({"ERROR"}, f"Could not process audio: {e}")
+                return {'CANCELLED'}
+            self._stream.close()
+            return {'PASS_THROUGH'}
 
-    def print_frame(self, frame_index):
-        """Pretty print for a given frame. Prints out the viseme names and values for a given frame.
+        try:
+            if not (self.write_keyframes(context)):
+                return {'PASS_THROUGH'}
+        except Exception as e:
+            self.cancel(context)
+            self.report({"ERROR"}, f"Could not apply keyframes: {e}. No keyframes were changed")
+            return {'CANCELLED'}
+        self.finish(context)
+        self._stats.total_seconds = time.perf_counter() - self._start_time
+        self.report_stats(context.scene, self._stats, self._profile)
+        return {'FINISHED'}
 
-        Args:
-            frame_index (int): Index of desired frame
+    def write_keyframes(self, context):
+        """Does the next time slice of keyframe writing, building the keyframes on the first call.
 
-        Raises:
-            IndexError: Throws an error if frame_index is outside of valid range
+        Returns:
+            bool: True once every keyframe is written
         """
-        if ((frame_index < 0) or (frame_index >= len(self.frames))):
-            raise IndexError(f"Outside of valid frame range. Valid range is 0 to {len(self.frames) - 1}")
-        for i in range(len(self.names)):
-            print(f"{self.names[i]}: {self.frames[frame_index][i]}")
-
-# To workaround the "known bug with using a callback" mentioned
-# in the EnumProperty docs, the function needs to be called on
-# the EnumProperty's items.
-ENUM_STRING_CACHE = {}
-def intern_enum_items_strings(items):
-    def intern_string(s):
-        if isinstance(s, str):
-            ENUM_STRING_CACHE.setdefault(s, s)
-            s = ENUM_STRING_CACHE[s]
-        return s
-
-    return [
-        tuple([intern_string(s) for s in item])
-        for item in items
-    ]
-
-def shapekey_name_by_index(context, index_str):
-    index = int(index_str[2:])
-    if (context and
-        context.scene and
-        context.scene.my_collection_meshes and
-        context.scene.my_collection_meshes.shape_keys):
-            return context.scene.my_collection_meshes.shape_keys.key_blocks[index]
-            
-def is_any_shapekey_default(context):
-    if (context.scene.my_collection_meshes.my_shapekey_aa == "KB0" or context.scene.my_collection_meshes.my_shapekey_aa == ""):
-        return True
-    elif (context.scene.my_collection_meshes.my_shapekey_ch == "KB0" or context.scene.my_collection_meshes.my_shapekey_ch == ""):
-        return True
-    elif (context.scene.my_collection_meshes.my_shapekey_dd == "KB0" or context.scene.my_collection_meshes.my_shapekey_dd == ""):
-        return True
-    elif (context.scene.my_collection_meshes.my_shapekey_e == "KB0" or context.scene.my_collection_meshes.my_shapekey_e == ""):
-        return True
-    elif (context.scene.my_collection_meshes.my_shapekey_ff == "KB0" or context.scene.my_collection_meshes.my_shapekey_ff == ""):
-        return True
-    elif (context.scene.my_collection_meshes.my_shapekey_ih == "KB0" or context.scene.my_collection_meshes.my_shapekey_ih == ""):
-        return True
-    elif (context.scene.my_collection_meshes.my_shapekey_kk == "KB0" or context.scene.my_collection_meshes.my_shapekey_kk == ""):
-        return True
-    elif (context.scene.my_collection_meshes.my_shapekey_nn == "KB0" or context.scene.my_collection_meshes.my_shapekey_nn == ""):
-        return True
-    elif (context.scene.my_collection_meshes.my_shapekey_oh == "KB0" or context.scene.my_collection_meshes.my_shapekey_oh == ""):
-        return True
-    elif (context.scene.my_collection_meshes.my_shapekey_ou == "KB0" or context.scene.my_collection_meshes.my_shapekey_ou == ""):
-        return True
-    elif (context.scene.my_collection_meshes.my_shapekey_pp == "KB0" or context.scene.my_collection_meshes.my_shapekey_pp == ""):
-        return True
-    elif (context.scene.my_collection_meshes.my_shapekey_rr == "KB0" or context.scene.my_collection_meshes.my_shapekey_rr == ""):
-        return True
-    elif (context.scene.my_collection_meshes.my_shapekey_ss == "KB0" or context.scene.my_collection_meshes.my_shapekey_ss == ""):
-        return True
-    elif (context.scene.my_collection_meshes.my_shapekey_th == "KB0" or context.scene.my_collection_meshes.my_shapekey_th == ""):
+        scene = context.scene
+        stats = self._stats
+        if (self._work is None):
+            build_start = time.perf_counter()
+            meshes = [bpy.data.meshes.get(name) for name in self._mesh_names]
+            if (None in meshes):
+                raise ValueError("a target mesh was removed while the audio was processed")
+            mapping_problem = lipsync_targets_problem(meshes)
+            if (mapping_problem):
+                raise ValueError(mapping_problem)
+            keyframes, stats.keyframes_removed = build_viseme_keyframes(scene, meshes, self._frame_data, VISEME_FPS, self._start_frame)
+            stats.build_seconds = time.perf_counter() - build_start
+            stats.meshes = len(meshes)
+            if (scene.use_incremental_apply):
+                self._snapshot = snapshot_shapekey_fcurves(apply_record_shapes(keyframes, self._clip_key))
+                prepare_start = time.perf_counter()
+                keyframes, records, stats.keyframes_kept = prepare_incremental_write(keyframes, self._clip_key, self._start_frame)
+                stats.write_seconds += time.perf_counter() - prepare_start
+                self._records = [(shapekey_reference(shape), signature, first_frame, last_frame) for shape, signature, first_frame, last_frame in records]
+            else:
+                self._snapshot = snapshot_shapekey_fcurves([shape for shape, _, _ in keyframes])
+            # Bulk writes are fast enough to do a whole shapekey per chunk.
+            # Shapekeys are held by name until they are written, like the preview does, since an undo between ticks invalidates them
+            self._work = []
+            for shape, frames, values in keyframes:
+                chunk_size = len(frames) if scene.use_bulk_keyframes else KEYFRAME_CHUNK_SIZE
+                for start in range(0, len(frames), max(chunk_size, 1)):
+                    self._work.append((shapekey_reference(shape), frames[start:start + chunk_size], values[start:start + chunk_size]))
+            self._work_total = len(self._work)
+            self._work.reverse()
+
+        slice_end = time.perf_counter() + MODAL_TIME_SLICE
+        while (self._work and time.perf_counter() < slice_end):
+            reference, frames, values = self._work.pop()
+            shape = find_shapekey(reference)
+            if (shape is None):
+                raise ValueError(f"shapekey {reference[1]} was removed while keyframes were applied")
+            key_count, write_time = write_viseme_keyframes(scene, [(shape, frames, values)])
+            stats.keyframes_written += key_count
+            stats.write_seconds += write_time
+        done = self._work_total - len(self._work)
+        context.window_manager.progress_update(100 * done / max(self._work_total, 1))
+        context.workspace.status_text_set(f"Writing keyframes... {done}/{self._work_total} (ESC to cancel)")
+        if (self._work):
+            return False
+
+        if (self._records is not None):
+            records = [(find_shapekey(reference), signature, first_frame, last_frame) for reference, signature, first_frame, last_frame in self._records]
+            save_apply_records(self._clip_key, self._start_frame, [record for record in records if record[0] is not None])
+        self._snapshot = None
         return True
-    return False
 
-# This callback will return a list of enum items in the usual
-# [(identifier, name, description), ...] format.
-def my_shapekey_enum_items_callback(self, context):
-    items = []
+    def cancel(self, context):
+        if (self._stream is not None):
+            self._stream.close()
+        if (self._snapshot is not None):
+            restore_shapekey_fcurves(self._snapshot)
+            self._snapshot = None
+        if (self._profile is not None):
+            self._profile.disable()
+        self.finish(context)
 
-    if self and self.shape_keys:
-        items = [
-            (f'KB{i}', kb.name, '')
-            for i, kb in enumerate(self.shape_keys.key_blocks)
-        ]
+    def finish(self, context):
+        global LIPSYNC_APPLY
+        if (LIPSYNC_APPLY is self):
+            LIPSYNC_APPLY = None
+        if (self._timer is None):
+            return
+        window_manager = context.window_manager
+        window_manager.event_timer_remove(self._timer)
+        self._timer = None
+        window_manager.progress_end()
+        context.workspace.status_text_set(None)
 
-    return intern_enum_items_strings(items)
+def read_batch_entries(batch_path, default_mesh_name):
+    """Reads the clips to be processed in a batch from a folder of .wav files or a CSV/JSON manifest.
 
+    A folder applies every .wav file in it to the default mesh, placed one after another.
+    A CSV manifest needs a "clip" column and may have "mesh" and "start_frame" columns. A JSON manifest is a list of objects with the same keys.
+    Relative clip paths in a manifest are relative to the manifest's folder. Entries without a start frame follow the previous clip on the same mesh.
 
-class OT_TestOpenFilebrowserWav(bpy.types.Operator, ImportHelper): 
-    bl_idname = "filepicker.open_filebrowser"
-    bl_label = "Pick .wav File"
-    bl_description = "Opens a file picker to pick a .wav file for lipsync"
-    
-    filter_glob: StringProperty( 
-        default='*.wav', 
-        options={'HIDDEN'} 
-    )
-    
-    def execute(self, context):
-        """Do something with the selected file(s)."""
-        filename, extension = os.path.splitext(self.filepath)
-        print('Selected file:', self.filepath)
-        print('File name:', filename)
-        print('File extension:', extension)
-        if not (extension.lower() == ".blend"):
-            context.scene.audio_file_path = self.filepath
-        return {'FINISHED'}
+    Args:
+        batch_path (str): Path to a folder or a .csv/.json manifest
+        default_mesh_name (str): Mesh used for entries that do not name one
 
+    Raises:
+        ValueError: Throws an error if the manifest has an unsupported extension or an entry without a clip
 
-def filter_callback(self, object):
-    return object.name in bpy.data.meshes.keys()
+    Returns:
+        list(tuple(str, str, int)): List of (clip path, mesh name, start frame) entries. Start frame is None for entries that follow the previous clip on the same mesh, or start at the scene start frame if there is none
+    """
+    if (os.path.isdir(batch_path)):
+        clips = sorted(name for name in os.listdir(batch_path) if name.lower().endswith(".wav"))
+        return [(os.path.join(batch_path, clip), default_mesh_name, None) for clip in clips]
+    extension = os.path.splitext(batch_path)[1].lower()
+    with open(batch_path, newline="") as f:
+        if (extension == ".csv"):
+            rows = list(csv.DictReader(f))
+        elif (extension == ".json"):
+            rows = json.load(f)
+        else:
+            raise ValueError(f"Unsupported manifest type {extension}. Use a folder, .csv or .json file")
+    manifest_folder = os.path.dirname(batch_path)
+    entries = []
+    for row in rows:
+        if (not row.get("clip")):
+            raise ValueError(f"Manifest entry {row} has no clip")
+        start_frame = row.get("start_frame")
+        entries.append((
+            os.path.join(manifest_folder, row["clip"]),
+            row.get("mesh") or default_mesh_name,
+            None if start_frame in (None, "") else int(start_frame)))
+    return entries
 
-class insert_keyframes(bpy.types.Operator):
-    bl_idname = "test_keyframe.func1"
-    bl_label = "Apply Keyframes"
-    bl_description = "Applies viseme keyframes for the given audio. Requires all visemes to be properly selected and a valid .wav file to be chosen"
+def process_batch_clip(wav_file_path, cache_folder, cache_size_limit, backend):
+    """Processes one batch clip into viseme values. Safe to run on a worker thread, as it does not touch any Blender data.
+
+    Args:
+        wav_file_path (str): Path to .wav file
+        cache_folder (str): Folder holding cached results, or None to disable caching
+        cache_size_limit (int): Largest total size of the cache folder in bytes
+        backend (VisemeBackend): Backend used to process the audio
+
+    Returns:
+        tuple(FrameData, ApplyStats): A tuple containing 1. the processed viseme values and 2. the stats of the clip so far, with total_seconds holding the time taken
+    """
+    start = time.perf_counter()
+    stats = ApplyStats(wav_file_path)
+    frame_data = FrameData().from_wav_file(wav_file_path, VISEME_FPS, keep_output_file=False, cache_folder=cache_folder, cache_size_limit=cache_size_limit, backend=backend, stats=stats)
+    stats.total_seconds = time.perf_counter() - start
+    return (frame_data, stats)
+
+class batch_insert_keyframes(bpy.types.Operator):
+    bl_idname = "test_keyframe.func5"
+    bl_label = "Apply Batch"
+    bl_description = "Applies viseme keyframes for every clip in a folder or manifest. Audio is processed in parallel, then keyframes are applied one clip at a time"
     def execute(self, context):
-        if not (context.scene.audio_file_path.endswith(".wav")):
-            self.report({"WARNING"}, "Selected audio file is not a .wav file!")
+        if (lipsync_apply_running(self)):
+            return {"CANCELLED"}
+        scene = context.scene
+        default_mesh_name = scene.my_collection_meshes.name if scene.my_collection_meshes else ""
+        try:
+            entries = read_batch_entries(bpy.path.abspath(scene.batch_path), default_mesh_name)
+        except (OSError, ValueError) as e:
+            self.report({"WARNING"}, f"Could not read batch: {e}")
             return {"CANCELLED"}
-        if (is_any_shapekey_default(context)):
-            self.report({"WARNING"}, "Not all viseme shapekeys are properly mapped! Ensure viseme shapekeys are mapped to something other than the Basis (default) shapekey.")
+        if (not entries):
+            self.report({"WARNING"}, "No clips found for batch!")
             return {"CANCELLED"}
-        if (context.scene.my_collection_meshes and context.scene.audio_file_path and not is_any_shapekey_default(context)):
-            context.scene.audio_folder_path = os.path.dirname(context.scene.audio_file_path)
-            scene_fps = bpy.context.scene.render.fps / bpy.context.scene.render.fps_base
-            viseme_fps = 100
-            output_file_path = context.scene.audio_folder_path + "\\visemes_output.txt"
-            frame_data = FrameData().from_wav_file(context.scene.audio_file_path, viseme_fps, output_file_path = output_file_path, keep_output_file=False)
-            # For now, assume viseme names follow this pattern: "vrc.v_(name)"
-            # Add ability to change this later
-            audio_length = len(frame_data.frames) / viseme_fps
-            audio_length_frames = audio_length * scene_fps
-            #viseme_fps / scene_fps
-            for i in range(int(audio_length_frames)):
-                frame_index = int(i * (viseme_fps / scene_fps))
-                frame = frame_data.get_frame_values(frame_index)
-                for name_index in range(len(frame_data.names)):
-                    shape = None
-                    if not (frame_data.names[name_index].lower() == "sil"):
-                        shape_value = frame[name_index]
-                    if (frame_data.names[name_index].lower() == "aa"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_aa)
-                    elif (frame_data.names[name_index].lower() == "ch"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_ch)
-                    elif (frame_data.names[name_index].lower() == "dd"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_dd)
-                    elif (frame_data.names[name_index].lower() == "e"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_e)
-                    elif (frame_data.names[name_index].lower() == "ff"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_ff)
-                    elif (frame_data.names[name_index].lower() == "ih"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_ih)
-                    elif (frame_data.names[name_index].lower() == "kk"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_kk)
-                    elif (frame_data.names[name_index].lower() == "nn"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_nn)
-                    elif (frame_data.names[name_index].lower() == "oh"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_oh)
-                    elif (frame_data.names[name_index].lower() == "ou"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_ou)
-                    elif (frame_data.names[name_index].lower() == "pp"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_pp)
-                    elif (frame_data.names[name_index].lower() == "rr"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_rr)
-                    elif (frame_data.names[name_index].lower() == "ss"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_ss)
-                    elif (frame_data.names[name_index].lower() == "th"):
-                        shape = shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_th)
-                        #name = "vrc.v_" + frame_data.names[name_index].lower()
-                        #context.scene.my_collection_meshes.shape_keys.key_blocks[name].value = shape_value
-                        #context.scene.my_collection_meshes.shape_keys.key_blocks[name].keyframe_insert(data_path='value', frame=i + context.scene.start_frame)
-                    if (shape != None):
-                        shape.value = shape_value
-                        shape.keyframe_insert(data_path='value', frame=i + context.scene.start_frame)
+        # Entries on the main mesh are also keyed onto the extra targets
+        entry_meshes = {default_mesh_name: lipsync_target_meshes(scene)}
+        for clip, mesh_name, _ in entries:
+            mesh = bpy.data.meshes.get(mesh_name)
+            if (mesh is None or not mesh.shape_keys):
+                self.report({"WARNING"}, f"Mesh \"{mesh_name}\" for {clip} does not exist or has no shapekeys!")
+                return {"CANCELLED"}
+            entry_meshes.setdefault(mesh_name, [mesh])
+            mapping_problem = lipsync_targets_problem(entry_meshes[mesh_name])
+            if (mapping_problem):
+                self.report({"WARNING"}, mapping_problem + "!")
+                return {"CANCELLED"}
+
+        cache_folder = get_cache_folder() if scene.use_cache else None
+        cache_size_limit = scene.cache_size_limit * 1024 * 1024
+        backend = get_viseme_backend(scene.viseme_backend)
+        scene_fps = scene.render.fps / scene.render.fps_base
+        window_manager = context.window_manager
+        # Each clip counts once for analysis and once for keyframing
+        window_manager.progress_begin(0, len(entries) * 2)
+        results = [None] * len(entries)
+        failures = []
+        profile = start_apply_profile(scene)
+        try:
+            with ThreadPoolExecutor(max_workers=scene.batch_workers) as executor:
+                futures = {
+                    executor.submit(process_batch_clip, clip, cache_folder, cache_size_limit, backend): index
+                    for index, (clip, _, _) in enumerate(entries)
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    index = futures[future]
+                    try:
+                        results[index] = future.result()
+                    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                        failures.append(entries[index][0])
+                        print(f"Failed to process {entries[index][0]}: {e}")
+                    window_manager.progress_update(done)
+
+            next_start_frames = {}
+            clip_counts = {}
+            total_keys = 0
+            log_problem = None
+            for index, ((clip, mesh_name, start_frame), result) in enumerate(zip(entries, results)):
+                # A clip used more than once on the same mesh is told apart by how often it was used before
+                clip_key = apply_clip_key(clip)
+                clip_counts[(clip_key, mesh_name)] = clip_counts.get((clip_key, mesh_name), 0) + 1
+                if (clip_counts[(clip_key, mesh_name)] > 1):
+                    clip_key += f"#{clip_counts[(clip_key, mesh_name)]}"
+                if (result is not None):
+                    frame_data, stats = result
+                    if (start_frame is None):
+                        start_frame = next_start_frames.get(mesh_name, scene.start_frame)
+                    apply_start = time.perf_counter()
+                    key_count, _, _, _ = apply_viseme_keyframes(scene, entry_meshes[mesh_name], frame_data, VISEME_FPS, start_frame, clip_key, stats)
+                    stats.total_seconds += time.perf_counter() - apply_start
+                    next_start_frames[mesh_name] = start_frame + resampled_frame_count(len(frame_data.frames), VISEME_FPS, scene_fps)
+                    total_keys += key_count
+                    log_problem = record_apply_stats(scene, stats) or log_problem
+                    print(f"{os.path.basename(clip)} -> {mesh_name} at frame {start_frame}: {key_count} keyframes, {stats.summary()}")
+                window_manager.progress_update(len(entries) + index + 1)
+        finally:
+            window_manager.progress_end()
+            if (profile is not None):
+                # The profile covers the whole batch rather than a single clip
+                print(f"Saved profile to {save_apply_profile(scene, profile)}")
+
+        if (failures):
+            self.report({"WARNING"}, f"Applied {len(entries) - len(failures)} of {len(entries)} clips ({total_keys} keyframes). Failed: {', '.join(os.path.basename(clip) for clip in failures)}")
+        else:
+            self.report({"INFO"}, f"Applied {len(entries)} clips ({total_keys} keyframes). See the system console for per-clip timing")
+        if (log_problem):
+            self.report({"WARNING"}, log_problem)
         return {'FINISHED'}
 
 class clear_lip_shapekeys(bpy.types.Operator):
     bl_idname = "test_keyframe.func3"
     bl_label = "Clear Viseme Shapekeys"
-    bl_description = "Clears shapekey values for currently selected viseme shapekeys"
+    bl_description = "Clears shapekey values for the mapped viseme shapekeys of the mesh and extra targets"
     def execute(self, context):
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_aa).value = 0.0
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_ch).value = 0.0
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_dd).value = 0.0
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_e).value = 0.0
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_ff).value = 0.0
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_ih).value = 0.0
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_kk).value = 0.0
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_nn).value = 0.0
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_oh).value = 0.0
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_ou).value = 0.0
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_pp).value = 0.0
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_rr).value = 0.0
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_ss).value = 0.0
-        shapekey_name_by_index(context, context.scene.my_collection_meshes.my_shapekey_th).value = 0.0
+        for mesh in lipsync_target_meshes(context.scene):
+            if (mesh.shape_keys):
+                for mapping in mesh.viseme_mappings:
+                    shape = mesh.shape_keys.key_blocks.get(mapping.shapekey)
+                    if (shape is not None):
+                        shape.value = 0.0
         return {'FINISHED'}
     
 class clear_shapekeys(bpy.types.Operator):
@@ -285,6 +2643,235 @@ class clear_shapekeys(bpy.types.Operator):
             shapekey.value = 0.0
         return {'FINISHED'}
 
+class clear_lipsync_cache(bpy.types.Operator):
+    bl_idname = "test_keyframe.func4"
+    bl_label = "Clear Cache"
+    bl_description = "Removes all cached viseme values, so every audio file is processed again on its next apply"
+    def execute(self, context):
+        freed = clear_frame_data_cache(get_cache_folder())
+        self.report({"INFO"}, f"Cleared {freed / (1024 * 1024):.1f} MB of cached viseme values")
+        return {'FINISHED'}
+
+class add_viseme_mapping(bpy.types.Operator):
+    bl_idname = "test_keyframe.func6"
+    bl_label = "Add Mapping"
+    bl_description = "Adds a viseme mapping. Map the same viseme more than once to drive several shapekeys with it"
+    def execute(self, context):
+        context.scene.my_collection_meshes.viseme_mappings.add()
+        return {'FINISHED'}
+
+class remove_viseme_mapping(bpy.types.Operator):
+    bl_idname = "test_keyframe.func7"
+    bl_label = "Remove Mapping"
+    bl_description = "Removes this viseme mapping"
+    index: IntProperty()
+    def execute(self, context):
+        context.scene.my_collection_meshes.viseme_mappings.remove(self.index)
+        return {'FINISHED'}
+
+class default_viseme_mappings(bpy.types.Operator):
+    bl_idname = "test_keyframe.func8"
+    bl_label = "Add Default Mappings"
+    bl_description = "Replaces the viseme mappings with one for each standard Oculus viseme, guessing shapekeys from their names"
+    def execute(self, context):
+        mesh = context.scene.my_collection_meshes
+        guesses = guess_viseme_mapping(mesh)
+        mesh.viseme_mappings.clear()
+        for viseme in MAPPED_VISEMES:
+            mapping = mesh.viseme_mappings.add()
+            mapping.viseme = viseme
+            mapping.shapekey = guesses[viseme]
+        return {'FINISHED'}
+
+class add_lipsync_target(bpy.types.Operator):
+    bl_idname = "test_keyframe.func9"
+    bl_label = "Add Target"
+    bl_description = "Adds another mesh to key from the same audio. Each target uses its own viseme mapping"
+    def execute(self, context):
+        context.scene.lipsync_targets.add()
+        return {'FINISHED'}
+
+class remove_lipsync_target(bpy.types.Operator):
+    bl_idname = "test_keyframe.func10"
+    bl_label = "Remove Target"
+    bl_description = "Removes this target mesh"
+    index: IntProperty()
+    def execute(self, context):
+        context.scene.lipsync_targets.remove(self.index)
+        return {'FINISHED'}
+
+class add_viseme_gain(bpy.types.Operator):
+    bl_idname = "test_keyframe.func13"
+    bl_label = "Add Gain"
+    bl_description = "Adds a gain and threshold for one viseme"
+    def execute(self, context):
+        context.scene.lipsync_smoothing.viseme_gains.add()
+        return {'FINISHED'}
+
+class remove_viseme_gain(bpy.types.Operator):
+    bl_idname = "test_keyframe.func14"
+    bl_label = "Remove Gain"
+    bl_description = "Removes this viseme gain"
+    index: IntProperty()
+    def execute(self, context):
+        context.scene.lipsync_smoothing.viseme_gains.remove(self.index)
+        return {'FINISHED'}
+
+class save_smoothing_preset(bpy.types.Operator):
+    bl_idname = "test_keyframe.func15"
+    bl_label = "Save Preset"
+    bl_description = "Stores the current post-processing settings on the scene as a preset. A preset with the same name is replaced"
+    name: StringProperty(name="Name", default="Preset")
+    def invoke(self, context, event):
+        return context.window_manager.invoke_props_dialog(self)
+
+    def execute(self, context):
+        presets = context.scene.smoothing_presets
+        preset = presets.get(self.name)
+        if (preset is None):
+            preset = presets.add()
+            preset.name = self.name
+        copy_smoothing_settings(context.scene.lipsync_smoothing, preset)
+        return {'FINISHED'}
+
+class load_smoothing_preset_operator(bpy.types.Operator):
+    bl_idname = "test_keyframe.func16"
+    bl_label = "Load Preset"
+    bl_description = "Replaces the current post-processing settings with this preset"
+    index: IntProperty()
+    def execute(self, context):
+        copy_smoothing_settings(context.scene.smoothing_presets[self.index], context.scene.lipsync_smoothing)
+        return {'FINISHED'}
+
+class remove_smoothing_preset(bpy.types.Operator):
+    bl_idname = "test_keyframe.func17"
+    bl_label = "Remove Preset"
+    bl_description = "Removes this post-processing preset"
+    index: IntProperty()
+    def execute(self, context):
+        context.scene.smoothing_presets.remove(self.index)
+        return {'FINISHED'}
+
+class start_preview(bpy.types.Operator):
+    bl_idname = "test_keyframe.func18"
+    bl_label = "Preview"
+    bl_description = "Drives the mapped viseme shapekeys from the selected audio while scrubbing or playing the timeline, without writing keyframes. Uses cached viseme values if the audio was applied before"
+    def execute(self, context):
+        if (lipsync_apply_running(self)):
+            return {"CANCELLED"}
+        scene = context.scene
+        if not (scene.audio_file_path.endswith(".wav")):
+            self.report({"WARNING"}, "Selected audio file is not a .wav file!")
+            return {"CANCELLED"}
+        meshes = lipsync_target_meshes(scene)
+        mapping_problem = lipsync_targets_problem(meshes)
+        if (mapping_problem):
+            self.report({"WARNING"}, mapping_problem + "!")
+            return {"CANCELLED"}
+        start_time, end_time = audio_time_range(scene)
+        cache_folder = get_cache_folder() if scene.use_cache else None
+        try:
+            frame_data = FrameData().from_wav_file(scene.audio_file_path, VISEME_FPS, cache_folder=cache_folder, cache_size_limit=scene.cache_size_limit * 1024 * 1024, start_time=start_time, end_time=end_time, backend=get_viseme_backend(scene.viseme_backend))
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            self.report({"ERROR"}, f"Could not process audio: {e}")
+            return {"CANCELLED"}
+        start_lipsync_preview(scene, meshes, frame_data, VISEME_FPS, scene.audio_file_path)
+        if (any(shapekey_fcurve(shape) is not None for mesh in meshes for _, shape, _ in build_viseme_channel_map(mesh, frame_data.names))):
+            self.report({"WARNING"}, "Some previewed shapekeys already have keyframes, which override the preview. Clear them to see the preview on those shapekeys")
+        else:
+            self.report({"INFO"}, "Previewing lipsync. Scrub or play the timeline, then Commit to keyframe it")
+        return {'FINISHED'}
+
+class stop_preview(bpy.types.Operator):
+    bl_idname = "test_keyframe.func19"
+    bl_label = "Stop Preview"
+    bl_description = "Stops the lipsync preview and restores the previewed shapekey values"
+    def execute(self, context):
+        stop_lipsync_preview()
+        return {'FINISHED'}
+
+class commit_preview(bpy.types.Operator):
+    bl_idname = "test_keyframe.func20"
+    bl_label = "Commit"
+    bl_description = "Stops the lipsync preview and keyframes the previewed viseme values at the current Start Frame, without processing the audio again"
+    def execute(self, context):
+        if (lipsync_apply_running(self)):
+            return {"CANCELLED"}
+        scene = context.scene
+        preview = stop_lipsync_preview()
+        if (preview is None):
+            return {"CANCELLED"}
+        meshes = preview.meshes()
+        mapping_problem = lipsync_targets_problem(meshes)
+        if (mapping_problem):
+            self.report({"WARNING"}, mapping_problem + "!")
+            return {"CANCELLED"}
+        stats = ApplyStats(preview.clip)
+        stats.cache_hit = True
+        stats.add_frame_data(preview.frame_data, preview.viseme_fps)
+        commit_start = time.perf_counter()
+        apply_viseme_keyframes(scene, meshes, preview.frame_data, preview.viseme_fps, scene.start_frame, apply_clip_key(preview.clip), stats)
+        stats.total_seconds = time.perf_counter() - commit_start
+        log_problem = record_apply_stats(scene, stats)
+        self.report({"INFO"}, apply_report(scene, stats))
+        if (log_problem):
+            self.report({"WARNING"}, log_problem)
+        return {'FINISHED'}
+
+class export_track(bpy.types.Operator, ExportHelper):
+    bl_idname = "test_keyframe.func11"
+    bl_label = "Export Track"
+    bl_description = "Processes the selected audio and saves its viseme curves as a compact track file for game engines, without keyframing anything. Save with a .json extension for the JSON layout"
+
+    filename_ext = tracks.TRACK_FILE_EXTENSION
+    check_extension = None
+    filter_glob: StringProperty(
+        default="*" + tracks.TRACK_FILE_EXTENSION + ";*.json",
+        options={'HIDDEN'}
+    )
+
+    def execute(self, context):
+        scene = context.scene
+        if not (scene.audio_file_path.endswith(".wav")):
+            self.report({"WARNING"}, "Selected audio file is not a .wav file!")
+            return {"CANCELLED"}
+        cache_folder = get_cache_folder() if scene.use_cache else None
+        start_time, end_time = audio_time_range(scene)
+        try:
+            track, file_size = export_viseme_track(scene, scene.audio_file_path, self.filepath, get_viseme_backend(scene.viseme_backend), cache_folder, scene.cache_size_limit * 1024 * 1024, start_time, end_time)
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            self.report({"ERROR"}, f"Could not export track: {e}")
+            return {"CANCELLED"}
+        key_count = sum(len(channel.frames) for channel in track.channels)
+        self.report({"INFO"}, f"Exported {len(track.channels)} channels, {key_count} keys at {track.frame_rate:g} fps ({file_size / 1024:.1f} KB) to {self.filepath}")
+        return {'FINISHED'}
+
+class import_track(bpy.types.Operator, ImportHelper):
+    bl_idname = "test_keyframe.func12"
+    bl_label = "Import Track"
+    bl_description = "Keyframes a track file onto the mapped viseme shapekeys of the mesh and extra targets, starting at Start Frame, without processing audio"
+
+    filter_glob: StringProperty(
+        default="*" + tracks.TRACK_FILE_EXTENSION + ";*.json",
+        options={'HIDDEN'}
+    )
+
+    def execute(self, context):
+        if (lipsync_apply_running(self)):
+            return {"CANCELLED"}
+        scene = context.scene
+        stats = ApplyStats(self.filepath)
+        try:
+            import_viseme_track(scene, lipsync_target_meshes(scene), self.filepath, scene.start_frame, stats)
+        except (OSError, ValueError) as e:
+            self.report({"ERROR"}, f"Could not import track: {e}")
+            return {"CANCELLED"}
+        log_problem = record_apply_stats(scene, stats)
+        self.report({"INFO"}, apply_report(scene, stats))
+        if (log_problem):
+            self.report({"WARNING"}, log_problem)
+        return {'FINISHED'}
+
 class TestPanel_PT_mainpanel(bpy.types.Panel):
     bl_label = "Lipsync"
     bl_idname = "TESTPANEL_PT_main"
@@ -309,15 +2896,43 @@ class TestPanel_PT_mainpanel(bpy.types.Panel):
             row = layout.row()
             row.operator(OT_TestOpenFilebrowserWav.bl_idname)
             row = layout.row()
+            row.prop(scene, "viseme_backend")
+            row = layout.row()
+            row.prop(scene, "use_audio_range")
+            if (scene.use_audio_range):
+                row = layout.row(align=True)
+                row.prop(scene, "audio_start_time")
+                row.prop(scene, "audio_end_time")
+            row = layout.row()
+            row.prop(scene, "resample_mode")
+            row = layout.row()
+            row.prop(scene, "simplify_tolerance")
+            row = layout.row()
+            row.prop(scene, "use_bulk_keyframes")
+            row = layout.row()
+            row.prop(scene, "use_incremental_apply")
+            row = layout.row()
             row.operator(insert_keyframes.bl_idname)
-            if (context.scene.audio_file_path and not is_any_shapekey_default(context)):
+            if (context.scene.audio_file_path and not lipsync_targets_problem(lipsync_target_meshes(scene))):
                 row.active = True
             else:
                 row.active = False
+            row = layout.row(align=True)
+            if (LIPSYNC_PREVIEW is None):
+                row.operator(start_preview.bl_idname, icon="PLAY")
+                row.active = bool(context.scene.audio_file_path)
+            else:
+                row.operator(commit_preview.bl_idname, icon="CHECKMARK")
+                row.operator(stop_preview.bl_idname, icon="X")
             row = layout.row()
             row.operator(clear_lip_shapekeys.bl_idname)
             row = layout.row()
             row.operator(clear_shapekeys.bl_idname)
+            row = layout.row()
+            row.prop(scene, "use_cache")
+            row.prop(scene, "cache_size_limit")
+            row = layout.row()
+            row.operator(clear_lipsync_cache.bl_idname)
 
 class TESTPANEL_PT_visemespanel(bpy.types.Panel):
     bl_parent_id = "TESTPANEL_PT_main"
@@ -332,38 +2947,155 @@ class TESTPANEL_PT_visemespanel(bpy.types.Panel):
             context.scene and
             context.scene.my_collection_meshes and
             context.scene.my_collection_meshes.shape_keys):
+            mesh = context.scene.my_collection_meshes
+            for index, mapping in enumerate(mesh.viseme_mappings):
+                row = layout.row(align=True)
+                row.prop(mapping, "viseme", text="")
+                row.prop_search(mapping, "shapekey", mesh.shape_keys, "key_blocks", text="")
+                row.prop(mapping, "weight", text="")
+                row.operator(remove_viseme_mapping.bl_idname, text="", icon="X").index = index
             row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_aa")
-            row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_ch")
-            row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_dd")
-            row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_e")
-            row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_ff")
-            row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_ih")
-            row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_kk")
-            row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_nn")
-            row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_oh")
-            row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_ou")
-            row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_pp")
-            row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_rr")
-            row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_ss")
-            row = layout.row()
-            row.prop(context.scene.my_collection_meshes, "my_shapekey_th")
-        
+            row.operator(add_viseme_mapping.bl_idname, icon="ADD")
+            row.operator(default_viseme_mappings.bl_idname)
+
+class TESTPANEL_PT_targetspanel(bpy.types.Panel):
+    bl_parent_id = "TESTPANEL_PT_main"
+    bl_label = "Extra Targets"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_category = "OVR Lipsync"
+    bl_options = {"DEFAULT_CLOSED"}
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+        for index, target in enumerate(scene.lipsync_targets):
+            row = layout.row(align=True)
+            row.prop(target, "mesh", text="")
+            row.operator(remove_lipsync_target.bl_idname, text="", icon="X").index = index
+        row = layout.row()
+        row.operator(add_lipsync_target.bl_idname, icon="ADD")
+        if (scene.lipsync_targets):
+            layout.label(text="Select a target as Mesh to edit its viseme mapping")
+
+class TESTPANEL_PT_batchpanel(bpy.types.Panel):
+    bl_parent_id = "TESTPANEL_PT_main"
+    bl_label = "Batch"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_category = "OVR Lipsync"
+    bl_options = {"DEFAULT_CLOSED"}
+    
+    def draw(self, context):
+        scene = context.scene
+        layout = self.layout
+        row = layout.row()
+        row.prop(scene, "batch_path")
+        row = layout.row()
+        row.prop(scene, "batch_workers")
+        row = layout.row()
+        row.operator(batch_insert_keyframes.bl_idname)
+        row.active = bool(scene.batch_path)
 
+class TESTPANEL_PT_statspanel(bpy.types.Panel):
+    bl_parent_id = "TESTPANEL_PT_main"
+    bl_label = "Statistics"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_category = "OVR Lipsync"
+    bl_options = {"DEFAULT_CLOSED"}
+
+    def draw(self, context):
+        scene = context.scene
+        layout = self.layout
+        stats = LAST_APPLY_STATS
+        if (stats is None):
+            layout.label(text="No apply in this session yet")
+        else:
+            column = layout.column(align=True)
+            column.label(text=os.path.basename(stats.clip))
+            column.label(text=f"Audio: {stats.audio_seconds:.1f}s, {stats.frames_parsed} frames")
+            if (stats.cache_hit):
+                column.label(text=f"Cache load: {stats.parse_seconds:.3f}s")
+            else:
+                column.label(text=f"Conversion: {stats.conversion_seconds:.3f}s")
+                column.label(text=f"Analysis ({stats.backend}): {stats.analysis_seconds:.3f}s")
+                column.label(text=f"Parsing: {stats.parse_seconds:.3f}s")
+            column.label(text=f"Build: {stats.build_seconds:.3f}s")
+            column.label(text=f"Write: {stats.write_seconds:.3f}s")
+            column.label(text=f"Keyframes: {stats.keyframes_written} written, {stats.keyframes_removed} simplified, {stats.keyframes_kept} kept")
+            column.label(text=f"Total: {stats.total_seconds:.3f}s on {stats.meshes} mesh(es)")
+        row = layout.row()
+        row.prop(scene, "use_apply_profiling")
+        row = layout.row()
+        row.prop(scene, "stats_log_path")
+
+class TESTPANEL_PT_smoothingpanel(bpy.types.Panel):
+    bl_parent_id = "TESTPANEL_PT_main"
+    bl_label = "Post-Processing"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_category = "OVR Lipsync"
+    bl_options = {"DEFAULT_CLOSED"}
+
+    def draw(self, context):
+        scene = context.scene
+        settings = scene.lipsync_smoothing
+        layout = self.layout
+        row = layout.row()
+        row.prop(settings, "enabled")
+        column = layout.column()
+        column.active = settings.enabled
+        row = column.row(align=True)
+        row.prop(settings, "attack_time")
+        row.prop(settings, "release_time")
+        row = column.row()
+        row.prop(settings, "smoothing_mode")
+        if (settings.smoothing_mode != "NONE"):
+            row = column.row()
+            row.prop(settings, "smoothing_time")
+        row = column.row()
+        row.prop(settings, "top_count")
+        for index, gain in enumerate(settings.viseme_gains):
+            row = column.row(align=True)
+            row.prop(gain, "viseme", text="")
+            row.prop(gain, "gain", text="")
+            row.prop(gain, "threshold", text="")
+            row.operator(remove_viseme_gain.bl_idname, text="", icon="X").index = index
+        row = column.row()
+        row.operator(add_viseme_gain.bl_idname, icon="ADD")
+
+        layout.label(text="Presets")
+        for index, preset in enumerate(scene.smoothing_presets):
+            row = layout.row(align=True)
+            row.operator(load_smoothing_preset_operator.bl_idname, text=preset.name).index = index
+            row.operator(remove_smoothing_preset.bl_idname, text="", icon="X").index = index
+        row = layout.row()
+        row.operator(save_smoothing_preset.bl_idname, icon="ADD")
+
+class TESTPANEL_PT_trackspanel(bpy.types.Panel):
+    bl_parent_id = "TESTPANEL_PT_main"
+    bl_label = "Track Files"
+    bl_space_type = "VIEW_3D"
+    bl_region_type = "UI"
+    bl_category = "OVR Lipsync"
+    bl_options = {"DEFAULT_CLOSED"}
+
+    def draw(self, context):
+        scene = context.scene
+        layout = self.layout
+        row = layout.row()
+        row.prop(scene, "track_use_scene_fps")
+        row = layout.row()
+        row.prop(scene, "track_quantization", expand=True)
+        row = layout.row()
+        row.operator(export_track.bl_idname, icon="EXPORT")
+        row.active = bool(scene.audio_file_path)
+        row = layout.row()
+        row.operator(import_track.bl_idname, icon="IMPORT")
+        row.active = not lipsync_targets_problem(lipsync_target_meshes(scene))
 
-classes = [OT_TestOpenFilebrowserWav, insert_keyframes, clear_lip_shapekeys, clear_shapekeys, TestPanel_PT_mainpanel, TESTPANEL_PT_visemespanel]
+classes = [VisemeMapping, LipsyncApplyRecord, VisemeGain, SmoothingSettings, OT_TestOpenFilebrowserWav, insert_keyframes, batch_insert_keyframes, clear_lip_shapekeys, clear_shapekeys, clear_lipsync_cache, add_viseme_mapping, remove_viseme_mapping, default_viseme_mappings, LipsyncTarget, add_lipsync_target, remove_lipsync_target, TestPanel_PT_mainpanel, TESTPANEL_PT_visemespanel, TESTPANEL_PT_targetspanel, TESTPANEL_PT_batchpanel, TESTPANEL_PT_statspanel, export_track, import_track, TESTPANEL_PT_trackspanel, add_viseme_gain, remove_viseme_gain, save_smoothing_preset, load_smoothing_preset_operator, remove_smoothing_preset, TESTPANEL_PT_smoothingpanel, start_preview, stop_preview, commit_preview]
 
 def register():
     bpy.types.Scene.my_collection_meshes = PointerProperty(
@@ -372,116 +3104,67 @@ def register():
         poll=filter_callback)
     bpy.types.Scene.start_frame = IntProperty(name="Start Frame", description="Beginning frame for audio to be applied", default=0, min=0, subtype='UNSIGNED')
     bpy.types.Scene.audio_file_path = StringProperty(name="Audio File Path", description="Path to .wav file", default="")
-    bpy.types.Scene.audio_folder_path = StringProperty(name="Temp Folder Path", description="Path to folder containing .wav file. This is where the visemes_output.txt file will be temporarily stored before being deleted", default="")
-    
-    bpy.types.Mesh.my_shapekey_aa = bpy.props.EnumProperty(
-        name="AA",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
-    
-    bpy.types.Mesh.my_shapekey_ch = bpy.props.EnumProperty(
-        name="CH",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
-    
-    bpy.types.Mesh.my_shapekey_dd = bpy.props.EnumProperty(
-        name="DD",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
-    
-    bpy.types.Mesh.my_shapekey_e = bpy.props.EnumProperty(
-        name="E",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
-    
-    bpy.types.Mesh.my_shapekey_ff = bpy.props.EnumProperty(
-        name="FF",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
-    
-    bpy.types.Mesh.my_shapekey_ih = bpy.props.EnumProperty(
-        name="IH",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
-    
-    bpy.types.Mesh.my_shapekey_kk = bpy.props.EnumProperty(
-        name="KK",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
-    
-    bpy.types.Mesh.my_shapekey_nn = bpy.props.EnumProperty(
-        name="NN",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
-    
-    bpy.types.Mesh.my_shapekey_oh = bpy.props.EnumProperty(
-        name="OH",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
-    
-    bpy.types.Mesh.my_shapekey_ou = bpy.props.EnumProperty(
-        name="OU",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
-    
-    bpy.types.Mesh.my_shapekey_pp = bpy.props.EnumProperty(
-        name="PP",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
-    
-    bpy.types.Mesh.my_shapekey_rr = bpy.props.EnumProperty(
-        name="RR",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
-    
-    bpy.types.Mesh.my_shapekey_ss = bpy.props.EnumProperty(
-        name="SS",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
-    
-    bpy.types.Mesh.my_shapekey_th = bpy.props.EnumProperty(
-        name="TH",
-        description="Select a shapekey",
-        items=my_shapekey_enum_items_callback,
-    )
+    bpy.types.Scene.audio_folder_path = StringProperty(name="Audio Folder Path", description="Path to folder containing .wav file", default="")
+    bpy.types.Scene.viseme_backend = EnumProperty(name="Analyzer", description="How viseme values are generated from audio", items=VISEME_BACKEND_ITEMS, default="AUTO")
+    bpy.types.Scene.use_audio_range = BoolProperty(name="Limit Audio Range", description="Only processes part of the audio file, so long recordings do not need to be cut beforehand", default=False)
+    bpy.types.Scene.audio_start_time = FloatProperty(name="Start", description="Time in seconds to start processing the audio at", default=0.0, min=0.0, subtype='TIME_ABSOLUTE', unit='TIME_ABSOLUTE')
+    bpy.types.Scene.audio_end_time = FloatProperty(name="End", description="Time in seconds to stop processing the audio at. Set to 0 to process until the end of the file", default=0.0, min=0.0, subtype='TIME_ABSOLUTE', unit='TIME_ABSOLUTE')
+    bpy.types.Scene.resample_mode = EnumProperty(name="Resampling", description="How viseme values are resampled to the scene frame rate", items=RESAMPLE_MODES, default="NEAREST")
+    bpy.types.Scene.simplify_tolerance = FloatProperty(name="Simplify Tolerance", description="Removes keyframes that can be reproduced from their neighbours within this shapekey value difference. Set to 0 to keep every keyframe", default=0.0, min=0.0, max=1.0, precision=3, step=0.1)
+    bpy.types.Scene.use_cache = BoolProperty(name="Cache Results", description="Reuses viseme values from earlier applies of the same audio instead of processing it again", default=True)
+    bpy.types.Scene.cache_size_limit = IntProperty(name="Cache Size (MB)", description="Largest total size of cached viseme values. Least recently used results are removed first", default=512, min=1)
+    bpy.types.Scene.batch_path = StringProperty(name="Batch", description="Folder of .wav files, or a .csv/.json manifest listing clip, mesh and start_frame for each entry", default="", subtype='FILE_PATH')
+    bpy.types.Scene.batch_workers = IntProperty(name="Parallel Jobs", description="Number of audio files processed at the same time during a batch", default=4, min=1, max=64)
+    bpy.types.Scene.use_bulk_keyframes = BoolProperty(name="Bulk Keyframe Write", description="Writes all keyframes for each viseme directly onto its F-curve at once. Disable to fall back to inserting keyframes one at a time", default=True)
+    bpy.types.Scene.use_incremental_apply = BoolProperty(name="Incremental Apply", description="When a clip is applied again, only rewrites shapekeys whose keyframes changed, moves the others if the start frame changed, and removes keyframes left over from the last apply of the clip", default=True)
+    bpy.types.Scene.use_apply_profiling = BoolProperty(name="Profile Applies", description="Runs applies under cProfile and saves a .prof file next to the JSON log, or in the temp folder if there is none", default=False)
+    bpy.types.Scene.stats_log_path = StringProperty(name="JSON Log", description="File each apply appends a line of JSON stats to, for collection by monitoring tools. Leave empty to disable", default="", subtype='FILE_PATH')
+    bpy.types.Scene.track_use_scene_fps = BoolProperty(name="Resample to Scene FPS", description="Exports tracks at the scene frame rate using the Resampling setting, instead of the 100 fps viseme rate. Simplify Tolerance is applied either way", default=False)
+    bpy.types.Scene.track_quantization = EnumProperty(name="Quantization", description="Size of each key value in exported tracks", items=TRACK_QUANTIZATION_ITEMS, default="16")
     
     for cls in classes:
         bpy.utils.register_class(cls)
+    bpy.types.Mesh.viseme_mappings = CollectionProperty(type=VisemeMapping)
+    bpy.types.Scene.lipsync_targets = CollectionProperty(type=LipsyncTarget)
+    bpy.types.Key.lipsync_apply_records = CollectionProperty(type=LipsyncApplyRecord)
+    bpy.types.Scene.lipsync_smoothing = PointerProperty(type=SmoothingSettings)
+    bpy.types.Scene.smoothing_presets = CollectionProperty(type=SmoothingSettings)
+    bpy.app.handlers.load_post.append(migrate_legacy_viseme_mappings)
+    bpy.app.handlers.load_pre.append(stop_lipsync_preview_on_load)
     
 def unregister():
+    stop_lipsync_preview()
+    if (migrate_legacy_viseme_mappings in bpy.app.handlers.load_post):
+        bpy.app.handlers.load_post.remove(migrate_legacy_viseme_mappings)
+    if (stop_lipsync_preview_on_load in bpy.app.handlers.load_pre):
+        bpy.app.handlers.load_pre.remove(stop_lipsync_preview_on_load)
+    del bpy.types.Mesh.viseme_mappings
+    del bpy.types.Scene.lipsync_targets
+    del bpy.types.Key.lipsync_apply_records
+    del bpy.types.Scene.lipsync_smoothing
+    del bpy.types.Scene.smoothing_presets
     for cls in classes:
         bpy.utils.unregister_class(cls)
-    del bpy.types.Collection.my_collection_meshes
+    del bpy.types.Scene.my_collection_meshes
     del bpy.types.Scene.start_frame
     del bpy.types.Scene.audio_file_path
     del bpy.types.Scene.audio_folder_path
-    del bpy.types.Mesh.my_shapekey_aa
-    del bpy.types.Mesh.my_shapekey_ch
-    del bpy.types.Mesh.my_shapekey_dd
-    del bpy.types.Mesh.my_shapekey_e
-    del bpy.types.Mesh.my_shapekey_ff
-    del bpy.types.Mesh.my_shapekey_ih
-    del bpy.types.Mesh.my_shapekey_kk
-    del bpy.types.Mesh.my_shapekey_nn
-    del bpy.types.Mesh.my_shapekey_oh
-    del bpy.types.Mesh.my_shapekey_ou
-    del bpy.types.Mesh.my_shapekey_pp
-    del bpy.types.Mesh.my_shapekey_rr
-    del bpy.types.Mesh.my_shapekey_ss
-    del bpy.types.Mesh.my_shapekey_th
+    del bpy.types.Scene.viseme_backend
+    del bpy.types.Scene.use_audio_range
+    del bpy.types.Scene.audio_start_time
+    del bpy.types.Scene.audio_end_time
+    del bpy.types.Scene.resample_mode
+    del bpy.types.Scene.simplify_tolerance
+    del bpy.types.Scene.use_bulk_keyframes
+    del bpy.types.Scene.use_incremental_apply
+    del bpy.types.Scene.use_apply_profiling
+    del bpy.types.Scene.stats_log_path
+    del bpy.types.Scene.track_use_scene_fps
+    del bpy.types.Scene.track_quantization
+    del bpy.types.Scene.use_cache
+    del bpy.types.Scene.batch_path
+    del bpy.types.Scene.batch_workers
+    del bpy.types.Scene.cache_size_limit
     
 
 if (__name__ == "__main__"):
@@ -0,0 +1,178 @@
+import numpy as np
+
+ANALYZER_VERSION = 1
+"""Version of the analysis below. Bump this whenever its output changes, so cached results are invalidated."""
+
+ANALYSIS_SAMPLE_RATE = 16000
+"""Sample rate audio is resampled to before analysis. Speech content above 8 kHz is not needed to tell visemes apart."""
+
+VISEME_NAMES = ["sil", "PP", "FF", "TH", "DD", "kk", "CH", "SS", "nn", "RR", "aa", "E", "ih", "oh", "ou"]
+"""Viseme names in the same column order as ProcessWAV output."""
+
+VOICED_PROTOTYPES = {
+    "aa": (750.0, 1200.0),
+    "E": (550.0, 1850.0),
+    "ih": (400.0, 2100.0),
+    "oh": (500.0, 900.0),
+    "ou": (350.0, 800.0),
+    "RR": (450.0, 1350.0),
+    "nn": (280.0, 1600.0),
+}
+"""Typical (F1, F2) formant frequencies in Hz of voiced visemes."""
+
+FRICATIVE_PROTOTYPES = {
+    "SS": (6000.0, 1200.0),
+    "CH": (3500.0, 900.0),
+    "FF": (4500.0, 2000.0),
+    "TH": (3000.0, 2000.0),
+}
+"""Typical (spectral centroid, spread) in Hz of unvoiced fricative visemes."""
+
+PLOSIVE_PROTOTYPES = {
+    "PP": (900.0, 600.0),
+    "kk": (2000.0, 600.0),
+    "DD": (3500.0, 1000.0),
+}
+"""Typical (spectral centroid, spread) in Hz of the burst of plosive visemes."""
+
+WINDOW_SECONDS = 0.032
+"""Length of the analysis window centered on each frame."""
+
+CHUNK_FRAMES = 4096
+"""Number of frames whose spectra are computed at once, which bounds memory use on long clips."""
+
+def frame_features(samples, sample_rate, frame_rate, progress = None):
+    """Computes per-frame spectral features of mono audio.
+
+    Args:
+        samples (numpy.ndarray): Mono samples in the range -1 to 1
+        sample_rate (int): Sample rate of samples
+        frame_rate (float): Number of frames per second to compute features for
+        progress (callable, optional): Called with the number of frames processed so far after each chunk. Defaults to None.
+
+    Returns:
+        dict(str, numpy.ndarray): Feature arrays of length n_frames, keyed by feature name
+    """
+    hop = sample_rate / float(frame_rate)
+    frame_count = int(len(samples) / hop)
+    window_size = int(round(WINDOW_SECONDS * sample_rate))
+    fft_size = 1 << (window_size - 1).bit_length()
+    window = np.hanning(window_size).astype(np.float32)
+    freqs = np.fft.rfftfreq(fft_size, 1.0 / sample_rate)
+    bands = {
+        "low": (freqs >= 80) & (freqs < 1000),
+        "nasal": (freqs >= 80) & (freqs < 400),
+        "high": (freqs >= 3000),
+        "f1": (freqs >= 250) & (freqs < 1000),
+        "f2": (freqs >= 800) & (freqs < 2800),
+    }
+    # Pad so every frame has a full window centered on its start time
+    padded = np.pad(samples.astype(np.float32, copy=False), (window_size // 2, window_size))
+    offsets = np.arange(window_size)
+
+    names = ("energy", "low", "nasal", "high", "total", "centroid", "f1", "f2")
+    features = {name: np.zeros(frame_count, dtype=np.float32) for name in names}
+    for first in range(0, frame_count, CHUNK_FRAMES):
+        last = min(first + CHUNK_FRAMES, frame_count)
+        starts = (np.arange(first, last) * hop).astype(np.intp)
+        frames = padded[starts[:, np.newaxis] + offsets]
+        power = np.abs(np.fft.rfft(frames * window, fft_size, axis=1)) ** 2
+        total = power.sum(axis=1) + 1e-12
+        features["energy"][first:last] = np.mean(frames * frames, axis=1)
+        features["total"][first:last] = total
+        for band in ("low", "nasal", "high"):
+            features[band][first:last] = power[:, bands[band]].sum(axis=1)
+        features["centroid"][first:last] = (power * freqs).sum(axis=1) / total
+        features["f1"][first:last] = freqs[bands["f1"]][np.argmax(power[:, bands["f1"]], axis=1)]
+        features["f2"][first:last] = freqs[bands["f2"]][np.argmax(power[:, bands["f2"]], axis=1)]
+        if (progress is not None):
+            progress(last)
+    return features
+
+def gaussian_scores(values, prototypes, names):
+    """Scores how close each frame is to a set of prototypes, normalized so each frame's scores sum to 1.
+
+    Args:
+        values (numpy.ndarray): (n_frames, n_dimensions) matrix of feature values
+        prototypes (dict(str, tuple)): Prototype parameters keyed by viseme name. Either a center per dimension, or a (center, spread) pair for a single dimension
+        names (list(str)): Viseme names to score, in output column order
+
+    Returns:
+        numpy.ndarray: (n_frames, len(names)) matrix of scores
+    """
+    if (values.shape[1] == 1):
+        centers = np.array([[prototypes[name][0]] for name in names])
+        spreads = np.array([[prototypes[name][1]] for name in names])
+    else:
+        centers = np.array([prototypes[name] for name in names])
+        # F1 varies less than F2 between vowels, so it gets a narrower spread
+        spreads = np.array([[200.0, 400.0]] * len(names))
+    distances = ((values[:, np.newaxis, :] - centers[np.newaxis]) / spreads[np.newaxis]) ** 2
+    scores = np.exp(-0.5 * distances.sum(axis=2))
+    return scores / (scores.sum(axis=1, keepdims=True) + 1e-12)
+
+def analyze_visemes(samples, sample_rate, frame_rate, progress = None):
+    """Estimates viseme weights from audio energy and spectral features. This is a lightweight reference analyzer for machines that cannot run ProcessWAV, and is less accurate than Oculus Lipsync.
+
+    Each frame is split between silence, voiced sounds (matched on formants), fricatives and plosive bursts (matched on spectral centroid), so every row sums to 1 like ProcessWAV output.
+
+    Args:
+        samples (numpy.ndarray): Mono samples in the range -1 to 1
+        sample_rate (int): Sample rate of samples
+        frame_rate (float): Number of viseme frames per second
+        progress (callable, optional): Called with the number of frames processed so far. Defaults to None.
+
+    Returns:
+        numpy.ndarray: (n_frames, len(VISEME_NAMES)) float32 matrix of viseme values
+    """
+    features = frame_features(samples, sample_rate, frame_rate, progress)
+    frame_count = len(features["energy"])
+    result = np.zeros((frame_count, len(VISEME_NAMES)), dtype=np.float32)
+    if (frame_count == 0):
+        return result
+    columns = {name: index for index, name in enumerate(VISEME_NAMES)}
+
+    # Speech activity relative to the clip's own noise floor and peak level
+    level = 10.0 * np.log10(features["energy"] + 1e-10)
+    floor, peak = np.percentile(level, [10, 99])
+    relative = np.clip((level - floor) / max(peak - floor, 1e-3), 0.0, 1.0)
+    speech = np.clip((relative - 0.25) / 0.25, 0.0, 1.0)
+
+    # A sharp rise in level marks the release of a plosive
+    onset = np.clip(np.diff(level, prepend=level[0]) / 12.0, 0.0, 1.0) * speech
+    voicing = np.clip(features["low"] / features["total"] * 1.5, 0.0, 1.0)
+    frication = np.clip(features["high"] / features["total"] * 2.0, 0.0, 1.0)
+    nasality = features["nasal"] / (features["low"] + 1e-12)
+
+    voiced_weight = speech * (1.0 - onset) * voicing
+    fricative_weight = speech * (1.0 - onset) * (1.0 - voicing) * np.maximum(frication, 0.5)
+    plosive_weight = onset
+    silence_weight = 1.0 - speech
+
+    voiced_names = list(VOICED_PROTOTYPES)
+    formants = np.stack((features["f1"], features["f2"]), axis=1)
+    voiced_scores = gaussian_scores(formants, VOICED_PROTOTYPES, voiced_names)
+    # Nasals concentrate their low band energy below 400 Hz
+    voiced_scores[:, voiced_names.index("nn")] *= np.clip(nasality * 2.0, 0.0, 2.0)
+    voiced_scores /= voiced_scores.sum(axis=1, keepdims=True) + 1e-12
+
+    centroid = features["centroid"][:, np.newaxis]
+    fricative_names = list(FRICATIVE_PROTOTYPES)
+    fricative_scores = gaussian_scores(centroid, FRICATIVE_PROTOTYPES, fricative_names)
+    # Weak fricatives are more likely to be FF or TH than SS or CH
+    weak = (1.0 - relative)[:, np.newaxis]
+    strength = np.array([[name in ("FF", "TH") for name in fricative_names]], dtype=np.float32)
+    fricative_scores *= strength * weak + (1.0 - strength) * (1.0 - weak)
+    fricative_scores /= fricative_scores.sum(axis=1, keepdims=True) + 1e-12
+
+    plosive_names = list(PLOSIVE_PROTOTYPES)
+    plosive_scores = gaussian_scores(centroid, PLOSIVE_PROTOTYPES, plosive_names)
+
+    result[:, columns["sil"]] = silence_weight
+    for group_weight, group_names, group_scores in (
+        (voiced_weight, voiced_names, voiced_scores),
+        (fricative_weight, fricative_names, fricative_scores),
+        (plosive_weight, plosive_names, plosive_scores)):
+        result[:, [columns[name] for name in group_names]] = group_weight[:, np.newaxis] * group_scores
+    result /= result.sum(axis=1, keepdims=True) + 1e-12
+    return result
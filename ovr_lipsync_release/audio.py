@@ -0,0 +1,371 @@
+import numpy as np
+import struct
+import wave
+
+PROCESSWAV_SAMPLE_RATE = 48000
+"""Sample rate audio is converted to before being passed to ProcessWAV."""
+
+CHUNK_SECONDS = 10.0
+"""Amount of audio decoded, resampled and written at a time when converting files, in seconds."""
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+class WavInfo:
+    def __init__(self, format_tag, channels, sample_rate, bits_per_sample, data_offset, data_size):
+        self.format_tag = format_tag
+        """Either WAVE_FORMAT_PCM or WAVE_FORMAT_IEEE_FLOAT. Extensible files are reported with the format of their subformat."""
+
+        self.channels = channels
+        """Number of interleaved channels."""
+
+        self.sample_rate = sample_rate
+        """Samples per second, per channel."""
+
+        self.bits_per_sample = bits_per_sample
+        """Bits used to store a single sample of a single channel."""
+
+        self.data_offset = data_offset
+        """Byte offset of the first sample in the file."""
+
+        self.data_size = data_size
+        """Size of the sample data in bytes."""
+
+    @property
+    def frame_count(self):
+        """Number of samples per channel."""
+        return self.data_size // (self.channels * (self.bits_per_sample // 8))
+
+    @property
+    def duration(self):
+        """Length of the audio in seconds."""
+        return self.frame_count / self.sample_rate
+
+def read_wav_info(wav_file_path):
+    """Reads the format of a .wav file and where its sample data is located, without reading the samples themselves.
+
+    Args:
+        wav_file_path (str): Path to .wav file
+
+    Raises:
+        ValueError: Throws an error if the file is not a .wav file, is truncated or uses an unsupported sample format
+
+    Returns:
+        WavInfo: Format and location of the sample data
+    """
+    with open(wav_file_path, "rb") as f:
+        header = f.read(12)
+        if (len(header) < 12):
+            raise ValueError(f"{wav_file_path} is not a .wav file")
+        riff, _, wave_id = struct.unpack("<4sI4s", header)
+        if (riff != b"RIFF" or wave_id != b"WAVE"):
+            raise ValueError(f"{wav_file_path} is not a .wav file")
+        fmt = None
+        while True:
+            chunk_header = f.read(8)
+            if (len(chunk_header) < 8):
+                raise ValueError(f"{wav_file_path} has no audio data")
+            chunk_id, chunk_size = struct.unpack("<4sI", chunk_header)
+            if (chunk_id == b"fmt "):
+                fmt = f.read(chunk_size)
+                if (chunk_size % 2):
+                    f.seek(1, 1)
+            elif (chunk_id == b"data"):
+                data_offset = f.tell()
+                break
+            else:
+                # Chunks are padded to an even number of bytes
+                f.seek(chunk_size + (chunk_size % 2), 1)
+        # A data chunk size of 0 or larger than the file is written by some streaming encoders
+        f.seek(0, 2)
+        data_size = f.tell() - data_offset
+        if (0 < chunk_size <= data_size):
+            data_size = chunk_size
+    if (fmt is None):
+        raise ValueError(f"{wav_file_path} has no format chunk")
+    if (len(fmt) < 16):
+        raise ValueError(f"{wav_file_path} has a truncated format chunk")
+    format_tag, channels, sample_rate, _, _, bits_per_sample = struct.unpack("<HHIIHH", fmt[:16])
+    if (format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26):
+        # The first two bytes of the subformat GUID hold the actual format
+        format_tag = struct.unpack("<H", fmt[24:26])[0]
+    if (format_tag == WAVE_FORMAT_PCM and bits_per_sample not in (8, 16, 24, 32)):
+        raise ValueError(f"Unsupported PCM bit depth {bits_per_sample} in {wav_file_path}")
+    if (format_tag == WAVE_FORMAT_IEEE_FLOAT and bits_per_sample not in (32, 64)):
+        raise ValueError(f"Unsupported float bit depth {bits_per_sample} in {wav_file_path}")
+    if (format_tag not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT)):
+        raise ValueError(f"Unsupported .wav format {format_tag:#06x} in {wav_file_path}")
+    return WavInfo(format_tag, channels, sample_rate, bits_per_sample, data_offset, data_size)
+
+def decode_samples(raw, info):
+    """Decodes raw interleaved sample bytes into floats.
+
+    Args:
+        raw (numpy.ndarray): uint8 array of whole sample frames
+        info (WavInfo): Format of the samples
+
+    Returns:
+        numpy.ndarray: (n_frames, channels) float32 matrix of samples in the range -1 to 1
+    """
+    bits = info.bits_per_sample
+    if (info.format_tag == WAVE_FORMAT_IEEE_FLOAT):
+        samples = raw.view("<f4" if bits == 32 else "<f8").astype(np.float32)
+    elif (bits == 8):
+        # 8-bit PCM is the only unsigned format
+        samples = (raw.astype(np.float32) - 128.0) / 128.0
+    elif (bits == 16):
+        samples = raw.view("<i2").astype(np.float32) / 32768.0
+    elif (bits == 24):
+        triplets = raw.reshape(-1, 3)
+        # Sign-extend the most significant byte, then combine the three bytes
+        values = triplets[:, 2].view(np.int8).astype(np.int32) << 16
+        values |= triplets[:, 1].astype(np.int32) << 8
+        values |= triplets[:, 0].astype(np.int32)
+        samples = values.astype(np.float32) / 8388608.0
+    else:
+        samples = raw.view("<i4").astype(np.float32) / 2147483648.0
+    return samples.reshape(-1, info.channels)
+
+def sample_range(info, start_time = None, end_time = None):
+    """Converts a time range into a range of sample frames, clamped to the length of the file.
+
+    Args:
+        info (WavInfo): Format of the file
+        start_time (float, optional): Time in seconds to start at. Defaults to None, which starts at the beginning.
+        end_time (float, optional): Time in seconds to stop at. Defaults to None, which stops at the end.
+
+    Returns:
+        tuple(int, int): A tuple containing 1. the first sample frame and 2. one past the last sample frame
+    """
+    first = 0 if start_time is None else int(round(start_time * info.sample_rate))
+    last = info.frame_count if end_time is None else int(round(end_time * info.sample_rate))
+    first = min(max(first, 0), info.frame_count)
+    last = min(max(last, first), info.frame_count)
+    return (first, last)
+
+def iter_wav_chunks(wav_file_path, start_time = None, end_time = None, chunk_seconds = None):
+    """Generator decoding a .wav file a fixed amount of audio at a time, so long recordings are never held in memory as floats all at once.
+
+    Args:
+        wav_file_path (str): Path to .wav file
+        start_time (float, optional): Time in seconds to start reading at. Defaults to None, which reads from the start.
+        end_time (float, optional): Time in seconds to stop reading at. Defaults to None, which reads to the end.
+        chunk_seconds (float, optional): Length of each chunk in seconds. Defaults to None, which uses CHUNK_SECONDS.
+
+    Yields:
+        numpy.ndarray: (n_frames, channels) float32 matrix of samples in the range -1 to 1
+    """
+    info = read_wav_info(wav_file_path)
+    first, last = sample_range(info, start_time, end_time)
+    if (last == first):
+        return
+    frame_size = info.channels * (info.bits_per_sample // 8)
+    chunk_frames = max(1, int((CHUNK_SECONDS if chunk_seconds is None else chunk_seconds) * info.sample_rate))
+    raw = np.memmap(wav_file_path, dtype=np.uint8, mode="r", offset=info.data_offset + first * frame_size, shape=((last - first) * frame_size,))
+    try:
+        for offset in range(0, last - first, chunk_frames):
+            end = min(offset + chunk_frames, last - first)
+            yield decode_samples(raw[offset * frame_size:end * frame_size], info)
+    finally:
+        del raw
+
+def downmix(samples):
+    """Mixes multichannel samples down to mono by averaging the channels.
+
+    Args:
+        samples (numpy.ndarray): (n_frames, channels) matrix of samples
+
+    Returns:
+        numpy.ndarray: n_frames float32 array of mono samples
+    """
+    if (samples.shape[1] == 1):
+        return samples[:, 0]
+    return samples.mean(axis=1, dtype=np.float32)
+
+class StreamResampler:
+    """Resamples mono audio that arrives in chunks with a windowed-sinc low-pass filter followed by linear interpolation.
+
+    The output is the same as resampling the whole signal at once, but only the filter history and the current chunk are kept in memory."""
+
+    def __init__(self, source_rate, target_rate, source_count, filter_taps = 64):
+        """Sets up resampling of a signal of known length.
+
+        Args:
+            source_rate (int): Sample rate of the input
+            target_rate (int): Desired sample rate
+            source_count (int): Total number of input samples, which determines the number of output samples
+            filter_taps (int, optional): Length of the anti-aliasing filter used when downsampling. Defaults to 64.
+        """
+        self.ratio = source_rate / target_rate
+        """Number of input samples per output sample."""
+
+        self.target_count = int(source_count * target_rate / source_rate)
+        """Total number of output samples."""
+
+        self.kernel = None
+        """Anti-aliasing filter, or None when upsampling."""
+
+        if (target_rate < source_rate):
+            # Remove content above the new Nyquist frequency so it does not alias
+            cutoff = target_rate / source_rate
+            taps = np.arange(filter_taps + 1) - filter_taps / 2
+            kernel = cutoff * np.sinc(cutoff * taps) * np.hamming(filter_taps + 1)
+            self.kernel = (kernel / kernel.sum()).astype(np.float32)
+        # The filter is centered, so its first output needs half a kernel of zeros before the signal
+        self._history = np.zeros(0 if self.kernel is None else filter_taps // 2, dtype=np.float32)
+        self._filtered = np.empty(0, dtype=np.float32)
+        self._base = 0
+        self._emitted = 0
+
+    def _filter(self, samples):
+        samples = samples.astype(np.float32, copy=False)
+        if (self.kernel is None):
+            return samples
+        extended = np.concatenate((self._history, samples))
+        taps = len(self.kernel) - 1
+        if (len(extended) <= taps):
+            self._history = extended
+            return np.empty(0, dtype=np.float32)
+        self._history = extended[len(extended) - taps:]
+        return np.convolve(extended, self.kernel, mode="valid")
+
+    def _interpolate(self, filtered, final):
+        self._filtered = np.concatenate((self._filtered, filtered))
+        end = self._base + len(self._filtered)
+        if (final):
+            positions = np.arange(self._emitted, self.target_count, dtype=np.float64) * self.ratio
+        else:
+            # Only positions with a filtered sample on both sides can be interpolated before the end of the input
+            stop = min(self.target_count, int((end - 1) / self.ratio) + 2)
+            positions = np.arange(self._emitted, max(stop, self._emitted), dtype=np.float64) * self.ratio
+            positions = positions[positions <= end - 1]
+        if (len(positions) == 0 or len(self._filtered) == 0):
+            return np.empty(0, dtype=np.float32)
+        result = np.interp(positions, np.arange(self._base, end, dtype=np.float64), self._filtered).astype(np.float32)
+        self._emitted += len(result)
+        drop = min(int(self._emitted * self.ratio) - self._base, len(self._filtered))
+        if (drop > 0):
+            self._filtered = self._filtered[drop:]
+            self._base += drop
+        return result
+
+    def process(self, samples):
+        """Resamples the next chunk of input.
+
+        Args:
+            samples (numpy.ndarray): Next mono samples
+
+        Returns:
+            numpy.ndarray: float32 array of every output sample that can be computed so far
+        """
+        return self._interpolate(self._filter(samples), False)
+
+    def flush(self):
+        """Finishes resampling once all input has been passed to process.
+
+        Returns:
+            numpy.ndarray: float32 array of the remaining output samples
+        """
+        if (self.kernel is None):
+            return self._interpolate(np.empty(0, dtype=np.float32), True)
+        # Half a kernel of zeros after the signal produces the last filtered samples
+        padding = len(self.kernel) - 1 - (len(self.kernel) - 1) // 2
+        return self._interpolate(self._filter(np.zeros(padding, dtype=np.float32)), True)
+
+def iter_mono_chunks(wav_file_path, target_rate = None, start_time = None, end_time = None, chunk_seconds = None):
+    """Generator reading a .wav file as mono float chunks, optionally resampled and cut to a time range.
+
+    Args:
+        wav_file_path (str): Path to .wav file
+        target_rate (int, optional): Desired sample rate. Defaults to None, which keeps the file's sample rate.
+        start_time (float, optional): Time in seconds to start reading at. Defaults to None.
+        end_time (float, optional): Time in seconds to stop reading at. Defaults to None.
+        chunk_seconds (float, optional): Length of audio decoded at a time in seconds. Defaults to None, which uses CHUNK_SECONDS.
+
+    Yields:
+        numpy.ndarray: float32 array of mono samples in the range -1 to 1
+    """
+    info = read_wav_info(wav_file_path)
+    first, last = sample_range(info, start_time, end_time)
+    resampler = None
+    if (target_rate is not None and target_rate != info.sample_rate):
+        resampler = StreamResampler(info.sample_rate, target_rate, last - first)
+    for samples in iter_wav_chunks(wav_file_path, start_time, end_time, chunk_seconds):
+        mono = downmix(samples)
+        if (resampler is not None):
+            mono = resampler.process(mono)
+        yield np.clip(mono, -1.0, 1.0)
+    if (resampler is not None):
+        yield np.clip(resampler.flush(), -1.0, 1.0)
+
+def load_mono_audio(wav_file_path, target_rate = None, start_time = None, end_time = None):
+    """Reads a .wav file as a mono float buffer, optionally resampled and cut to a time range.
+
+    Args:
+        wav_file_path (str): Path to .wav file
+        target_rate (int, optional): Desired sample rate. Defaults to None, which keeps the file's sample rate.
+        start_time (float, optional): Time in seconds to start reading at. Defaults to None.
+        end_time (float, optional): Time in seconds to stop reading at. Defaults to None.
+
+    Returns:
+        tuple(numpy.ndarray, int): A tuple containing 1. a float32 array of mono samples in the range -1 to 1 and 2. their sample rate
+    """
+    sample_rate = read_wav_info(wav_file_path).sample_rate if target_rate is None else target_rate
+    pieces = list(iter_mono_chunks(wav_file_path, target_rate, start_time, end_time))
+    if (not pieces):
+        return (np.empty(0, dtype=np.float32), sample_rate)
+    return (np.concatenate(pieces), sample_rate)
+
+def encode_pcm16(samples):
+    """Converts float samples to 16-bit PCM bytes.
+
+    Args:
+        samples (numpy.ndarray): Samples in the range -1 to 1
+
+    Returns:
+        bytes: Little-endian 16-bit samples
+    """
+    return np.round(np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+def needs_conversion(wav_file_path, start_time = None, end_time = None):
+    """Checks whether a .wav file has to be converted before ProcessWAV can read it.
+
+    Args:
+        wav_file_path (str): Path to .wav file
+        start_time (float, optional): Requested start time in seconds. Defaults to None.
+        end_time (float, optional): Requested end time in seconds. Defaults to None.
+
+    Returns:
+        bool: False if the file is already mono 16-bit PCM at PROCESSWAV_SAMPLE_RATE and no time range was requested
+    """
+    if (start_time is not None or end_time is not None):
+        return True
+    info = read_wav_info(wav_file_path)
+    return not (info.format_tag == WAVE_FORMAT_PCM and
+        info.bits_per_sample == 16 and
+        info.channels == 1 and
+        info.sample_rate == PROCESSWAV_SAMPLE_RATE)
+
+def convert_for_processwav(wav_file_path, output_file_path, start_time = None, end_time = None, progress = None):
+    """Converts a .wav file of any supported format into a mono 16-bit PCM file at PROCESSWAV_SAMPLE_RATE.
+
+    The audio is decoded, resampled and written CHUNK_SECONDS at a time, so memory use does not grow with the length of the file.
+
+    Args:
+        wav_file_path (str): Path to input .wav file
+        output_file_path (str): Path to converted .wav file
+        start_time (float, optional): Time in seconds to start at. Defaults to None.
+        end_time (float, optional): Time in seconds to end at. Defaults to None.
+        progress (callable, optional): Called with the number of seconds converted so far after each chunk. Defaults to None.
+    """
+    written = 0
+    with wave.open(output_file_path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(PROCESSWAV_SAMPLE_RATE)
+        for samples in iter_mono_chunks(wav_file_path, PROCESSWAV_SAMPLE_RATE, start_time, end_time):
+            f.writeframes(encode_pcm16(samples))
+            written += len(samples)
+            if (progress is not None):
+                progress(written / PROCESSWAV_SAMPLE_RATE)
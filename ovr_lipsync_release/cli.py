@@ -0,0 +1,257 @@
+"""Command line entry point for applying lipsync without the UI, e.g. on a render farm.
+
+Run it through Blender in background mode, passing its own arguments after "--":
+
+    blender -b --factory-startup --python-exit-code 4 --python ovr_lipsync_release/cli.py -- scene.blend --mesh Body --map aa=vrc.v_aa --clip line_01.wav@100 --clip line_02.wav
+
+Clips can be given as PATH or PATH@START_FRAME. Clips without a start frame follow the previous clip.
+A clip can also be a .ovlt or .json track file saved by Export Track, which is keyframed without processing audio.
+Viseme mappings saved in the .blend file are used unless overridden with --map or --mapping-file, which apply to --mesh.
+Meshes given with --target are keyed from the same analysis as --mesh, using their saved mappings.
+
+A JSON report with per-clip timings is printed on a single line starting with REPORT_PREFIX, and can also be written to a file with --report.
+"""
+import argparse
+import cProfile
+import importlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import bpy
+
+if (__package__):
+    addon = importlib.import_module(__package__)
+else:
+    # Run directly with --python, so the addon has to be imported by its folder name
+    addon_folder = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(addon_folder))
+    addon = importlib.import_module(os.path.basename(addon_folder))
+
+EXIT_SUCCESS = 0
+"""Every clip was applied and the .blend file was saved."""
+
+EXIT_CLIP_FAILED = 1
+"""At least one clip could not be processed. Clips that succeeded were still saved."""
+
+EXIT_USAGE = 2
+"""Invalid arguments, or the mesh or mapping could not be set up."""
+
+EXIT_BLEND_FAILED = 3
+"""The .blend file could not be opened or saved."""
+
+REPORT_PREFIX = "OVR_LIPSYNC_REPORT "
+"""Prefix of the line holding the JSON report, so it can be picked out of Blender's console output."""
+
+def parse_clip(value):
+    """Parses a PATH or PATH@START_FRAME clip argument.
+
+    Args:
+        value (str): Clip argument
+
+    Returns:
+        tuple(str, int): A tuple containing 1. the clip path and 2. the start frame, or None if not given
+    """
+    path, separator, frame = value.rpartition("@")
+    if (separator and frame.lstrip("-").isdigit()):
+        return (path, int(frame))
+    return (value, None)
+
+def parse_mapping(value):
+    """Parses a VISEME=SHAPEKEY mapping argument.
+
+    Args:
+        value (str): Mapping argument
+
+    Raises:
+        argparse.ArgumentTypeError: Throws an error if value has no "="
+
+    Returns:
+        tuple(str, str): A tuple containing 1. the viseme and 2. the shapekey name
+    """
+    viseme, separator, shapekey_name = value.partition("=")
+    if not (separator and viseme and shapekey_name):
+        raise argparse.ArgumentTypeError(f"Expected VISEME=SHAPEKEY, got \"{value}\"")
+    return (viseme, shapekey_name)
+
+def build_parser():
+    """Builds the argument parser for the command line entry point.
+
+    Returns:
+        argparse.ArgumentParser: Argument parser
+    """
+    parser = argparse.ArgumentParser(prog="blender -b --python cli.py --", description="Applies OVR Lipsync keyframes to a mesh in a .blend file and saves the result.")
+    parser.add_argument("blend_file", help="Path to .blend file")
+    parser.add_argument("--mesh", required=True, help="Name of the mesh data block with the viseme shapekeys")
+    parser.add_argument("--target", dest="targets", action="append", default=[], metavar="MESH", help="Additional mesh keyed from the same analysis as --mesh, using the viseme mapping saved on it. Can be repeated")
+    parser.add_argument("--clip", dest="clips", action="append", type=parse_clip, default=[], metavar="PATH[@FRAME]", help="Audio clip or track file to apply, optionally with its start frame. Can be repeated")
+    parser.add_argument("--batch", help="Folder of .wav files or .csv/.json manifest to apply, in the format used by the Batch panel")
+    parser.add_argument("--map", dest="mapping", action="append", type=parse_mapping, default=[], metavar="VISEME=SHAPEKEY", help="Maps a viseme to a shapekey. Can be repeated, and repeating a viseme drives several shapekeys with it")
+    parser.add_argument("--mapping-file", help="JSON file with a {viseme: shapekey} object. A list of shapekeys drives all of them with the viseme")
+    parser.add_argument("--scene", help="Name of the scene to use. Defaults to the active scene")
+    parser.add_argument("--start-frame", type=int, help="Start frame of the first clip. Defaults to the scene's Start Frame")
+    parser.add_argument("--backend", choices=[item[0] for item in addon.VISEME_BACKEND_ITEMS], help="Viseme analyzer to use")
+    parser.add_argument("--resample", choices=[item[0] for item in addon.RESAMPLE_MODES], help="Resampling mode")
+    parser.add_argument("--simplify", type=float, help="Keyframe simplification tolerance")
+    parser.add_argument("--smoothing-preset", help="Name of a post-processing preset saved on the scene to use instead of the scene's current post-processing settings")
+    parser.add_argument("--per-key", action="store_true", help="Inserts keyframes one at a time instead of writing them in bulk")
+    parser.add_argument("--full-apply", action="store_true", help="Rewrites every keyframe, even for clips whose keyframes did not change since their last apply")
+    parser.add_argument("--no-cache", action="store_true", help="Always processes audio, without reading or writing the result cache")
+    parser.add_argument("--output", help="Path to save the result to. Defaults to overwriting blend_file")
+    parser.add_argument("--report", help="Path to write the JSON report to")
+    parser.add_argument("--log", help="Path of a JSON lines file each clip appends its stage timers and counters to")
+    parser.add_argument("--profile", help="Path to save a cProfile .prof file of the whole run to")
+    return parser
+
+def write_report(report, report_path):
+    """Prints the JSON report on a single line and optionally writes it to a file.
+
+    Args:
+        report (dict): Report to be written
+        report_path (str): Path to write the report to, or None to only print it
+    """
+    line = json.dumps(report)
+    print(REPORT_PREFIX + line)
+    if (report_path):
+        with open(report_path, "w") as f:
+            f.write(line + "\n")
+
+def main(argv = None):
+    """Runs the command line entry point.
+
+    Args:
+        argv (list(str), optional): Arguments after "--". Defaults to None, which reads them from sys.argv.
+
+    Returns:
+        int: Exit code, one of the EXIT_ constants
+    """
+    if (argv is None):
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = build_parser()
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as e:
+        return EXIT_USAGE if e.code else EXIT_SUCCESS
+
+    profile = None
+    if (args.profile):
+        profile = cProfile.Profile()
+        profile.enable()
+    run_start = time.perf_counter()
+    report = {"blend_file": args.blend_file, "mesh": args.mesh, "targets": args.targets, "clips": [], "exit_code": EXIT_SUCCESS}
+
+    if not (hasattr(bpy.types.Scene, "viseme_backend")):
+        addon.register()
+    try:
+        bpy.ops.wm.open_mainfile(filepath=os.path.abspath(args.blend_file))
+    except RuntimeError as e:
+        report["error"] = f"Could not open {args.blend_file}: {e}"
+        report["exit_code"] = EXIT_BLEND_FAILED
+        write_report(report, args.report)
+        return EXIT_BLEND_FAILED
+    report["load_seconds"] = time.perf_counter() - run_start
+
+    try:
+        scene = bpy.data.scenes[args.scene] if args.scene else bpy.context.scene
+        mesh = bpy.data.meshes[args.mesh]
+        mapping = {}
+        if (args.mapping_file):
+            with open(args.mapping_file) as f:
+                mapping.update(json.load(f))
+        # A viseme given more than once on the command line drives all of its shapekeys
+        command_line_mapping = {}
+        for viseme, shapekey_name in args.mapping:
+            command_line_mapping.setdefault(viseme, []).append(shapekey_name)
+        mapping.update(command_line_mapping)
+        addon.set_viseme_mapping(mesh, mapping)
+        clips = [(path, args.mesh, frame) for path, frame in args.clips]
+        if (args.batch):
+            clips += addon.read_batch_entries(args.batch, args.mesh)
+        if (not clips):
+            raise ValueError("No clips given. Use --clip or --batch")
+        if (args.smoothing_preset):
+            addon.load_smoothing_preset(scene, args.smoothing_preset)
+        # Clips on --mesh are also keyed onto the --target meshes
+        clip_meshes = {args.mesh: [mesh] + [bpy.data.meshes[name] for name in args.targets if name != args.mesh]}
+        for _, mesh_name, _ in clips:
+            clip_meshes.setdefault(mesh_name, [bpy.data.meshes[mesh_name]])
+            mapping_problem = addon.lipsync_targets_problem(clip_meshes[mesh_name])
+            if (mapping_problem):
+                raise ValueError(mapping_problem)
+    except (KeyError, OSError, ValueError) as e:
+        report["error"] = str(e)
+        report["exit_code"] = EXIT_USAGE
+        write_report(report, args.report)
+        return EXIT_USAGE
+
+    if (args.backend):
+        scene.viseme_backend = args.backend
+    if (args.resample):
+        scene.resample_mode = args.resample
+    if (args.simplify is not None):
+        scene.simplify_tolerance = args.simplify
+    if (args.per_key):
+        scene.use_bulk_keyframes = False
+    if (args.full_apply):
+        scene.use_incremental_apply = False
+    if (args.log):
+        scene.stats_log_path = os.path.abspath(args.log)
+    backend = addon.get_viseme_backend(scene.viseme_backend)
+    report["backend"] = type(backend).__name__
+    cache_folder = None if args.no_cache else addon.get_cache_folder()
+    cache_size_limit = scene.cache_size_limit * 1024 * 1024
+    scene_fps = scene.render.fps / scene.render.fps_base
+
+    next_start_frames = {}
+    first_start_frame = scene.start_frame if args.start_frame is None else args.start_frame
+    for clip, mesh_name, start_frame in clips:
+        if (start_frame is None):
+            start_frame = next_start_frames.get(mesh_name, first_start_frame)
+        clip_report = {"clip": clip, "mesh": mesh_name, "start_frame": start_frame}
+        stats = addon.ApplyStats(clip)
+        try:
+            if (addon.is_track_file(clip)):
+                track, key_count, saved_count, analysis_time, write_time, reused_count = addon.import_viseme_track(scene, clip_meshes[mesh_name], clip, start_frame, stats)
+                clip_frames = addon.resampled_frame_count(track.frame_count, track.frame_rate, scene_fps)
+            else:
+                frame_data, key_count, saved_count, analysis_time, write_time, reused_count = addon.apply_lipsync(scene, clip_meshes[mesh_name], clip, start_frame, backend, cache_folder, cache_size_limit, stats=stats)
+                clip_frames = addon.resampled_frame_count(len(frame_data.frames), addon.VISEME_FPS, scene_fps)
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            clip_report.update(status="failed", error=str(e))
+            report["exit_code"] = EXIT_CLIP_FAILED
+        else:
+            next_start_frames[mesh_name] = start_frame + clip_frames
+            clip_report.update(
+                status="ok",
+                audio_seconds=stats.audio_seconds,
+                viseme_frames=stats.frames_parsed,
+                keyframes=key_count,
+                keyframes_removed=saved_count,
+                keyframes_kept=reused_count,
+                analysis_seconds=analysis_time,
+                write_seconds=write_time,
+                stats=stats.to_dict())
+            log_problem = addon.record_apply_stats(scene, stats)
+            if (log_problem):
+                report["log_error"] = log_problem
+        report["clips"].append(clip_report)
+
+    save_start = time.perf_counter()
+    try:
+        bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(args.output or args.blend_file))
+    except RuntimeError as e:
+        report["error"] = f"Could not save: {e}"
+        report["exit_code"] = EXIT_BLEND_FAILED
+    report["save_seconds"] = time.perf_counter() - save_start
+    report["total_seconds"] = time.perf_counter() - run_start
+    if (profile is not None):
+        profile.disable()
+        profile.dump_stats(args.profile)
+        report["profile"] = os.path.abspath(args.profile)
+    write_report(report, args.report)
+    return report["exit_code"]
+
+if (__name__ == "__main__"):
+    sys.exit(main())
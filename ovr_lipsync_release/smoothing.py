@@ -0,0 +1,139 @@
+import numpy as np
+
+SMOOTHING_MODES = ("NONE", "EXPONENTIAL", "GAUSSIAN")
+"""Identifiers of the supported smoothing filters."""
+
+KERNEL_CUTOFF = 1e-3
+"""Smoothing kernels are cut off where their weight falls below this fraction of the center weight."""
+
+def apply_gain_threshold(frames, gains = None, thresholds = None):
+    """Zeroes values below a per-viseme threshold, then scales each viseme by its gain.
+
+    Args:
+        frames (numpy.ndarray): (n_frames, n_visemes) matrix of viseme values
+        gains (numpy.ndarray, optional): Gain of each viseme column. Defaults to None, which keeps every gain at 1.
+        thresholds (numpy.ndarray, optional): Threshold of each viseme column. Defaults to None, which keeps every value.
+
+    Returns:
+        numpy.ndarray: New (n_frames, n_visemes) float32 matrix
+    """
+    result = frames.astype(np.float32, copy=True)
+    if (thresholds is not None):
+        result[result < np.asarray(thresholds, dtype=np.float32)] = 0.0
+    if (gains is not None):
+        result *= np.asarray(gains, dtype=np.float32)
+    return result
+
+def select_top_visemes(frames, count):
+    """Keeps the largest values of each frame and zeroes the rest. Kept values are scaled up so each frame keeps its total.
+
+    Args:
+        frames (numpy.ndarray): (n_frames, n_visemes) matrix of viseme values
+        count (int): Number of visemes to keep per frame. 0 or at least n_visemes keeps all of them
+
+    Returns:
+        numpy.ndarray: New (n_frames, n_visemes) float32 matrix
+    """
+    if (count <= 0 or count >= frames.shape[1] or len(frames) == 0):
+        return frames.astype(np.float32, copy=True)
+    top = np.argpartition(frames, -count, axis=1)[:, -count:]
+    result = np.zeros(frames.shape, dtype=np.float32)
+    np.put_along_axis(result, top, np.take_along_axis(frames, top, axis=1), axis=1)
+    totals = frames.sum(axis=1)
+    kept_totals = result.sum(axis=1)
+    scale = np.divide(totals, kept_totals, out=np.zeros_like(kept_totals), where=kept_totals > 0)
+    result *= scale[:, np.newaxis]
+    return result
+
+def attack_release_envelope(frames, attack_frames, release_frames):
+    """Lets every viseme fade in over the attack time before each of its peaks and fade out over the release time after it. Peaks are never lowered.
+
+    Each value is the largest of its neighbours weighted by a linear ramp, so the whole clip is processed with one vector operation per frame of attack and release.
+
+    Args:
+        frames (numpy.ndarray): (n_frames, n_visemes) matrix of viseme values
+        attack_frames (float): Length of the fade in, in frames
+        release_frames (float): Length of the fade out, in frames
+
+    Returns:
+        numpy.ndarray: New (n_frames, n_visemes) float32 matrix
+    """
+    result = frames.astype(np.float32, copy=True)
+    frame_count = len(frames)
+    for lag in range(1, min(int(np.ceil(release_frames)), frame_count)):
+        # Earlier peaks decay into later frames
+        np.maximum(result[lag:], frames[:-lag] * np.float32(1.0 - lag / release_frames), out=result[lag:])
+    for lag in range(1, min(int(np.ceil(attack_frames)), frame_count)):
+        # Later peaks are anticipated by earlier frames
+        np.maximum(result[:-lag], frames[lag:] * np.float32(1.0 - lag / attack_frames), out=result[:-lag])
+    return result
+
+def smoothing_kernel(mode, width_frames):
+    """Builds a normalized, symmetric smoothing kernel.
+
+    Args:
+        mode (str): One of SMOOTHING_MODES. EXPONENTIAL uses width_frames as its time constant and GAUSSIAN as its standard deviation
+        width_frames (float): Width of the kernel in frames
+
+    Raises:
+        ValueError: Throws an error if mode is not a valid smoothing mode
+
+    Returns:
+        numpy.ndarray: Kernel weights, or a single weight of 1 if there is nothing to smooth
+    """
+    if (mode == "NONE" or width_frames <= 0.0):
+        return np.ones(1, dtype=np.float32)
+    if (mode == "EXPONENTIAL"):
+        radius = int(np.ceil(-np.log(KERNEL_CUTOFF) * width_frames))
+        offsets = np.arange(-radius, radius + 1, dtype=np.float64)
+        kernel = np.exp(-np.abs(offsets) / width_frames)
+    elif (mode == "GAUSSIAN"):
+        radius = int(np.ceil(np.sqrt(-2.0 * np.log(KERNEL_CUTOFF)) * width_frames))
+        offsets = np.arange(-radius, radius + 1, dtype=np.float64)
+        kernel = np.exp(-0.5 * (offsets / width_frames) ** 2)
+    else:
+        raise ValueError(f"Unknown smoothing mode {mode}. Valid modes are {', '.join(SMOOTHING_MODES)}")
+    return (kernel / kernel.sum()).astype(np.float32)
+
+def smooth_frames(frames, kernel):
+    """Convolves every viseme column with a symmetric kernel. Smoothing is centered, so it does not delay the animation. Edges are extended with their first and last values.
+
+    Args:
+        frames (numpy.ndarray): (n_frames, n_visemes) matrix of viseme values
+        kernel (numpy.ndarray): Kernel from smoothing_kernel
+
+    Returns:
+        numpy.ndarray: New (n_frames, n_visemes) float32 matrix
+    """
+    if (len(kernel) == 1 or len(frames) == 0):
+        return frames.astype(np.float32, copy=True)
+    radius = len(kernel) // 2
+    padded = np.pad(frames.astype(np.float32, copy=False), ((radius, radius), (0, 0)), mode="edge")
+    result = np.zeros(frames.shape, dtype=np.float32)
+    frame_count = len(frames)
+    for offset, weight in enumerate(kernel):
+        result += weight * padded[offset:offset + frame_count]
+    return result
+
+def postprocess_visemes(frames, frame_rate, gains = None, thresholds = None, top_count = 0, attack_time = 0.0, release_time = 0.0, smoothing_mode = "NONE", smoothing_time = 0.0):
+    """Runs the whole post-processing chain on a viseme matrix: gain and threshold, top viseme selection, attack and release, then smoothing.
+
+    Args:
+        frames (numpy.ndarray): (n_frames, n_visemes) matrix of viseme values
+        frame_rate (float): Frame rate of frames, used to convert times to frames
+        gains (numpy.ndarray, optional): Gain of each viseme column. Defaults to None.
+        thresholds (numpy.ndarray, optional): Threshold of each viseme column. Defaults to None.
+        top_count (int, optional): Number of visemes kept per frame. Defaults to 0, which keeps all of them.
+        attack_time (float, optional): Seconds a viseme fades in before its peaks. Defaults to 0.0.
+        release_time (float, optional): Seconds a viseme fades out after its peaks. Defaults to 0.0.
+        smoothing_mode (str, optional): One of SMOOTHING_MODES. Defaults to "NONE".
+        smoothing_time (float, optional): Time constant of exponential smoothing, or standard deviation of Gaussian smoothing, in seconds. Defaults to 0.0.
+
+    Returns:
+        numpy.ndarray: New contiguous (n_frames, n_visemes) float32 matrix
+    """
+    result = apply_gain_threshold(frames, gains, thresholds)
+    result = select_top_visemes(result, top_count)
+    result = attack_release_envelope(result, attack_time * frame_rate, release_time * frame_rate)
+    result = smooth_frames(result, smoothing_kernel(smoothing_mode, smoothing_time * frame_rate))
+    return np.ascontiguousarray(result)
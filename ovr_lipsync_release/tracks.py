@@ -0,0 +1,293 @@
+import numpy as np
+import json
+import struct
+
+TRACK_MAGIC = b"OVLT"
+"""First four bytes of a binary viseme track file."""
+
+TRACK_FORMAT_VERSION = 1
+"""Version of the binary and JSON track layouts. Bump this whenever either layout changes."""
+
+TRACK_FILE_EXTENSION = ".ovlt"
+"""Extension of binary viseme track files. Tracks saved with a .json extension use the JSON layout instead."""
+
+QUANTIZATION_BITS = (8, 16)
+"""Supported sizes in bits of a quantized channel value."""
+
+TRACK_HEADER = struct.Struct("<4sHBxdIH2x")
+"""Binary file header: magic, format version, quantization bits, frame rate, frame count and channel count."""
+
+CHANNEL_INDEX_ENTRY = struct.Struct("<16sB3xIIff")
+"""Binary index entry of one channel: name, frame encoding, key count, byte offset of its data from the start of the file, and the value range it was quantized to."""
+
+CHANNEL_NAME_SIZE = 16
+"""Largest size in bytes of a UTF-8 encoded channel name in a binary track."""
+
+FRAMES_DENSE = 0
+"""Frame encoding of a channel with a key on every frame. No frame numbers are stored."""
+
+FRAMES_DELTA16 = 1
+"""Frame encoding of a channel whose frame numbers are stored as uint16 differences to the previous key, the first relative to frame 0."""
+
+FRAMES_ABSOLUTE32 = 2
+"""Frame encoding of a channel whose frame numbers are stored as uint32 values."""
+
+class TrackChannel:
+    def __init__(self, name, frames, values):
+        self.name = name
+        """Name of the viseme driving this channel."""
+
+        self.frames = np.asarray(frames, dtype=np.uint32)
+        """Frame number of each key, in ascending order, at the frame rate of the track."""
+
+        self.values = np.asarray(values, dtype=np.float32)
+        """Viseme value of each key. Values between keys are linearly interpolated."""
+
+class VisemeTrack:
+    def __init__(self, frame_rate, frame_count, channels = None):
+        self.frame_rate = float(frame_rate)
+        """Frames per second of the track."""
+
+        self.frame_count = int(frame_count)
+        """Length of the track in frames."""
+
+        self.channels = list(channels or [])
+        """TrackChannel of each viseme."""
+
+def quantize(values, bits):
+    """Maps values to unsigned integers spanning their range.
+
+    Args:
+        values (numpy.ndarray): Values to be quantized
+        bits (int): Size of a quantized value, one of QUANTIZATION_BITS
+
+    Raises:
+        ValueError: Throws an error if bits is not supported
+
+    Returns:
+        tuple(numpy.ndarray, float, float): A tuple containing 1. the quantized values, 2. the lowest and 3. the highest value of the range they were quantized to
+    """
+    if (bits not in QUANTIZATION_BITS):
+        raise ValueError(f"Unsupported quantization of {bits} bits. Supported sizes are {', '.join(str(size) for size in QUANTIZATION_BITS)}")
+    dtype = np.uint8 if bits == 8 else np.uint16
+    if (len(values) == 0):
+        return (np.empty(0, dtype=dtype), 0.0, 0.0)
+    low, high = float(np.min(values)), float(np.max(values))
+    if (high <= low):
+        return (np.zeros(len(values), dtype=dtype), low, low)
+    steps = (1 << bits) - 1
+    quantized = np.rint((np.asarray(values, dtype=np.float64) - low) * (steps / (high - low)))
+    return (quantized.astype(dtype), low, high)
+
+def dequantize(quantized, bits, low, high):
+    """Maps quantized values back to their original range.
+
+    Args:
+        quantized (numpy.ndarray): Values from quantize
+        bits (int): Size of a quantized value
+        low (float): Lowest value of the range
+        high (float): Highest value of the range
+
+    Returns:
+        numpy.ndarray: float32 values
+    """
+    steps = (1 << bits) - 1
+    return (low + quantized.astype(np.float64) * ((high - low) / steps)).astype(np.float32)
+
+def sparse_key_indices(quantized):
+    """Finds the keys of a quantized channel that are needed to reproduce it with linear interpolation. Keys inside runs of equal values are dropped.
+
+    Args:
+        quantized (numpy.ndarray): Quantized values on consecutive keys
+
+    Returns:
+        numpy.ndarray: Indices of the keys to keep, in ascending order
+    """
+    count = len(quantized)
+    if (count <= 2):
+        return np.arange(count)
+    keep = np.ones(count, dtype=bool)
+    keep[1:-1] = (quantized[1:-1] != quantized[:-2]) | (quantized[1:-1] != quantized[2:])
+    return np.flatnonzero(keep)
+
+def encode_channel(channel, bits):
+    """Quantizes a channel and drops the keys made redundant by quantization.
+
+    Args:
+        channel (TrackChannel): Channel to be encoded
+        bits (int): Size of a quantized value, one of QUANTIZATION_BITS
+
+    Returns:
+        tuple(numpy.ndarray, numpy.ndarray, float, float): A tuple containing 1. the frame numbers and 2. the quantized values of the kept keys, and 3. the lowest and 4. the highest value of the quantized range
+    """
+    quantized, low, high = quantize(channel.values, bits)
+    kept = sparse_key_indices(quantized)
+    return (channel.frames[kept], quantized[kept], low, high)
+
+def encode_binary(track, bits = 16):
+    """Encodes a track in the binary layout: a header, an index entry per channel, then the frame numbers and quantized values of each channel.
+
+    Args:
+        track (VisemeTrack): Track to be encoded
+        bits (int, optional): Size of a quantized value, one of QUANTIZATION_BITS. Defaults to 16.
+
+    Raises:
+        ValueError: Throws an error if bits is not supported or a channel name is too long
+
+    Returns:
+        bytes: Encoded track
+    """
+    offset = TRACK_HEADER.size + CHANNEL_INDEX_ENTRY.size * len(track.channels)
+    index = []
+    blocks = []
+    for channel in track.channels:
+        name = channel.name.encode("utf-8")
+        if (len(name) > CHANNEL_NAME_SIZE):
+            raise ValueError(f"Channel name {channel.name} is longer than {CHANNEL_NAME_SIZE} bytes")
+        frames, quantized, low, high = encode_channel(channel, bits)
+        # Dense channels need no frame numbers, and most sparse channels fit their gaps in 16 bits
+        if (len(frames) == track.frame_count and np.array_equal(frames, np.arange(track.frame_count))):
+            encoding, frame_bytes = FRAMES_DENSE, b""
+        else:
+            deltas = np.diff(frames.astype(np.int64), prepend=0)
+            if (len(deltas) == 0 or deltas.max() <= 0xFFFF):
+                encoding, frame_bytes = FRAMES_DELTA16, deltas.astype("<u2").tobytes()
+            else:
+                encoding, frame_bytes = FRAMES_ABSOLUTE32, frames.astype("<u4").tobytes()
+        value_bytes = quantized.astype("<u1" if bits == 8 else "<u2").tobytes()
+        index.append(CHANNEL_INDEX_ENTRY.pack(name, encoding, len(frames), offset, low, high))
+        blocks.append(frame_bytes + value_bytes)
+        offset += len(frame_bytes) + len(value_bytes)
+    header = TRACK_HEADER.pack(TRACK_MAGIC, TRACK_FORMAT_VERSION, bits, track.frame_rate, track.frame_count, len(track.channels))
+    return b"".join([header] + index + blocks)
+
+def decode_binary(data):
+    """Decodes a track from the binary layout written by encode_binary.
+
+    Args:
+        data (bytes): Encoded track
+
+    Raises:
+        ValueError: Throws an error if data is not a supported binary track
+
+    Returns:
+        VisemeTrack: Decoded track
+    """
+    if (len(data) < TRACK_HEADER.size):
+        raise ValueError("Not a viseme track file")
+    magic, version, bits, frame_rate, frame_count, channel_count = TRACK_HEADER.unpack_from(data)
+    if (magic != TRACK_MAGIC):
+        raise ValueError("Not a viseme track file")
+    if (version != TRACK_FORMAT_VERSION):
+        raise ValueError(f"Unsupported viseme track version {version}. This addon reads version {TRACK_FORMAT_VERSION}")
+    if (bits not in QUANTIZATION_BITS):
+        raise ValueError(f"Unsupported quantization of {bits} bits")
+    value_dtype = np.dtype("<u1" if bits == 8 else "<u2")
+    track = VisemeTrack(frame_rate, frame_count)
+    try:
+        for channel_index in range(channel_count):
+            name, encoding, key_count, offset, low, high = CHANNEL_INDEX_ENTRY.unpack_from(data, TRACK_HEADER.size + CHANNEL_INDEX_ENTRY.size * channel_index)
+            if (encoding == FRAMES_DENSE):
+                frames = np.arange(key_count, dtype=np.uint32)
+            elif (encoding == FRAMES_DELTA16):
+                frames = np.cumsum(np.frombuffer(data, dtype="<u2", count=key_count, offset=offset), dtype=np.uint32)
+                offset += 2 * key_count
+            elif (encoding == FRAMES_ABSOLUTE32):
+                frames = np.frombuffer(data, dtype="<u4", count=key_count, offset=offset).astype(np.uint32)
+                offset += 4 * key_count
+            else:
+                raise ValueError(f"Unknown frame encoding {encoding}")
+            quantized = np.frombuffer(data, dtype=value_dtype, count=key_count, offset=offset)
+            track.channels.append(TrackChannel(name.rstrip(b"\0").decode("utf-8"), frames, dequantize(quantized, bits, low, high)))
+    except struct.error:
+        raise ValueError("Viseme track file is truncated")
+    return track
+
+def encode_json(track, bits = 16):
+    """Encodes a track in the JSON layout. Values are stored quantized like in the binary layout, so both layouts hold the same keys.
+
+    Args:
+        track (VisemeTrack): Track to be encoded
+        bits (int, optional): Size of a quantized value, one of QUANTIZATION_BITS. Defaults to 16.
+
+    Returns:
+        str: Encoded track
+    """
+    channels = []
+    for channel in track.channels:
+        frames, quantized, low, high = encode_channel(channel, bits)
+        channels.append({"name": channel.name, "min": low, "max": high, "frames": frames.tolist(), "values": quantized.tolist()})
+    return json.dumps({
+        "format": "ovr_lipsync_track",
+        "version": TRACK_FORMAT_VERSION,
+        "bits": bits,
+        "frame_rate": track.frame_rate,
+        "frame_count": track.frame_count,
+        "channels": channels,
+    }, separators=(",", ":"))
+
+def decode_json(text):
+    """Decodes a track from the JSON layout written by encode_json.
+
+    Args:
+        text (str): Encoded track
+
+    Raises:
+        ValueError: Throws an error if text is not a supported JSON track
+
+    Returns:
+        VisemeTrack: Decoded track
+    """
+    document = json.loads(text)
+    if not (isinstance(document, dict) and document.get("format") == "ovr_lipsync_track"):
+        raise ValueError("Not a viseme track file")
+    if (document.get("version") != TRACK_FORMAT_VERSION):
+        raise ValueError(f"Unsupported viseme track version {document.get('version')}. This addon reads version {TRACK_FORMAT_VERSION}")
+    bits = document["bits"]
+    if (bits not in QUANTIZATION_BITS):
+        raise ValueError(f"Unsupported quantization of {bits} bits")
+    track = VisemeTrack(document["frame_rate"], document["frame_count"])
+    for channel in document["channels"]:
+        values = dequantize(np.asarray(channel["values"], dtype=np.int64), bits, channel["min"], channel["max"])
+        track.channels.append(TrackChannel(channel["name"], channel["frames"], values))
+    return track
+
+def save_track(track, track_file_path, bits = 16):
+    """Saves a track to a file, in the JSON layout if the path ends in .json and in the binary layout otherwise.
+
+    Args:
+        track (VisemeTrack): Track to be saved
+        track_file_path (str): Path to track file
+        bits (int, optional): Size of a quantized value, one of QUANTIZATION_BITS. Defaults to 16.
+
+    Returns:
+        int: Size of the saved file in bytes
+    """
+    if (track_file_path.lower().endswith(".json")):
+        data = encode_json(track, bits).encode("utf-8")
+    else:
+        data = encode_binary(track, bits)
+    with open(track_file_path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+def load_track(track_file_path):
+    """Loads a track saved with save_track, in either layout.
+
+    Args:
+        track_file_path (str): Path to track file
+
+    Raises:
+        ValueError: Throws an error if the file is not a supported track
+
+    Returns:
+        VisemeTrack: Loaded track
+    """
+    with open(track_file_path, "rb") as f:
+        data = f.read()
+    if (data.startswith(TRACK_MAGIC)):
+        return decode_binary(data)
+    try:
+        return decode_json(data.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError):
+        raise ValueError(f"{track_file_path} is not a viseme track file")
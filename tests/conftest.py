@@ -0,0 +1,10 @@
+"""Makes the addon importable outside of Blender, using the bpy stand-in from the benchmarks."""
+import os
+import sys
+
+REPOSITORY_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPOSITORY_FOLDER, "benchmarks"))
+sys.path.insert(0, REPOSITORY_FOLDER)
+
+import bpy_stub
+bpy_stub.install()
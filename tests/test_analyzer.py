@@ -0,0 +1,26 @@
+import numpy as np
+
+import ovr_lipsync_release as addon
+from ovr_lipsync_release import analyzer
+
+PROCESSWAV_VISEMES = ["sil", "PP", "FF", "TH", "DD", "kk", "CH", "SS", "nn", "RR", "aa", "E", "ih", "oh", "ou"]
+"""Viseme columns of ProcessWAV output, in order."""
+
+def test_viseme_names_match_processwav_columns():
+    header_lines = ["", "", "Visemes:" + ";".join(PROCESSWAV_VISEMES), "", ""]
+    assert analyzer.VISEME_NAMES == addon.parse_viseme_names(header_lines)
+
+def test_sounds_land_in_their_processwav_columns():
+    rng = np.random.default_rng(0)
+    sample_rate = analyzer.ANALYSIS_SAMPLE_RATE
+    silence = rng.normal(0.0, 1e-4, sample_rate)
+    hiss = np.diff(rng.normal(0.0, 0.3, sample_rate + 1))
+    # Harmonics of a 120 Hz voice shaped by the formants of aa
+    times = np.arange(sample_rate) / sample_rate
+    vowel = sum((np.exp(-((frequency - 750) / 120) ** 2) + np.exp(-((frequency - 1200) / 150) ** 2) + 0.02) * np.sin(2 * np.pi * frequency * times) for frequency in range(120, 7200, 120))
+    vowel *= 0.3 / np.abs(vowel).max()
+    frames = analyzer.analyze_visemes(np.concatenate((silence, hiss, silence, vowel)).astype(np.float32), sample_rate, 100)
+    assert frames.shape[1] == len(PROCESSWAV_VISEMES)
+    assert np.allclose(frames.sum(axis=1), 1.0, atol=1e-3)
+    for name, first, last in (("sil", 10, 90), ("SS", 120, 190), ("aa", 320, 390)):
+        assert frames[first:last].mean(axis=0).argmax() == PROCESSWAV_VISEMES.index(name)
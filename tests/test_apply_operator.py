@@ -0,0 +1,119 @@
+import time
+import types
+import wave
+
+import bpy_stub
+import numpy as np
+
+import ovr_lipsync_release as addon
+
+class WindowManager:
+    def __init__(self):
+        self.timers = []
+
+    def event_timer_add(self, interval, window = None):
+        self.timers.append(object())
+        return self.timers[-1]
+
+    def event_timer_remove(self, timer):
+        self.timers.remove(timer)
+
+    def modal_handler_add(self, operator):
+        pass
+
+    def progress_begin(self, minimum, maximum):
+        pass
+
+    def progress_update(self, value):
+        pass
+
+    def progress_end(self):
+        pass
+
+def make_context(tmp_path):
+    samples = np.random.default_rng(0).uniform(-0.5, 0.5, 16000)
+    with wave.open(str(tmp_path / "clip.wav"), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(np.round(samples * 32767).astype("<i2").tobytes())
+    mesh = bpy_stub.Mesh("Mesh", ["key_" + name for name in addon.MAPPED_VISEMES])
+    addon.set_viseme_mapping(mesh, {name: "key_" + name for name in addon.MAPPED_VISEMES})
+    scene = bpy_stub.Scene(24)
+    scene.__dict__.update(audio_file_path=str(tmp_path / "clip.wav"), audio_folder_path="", my_collection_meshes=mesh, start_frame=10,
+        use_cache=False, cache_size_limit=100, viseme_backend="NUMPY", use_audio_range=False, use_apply_profiling=False, stats_log_path="")
+    status = []
+    return types.SimpleNamespace(scene=scene, window=None, window_manager=WindowManager(), workspace=types.SimpleNamespace(status=status, status_text_set=status.append))
+
+def make_operator():
+    operator = addon.insert_keyframes()
+    operator.reports = []
+    operator.report = lambda kind, message: operator.reports.append((kind, message))
+    return operator
+
+def run_modal(operator, context):
+    timer = types.SimpleNamespace(type="TIMER", value="NOTHING")
+    for _ in range(2000):
+        result = operator.modal(context, timer)
+        if (result != {'PASS_THROUGH'}):
+            return result
+        time.sleep(0.005)
+    raise AssertionError("Apply did not finish")
+
+def test_apply_uses_settings_from_invoke(tmp_path):
+    context = make_context(tmp_path)
+    context.scene.use_incremental_apply = True
+    operator = make_operator()
+    assert operator.invoke(context, None) == {'RUNNING_MODAL'}
+    context.scene.start_frame = 500
+    context.scene.audio_file_path = str(tmp_path / "other.wav")
+    assert run_modal(operator, context) == {'FINISHED'}
+    assert not context.window_manager.timers and addon.LIPSYNC_APPLY is None
+    points = addon.shapekey_fcurve(context.scene.my_collection_meshes.shape_keys.key_blocks.get("key_aa")).keyframe_points
+    assert points.co[0, 0] == 10
+    records = context.scene.my_collection_meshes.shape_keys.lipsync_apply_records
+    assert records and all(record.clip == addon.apply_clip_key(str(tmp_path / "clip.wav")) and record.start_frame == 10 for record in records)
+
+def test_second_apply_waits_for_running_one(tmp_path):
+    context = make_context(tmp_path)
+    operator = make_operator()
+    assert operator.invoke(context, None) == {'RUNNING_MODAL'}
+    second = make_operator()
+    assert second.invoke(context, None) == {'CANCELLED'}
+    assert second.reports[0][0] == {"WARNING"}
+    operator.cancel(context)
+    assert addon.LIPSYNC_APPLY is None and not context.window_manager.timers
+
+def test_failed_write_rolls_back_and_cleans_up(tmp_path, monkeypatch):
+    context = make_context(tmp_path)
+    shape = context.scene.my_collection_meshes.shape_keys.key_blocks.get("key_aa")
+    fcurve = addon.shapekey_fcurve(shape, create=True)
+    fcurve.keyframe_points.add(1)
+    fcurve.keyframe_points.co[0] = (3.0, 0.5)
+    writes = []
+    write_viseme_keyframes = addon.write_viseme_keyframes
+    def failing_write(scene, keyframes, linear = None):
+        writes.append(keyframes)
+        if (len(writes) == 3):
+            raise RuntimeError("write failed")
+        return write_viseme_keyframes(scene, keyframes, linear)
+    monkeypatch.setattr(addon, "write_viseme_keyframes", failing_write)
+    operator = make_operator()
+    operator.invoke(context, None)
+    assert run_modal(operator, context) == {'CANCELLED'}
+    assert operator.reports[-1][0] == {"ERROR"}
+    assert not context.window_manager.timers and addon.LIPSYNC_APPLY is None
+    assert context.workspace.status[-1] is None
+    assert np.array_equal(addon.shapekey_fcurve(shape).keyframe_points.co, [[3.0, 0.5]])
+    for mapping in context.scene.my_collection_meshes.viseme_mappings:
+        if (mapping.shapekey != "key_aa"):
+            assert addon.shapekey_fcurve(context.scene.my_collection_meshes.shape_keys.key_blocks.get(mapping.shapekey)) is None
+
+def test_unwritable_stats_log_is_reported(tmp_path):
+    context = make_context(tmp_path)
+    context.scene.stats_log_path = str(tmp_path)
+    operator = make_operator()
+    operator.invoke(context, None)
+    assert run_modal(operator, context) == {'FINISHED'}
+    assert [kind for kind, _ in operator.reports] == [{"INFO"}, {"WARNING"}]
+    assert addon.LAST_APPLY_STATS.keyframes_written > 0
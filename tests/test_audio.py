@@ -0,0 +1,83 @@
+import wave
+
+import numpy as np
+import pytest
+
+from ovr_lipsync_release import audio
+
+def write_test_wav(path, samples, sample_rate, sample_width = 2):
+    scale = 2 ** (8 * sample_width - 1) - 1
+    pcm = np.round(samples * scale).astype(np.int64)
+    if (sample_width == 3):
+        raw = pcm.astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    else:
+        raw = pcm.astype(f"<i{sample_width}").tobytes()
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(samples.shape[1])
+        f.setsampwidth(sample_width)
+        f.setframerate(sample_rate)
+        f.writeframes(raw)
+
+def read_test_wav(path):
+    return np.concatenate(list(audio.iter_wav_chunks(str(path))))
+
+def resample_whole(samples, source_rate, target_rate):
+    resampler = audio.StreamResampler(source_rate, target_rate, len(samples))
+    return np.concatenate((resampler.process(samples), resampler.flush()))
+
+@pytest.mark.parametrize("sample_width", [2, 3, 4])
+def test_iter_wav_chunks_decodes_pcm(tmp_path, sample_width):
+    samples = np.random.default_rng(0).uniform(-0.9, 0.9, (1000, 2))
+    write_test_wav(tmp_path / "test.wav", samples, 44100, sample_width)
+    assert audio.read_wav_info(str(tmp_path / "test.wav")).sample_rate == 44100
+    chunks = list(audio.iter_wav_chunks(str(tmp_path / "test.wav"), chunk_seconds=0.005))
+    assert [len(chunk) for chunk in chunks] == [220, 220, 220, 220, 120]
+    decoded = np.concatenate(chunks)
+    assert decoded.shape == (1000, 2)
+    assert np.allclose(decoded, samples, atol=2.0 ** (1 - 8 * sample_width) * 2)
+
+def test_read_wav_info_rejects_other_files(tmp_path):
+    (tmp_path / "test.wav").write_bytes(b"not a wav file")
+    with pytest.raises(ValueError):
+        audio.read_wav_info(str(tmp_path / "test.wav"))
+
+@pytest.mark.parametrize("source_rate, target_rate", [(44100, 48000), (48000, 16000), (96000, 48000), (8000, 16000)])
+def test_stream_resampler_matches_whole_signal(source_rate, target_rate):
+    samples = np.random.default_rng(0).uniform(-1.0, 1.0, 20000).astype(np.float32)
+    whole = resample_whole(samples, source_rate, target_rate)
+    assert len(whole) == int(len(samples) * target_rate / source_rate)
+    for chunk_size in (1, 333, 4096):
+        resampler = audio.StreamResampler(source_rate, target_rate, len(samples))
+        pieces = [resampler.process(samples[offset:offset + chunk_size]) for offset in range(0, len(samples), chunk_size)]
+        pieces.append(resampler.flush())
+        assert np.allclose(np.concatenate(pieces), whole, atol=1e-6)
+
+def test_stream_resampler_keeps_low_frequencies():
+    times = np.arange(44100) / 44100
+    resampled = resample_whole(np.sin(2 * np.pi * 440 * times).astype(np.float32), 44100, 16000)
+    expected = np.sin(2 * np.pi * 440 * np.arange(len(resampled)) / 16000)
+    # Edges are affected by the zero padding of the filter
+    assert np.allclose(resampled[100:-100], expected[100:-100], atol=0.02)
+
+def test_convert_for_processwav_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio, "CHUNK_SECONDS", 0.3)
+    samples = np.random.default_rng(0).uniform(-0.5, 0.5, (44100 * 3, 2))
+    write_test_wav(tmp_path / "input.wav", samples, 44100, 3)
+    progress = []
+    audio.convert_for_processwav(str(tmp_path / "input.wav"), str(tmp_path / "output.wav"), 0.5, 2.5, progress.append)
+    info = audio.read_wav_info(str(tmp_path / "output.wav"))
+    assert (info.channels, info.bits_per_sample, info.sample_rate) == (1, 16, audio.PROCESSWAV_SAMPLE_RATE)
+    assert info.frame_count == int(44100 * 2 * audio.PROCESSWAV_SAMPLE_RATE / 44100)
+    assert len(progress) > 1
+    assert progress[-1] == pytest.approx(2.0, abs=1e-3)
+    expected, _ = audio.load_mono_audio(str(tmp_path / "input.wav"), audio.PROCESSWAV_SAMPLE_RATE, 0.5, 2.5)
+    converted = read_test_wav(tmp_path / "output.wav")
+    assert np.allclose(converted[:, 0], expected, atol=1.0 / 32767)
+
+def test_read_wav_info_rejects_truncated_files(tmp_path):
+    write_test_wav(tmp_path / "test.wav", np.zeros((10, 1)), 44100)
+    data = (tmp_path / "test.wav").read_bytes()
+    for length in range(44):
+        (tmp_path / "truncated.wav").write_bytes(data[:length])
+        with pytest.raises(ValueError):
+            audio.read_wav_info(str(tmp_path / "truncated.wav"))
@@ -0,0 +1,90 @@
+import bpy_stub
+import numpy as np
+
+import ovr_lipsync_release as addon
+
+VISEMES = ["aa", "E", "oh"]
+
+def make_frame_data(frame_count, seed = 0):
+    frame_data = addon.FrameData()
+    frame_data.names = list(VISEMES)
+    frame_data.name_index = {name: index for index, name in enumerate(frame_data.names)}
+    frame_data.frames = np.random.default_rng(seed).random((frame_count, len(VISEMES)), dtype=np.float32)
+    return frame_data
+
+def make_scene():
+    scene = bpy_stub.Scene(100)
+    scene.use_incremental_apply = True
+    return scene
+
+def make_mesh():
+    mesh = bpy_stub.Mesh("Mesh", ["key_" + name for name in VISEMES] + ["key_alt"])
+    addon.set_viseme_mapping(mesh, {name: "key_" + name for name in VISEMES})
+    return mesh
+
+def apply(scene, mesh, frame_data, start_frame, clip = "clip.wav"):
+    key_count, _, _, reused_count = addon.apply_viseme_keyframes(scene, [mesh], frame_data, 100, start_frame, addon.apply_clip_key(clip))
+    return (key_count, reused_count)
+
+def keyframes(mesh, shapekey_name):
+    fcurve = addon.shapekey_fcurve(mesh.shape_keys.key_blocks.get(shapekey_name))
+    return fcurve.keyframe_points.co if fcurve is not None else np.empty((0, 2), dtype=np.float32)
+
+def test_moving_start_frame_shifts_keys_without_writing():
+    scene, mesh, frame_data = make_scene(), make_mesh(), make_frame_data(200)
+    assert apply(scene, mesh, frame_data, 0) == (600, 0)
+    before = keyframes(mesh, "key_aa").copy()
+    assert apply(scene, mesh, frame_data, 50) == (0, 600)
+    after = keyframes(mesh, "key_aa")
+    assert np.array_equal(after[:, 0], before[:, 0] + 50)
+    assert np.array_equal(after[:, 1], before[:, 1])
+    assert all(record.start_frame == 50 for record in mesh.shape_keys.lipsync_apply_records)
+
+def test_shorter_reapply_leaves_no_stale_keys():
+    scene, mesh = make_scene(), make_mesh()
+    apply(scene, mesh, make_frame_data(200), 0)
+    key_count, reused_count = apply(scene, mesh, make_frame_data(100, seed=1), 0)
+    assert (key_count, reused_count) == (300, 0)
+    for name in VISEMES:
+        frames = keyframes(mesh, "key_" + name)[:, 0]
+        assert len(frames) == 100 and frames.max() == 99
+
+def test_overlapping_clip_forces_rewrite():
+    scene, mesh, frame_data = make_scene(), make_mesh(), make_frame_data(200)
+    apply(scene, mesh, frame_data, 0, "first.wav")
+    apply(scene, mesh, make_frame_data(200, seed=1), 100, "second.wav")
+    # The second clip overwrote part of the first, so its keyframes are no longer intact and have to be written again
+    assert apply(scene, mesh, frame_data, 0, "first.wav") == (600, 0)
+    co = keyframes(mesh, "key_aa")
+    assert np.allclose(co[co[:, 0] < 200, 1], frame_data.frames[:, 0])
+    assert np.count_nonzero(co[:, 0] >= 200) == 100
+
+def test_mapping_change_rewrites_and_clears_unmapped_shapekeys():
+    scene, mesh, frame_data = make_scene(), make_mesh(), make_frame_data(200)
+    apply(scene, mesh, frame_data, 0)
+    addon.set_viseme_mapping(mesh, {"aa": "key_alt"})
+    next(mapping for mapping in mesh.viseme_mappings if mapping.viseme == "E").weight = 0.5
+    assert apply(scene, mesh, frame_data, 0) == (400, 200)
+    assert len(keyframes(mesh, "key_aa")) == 0
+    assert np.allclose(keyframes(mesh, "key_alt")[:, 1], frame_data.frames[:, 0])
+    assert np.allclose(keyframes(mesh, "key_E")[:, 1], frame_data.frames[:, 1] * 0.5)
+
+def test_recorded_keyframes_intact_detects_edits():
+    scene, mesh = make_scene(), make_mesh()
+    apply(scene, mesh, make_frame_data(50), 10)
+    record = next(record for record in mesh.shape_keys.lipsync_apply_records if record.shapekey == "key_oh")
+    shape = mesh.shape_keys.key_blocks.get("key_oh")
+    assert addon.recorded_keyframes_intact(shape, record.first_frame, record.last_frame, record.start_frame, record.signature, 50)
+    keyframes(mesh, "key_oh")[20, 1] += 0.25
+    assert not addon.recorded_keyframes_intact(shape, record.first_frame, record.last_frame, record.start_frame, record.signature, 50)
+
+def test_shift_replaces_keys_in_the_target_range():
+    mesh = make_mesh()
+    shape = mesh.shape_keys.key_blocks.get("key_aa")
+    fcurve = addon.shapekey_fcurve(shape, create=True)
+    fcurve.keyframe_points.add(4)
+    fcurve.keyframe_points.co[:] = [(0, 0.1), (1, 0.2), (5, 0.3), (9, 0.4)]
+    assert addon.shift_shapekey_keyframes(shape, 0, 1, 5) == 2
+    assert np.allclose(fcurve.keyframe_points.co, [(5, 0.1), (6, 0.2), (9, 0.4)])
+    assert addon.remove_shapekey_keyframes(shape, 6, 9) == 2
+    assert np.allclose(fcurve.keyframe_points.co, [(5, 0.1)])
@@ -0,0 +1,19 @@
+import bpy_stub
+
+import ovr_lipsync_release as addon
+
+def make_mesh(mapping):
+    mesh = bpy_stub.Mesh("Mesh", ["mouth_open", "mouth_wide"])
+    addon.set_viseme_mapping(mesh, mapping)
+    return mesh
+
+def test_known_visemes_are_accepted_in_any_case():
+    assert addon.viseme_mapping_problem(make_mesh({"AA": "mouth_open", "sil": "mouth_wide", "e": "mouth_wide"})) is None
+
+def test_unknown_viseme_is_reported():
+    problem = addon.viseme_mapping_problem(make_mesh({"aa": "mouth_open", "ahh": "mouth_wide"}))
+    assert problem is not None and "ahh" in problem
+
+def test_viseme_search_lists_matching_names():
+    assert addon.search_viseme_names(None, None, "") == addon.analyzer.VISEME_NAMES
+    assert addon.search_viseme_names(None, None, "o") == ["oh", "ou"]
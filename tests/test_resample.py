@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import ovr_lipsync_release as addon
+
+def make_frame_data(frame_count, viseme_count = 3):
+    frame_data = addon.FrameData()
+    frame_data.names = [f"v{index}" for index in range(viseme_count)]
+    frame_data.name_index = {name: index for index, name in enumerate(frame_data.names)}
+    frame_data.frames = np.random.default_rng(0).random((frame_count, viseme_count), dtype=np.float32)
+    return frame_data
+
+@pytest.mark.parametrize("target_fps", [24, 29.97, 60])
+@pytest.mark.parametrize("mode", [item[0] for item in addon.RESAMPLE_MODES])
+def test_resample_frame_count_matches_clip_length(target_fps, mode):
+    # Consecutive clips are placed resampled_frame_count frames apart, so resampling must not lose a frame
+    for frame_count in (1000, 999, 1001, 12345, 0):
+        resampled = make_frame_data(frame_count).resample(addon.VISEME_FPS, target_fps, mode)
+        assert len(resampled.frames) == addon.resampled_frame_count(frame_count, addon.VISEME_FPS, target_fps)
+
+def test_resampled_frame_count_rounds_down_whole_frames():
+    assert addon.resampled_frame_count(1000, 100, 24) == 240
+    assert addon.resampled_frame_count(1001, 100, 24) == 240
+    assert addon.resampled_frame_count(1000, 100, 29.97) == 299
+
+def test_resample_24_fps_keeps_last_frame():
+    assert len(make_frame_data(1000).resample(100, 24).frames) == 240
+
+RESAMPLE_SOURCE = [0.0, 1.0, 2.0, 3.0, 4.0, 8.0, 0.0, 5.0]
+"""Source values for the hand-computed resample cases, at 4 fps."""
+
+@pytest.mark.parametrize("mode, target_fps, expected", [
+    # 4 -> 3 fps: target frames start at source frames 0, 1.33, 2.67, 4, 5.33 and 6.67
+    ("NEAREST", 3, [0.0, 1.0, 2.0, 4.0, 8.0, 0.0]),
+    ("LINEAR", 3, [0.0, 4 / 3, 8 / 3, 4.0, 16 / 3, 10 / 3]),
+    ("AREA", 3, [0.25, 1.5, 2.75, 5.0, 4.0, 3.75]),
+    ("PEAK", 3, [0.0, 1.0, 3.0, 4.0, 8.0, 5.0]),
+    # 4 -> 2 fps: each target frame covers two whole source frames
+    ("NEAREST", 2, [0.0, 2.0, 4.0, 0.0]),
+    ("LINEAR", 2, [0.0, 2.0, 4.0, 0.0]),
+    ("AREA", 2, [0.5, 2.5, 6.0, 2.5]),
+    ("PEAK", 2, [1.0, 3.0, 8.0, 5.0]),
+])
+def test_resample_values(mode, target_fps, expected):
+    frame_data = make_frame_data(len(RESAMPLE_SOURCE), 1)
+    frame_data.frames[:, 0] = RESAMPLE_SOURCE
+    assert np.allclose(frame_data.resample(4, target_fps, mode).frames[:, 0], expected)
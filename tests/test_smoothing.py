@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from ovr_lipsync_release import smoothing
+
+def test_gain_threshold_zeroes_then_scales():
+    frames = np.array([[0.1, 0.5], [0.3, 0.2]], dtype=np.float32)
+    result = smoothing.apply_gain_threshold(frames, gains=[2.0, 1.0], thresholds=[0.2, 0.0])
+    assert np.allclose(result, [[0.0, 0.5], [0.6, 0.2]])
+    assert np.allclose(frames, [[0.1, 0.5], [0.3, 0.2]])
+
+def test_select_top_visemes_keeps_row_totals():
+    frames = np.array([[0.1, 0.2, 0.3, 0.4], [0.0, 0.0, 0.0, 0.0], [0.5, 0.0, 0.0, 0.25]], dtype=np.float32)
+    result = smoothing.select_top_visemes(frames, 2)
+    assert np.allclose(result[0], [0.0, 0.0, 0.3 / 0.7, 0.4 / 0.7])
+    assert np.allclose(result[1], 0.0)
+    assert np.allclose(result[2], [0.5, 0.0, 0.0, 0.25])
+    assert np.allclose(result.sum(axis=1), frames.sum(axis=1))
+    assert np.array_equal(smoothing.select_top_visemes(frames, 0), frames)
+
+def test_attack_release_envelope_ramps_around_peaks():
+    frames = np.zeros((11, 1), dtype=np.float32)
+    frames[5] = 1.0
+    result = smoothing.attack_release_envelope(frames, 2, 4)
+    assert np.allclose(result[:, 0], [0.0, 0.0, 0.0, 0.0, 0.5, 1.0, 0.75, 0.5, 0.25, 0.0, 0.0])
+
+def test_attack_release_envelope_never_lowers_peaks():
+    frames = np.random.default_rng(0).random((200, 3), dtype=np.float32)
+    assert np.all(smoothing.attack_release_envelope(frames, 3.5, 7.0) >= frames)
+
+@pytest.mark.parametrize("mode", ["EXPONENTIAL", "GAUSSIAN"])
+@pytest.mark.parametrize("width", [0.5, 3.0, 10.0])
+def test_smoothing_kernel_is_normalized_and_symmetric(mode, width):
+    kernel = smoothing.smoothing_kernel(mode, width)
+    assert len(kernel) % 2 == 1
+    assert kernel.sum() == pytest.approx(1.0, abs=1e-6)
+    assert np.array_equal(kernel, kernel[::-1])
+    assert kernel.argmax() == len(kernel) // 2
+    assert kernel[0] / kernel.max() < 2 * smoothing.KERNEL_CUTOFF
+
+def test_smoothing_kernel_without_smoothing():
+    assert np.array_equal(smoothing.smoothing_kernel("NONE", 5.0), [1.0])
+    assert np.array_equal(smoothing.smoothing_kernel("GAUSSIAN", 0.0), [1.0])
+    with pytest.raises(ValueError):
+        smoothing.smoothing_kernel("BOX", 5.0)
+
+def test_smooth_frames_keeps_constant_values_at_the_edges():
+    frames = np.full((20, 2), 0.5, dtype=np.float32)
+    assert np.allclose(smoothing.smooth_frames(frames, smoothing.smoothing_kernel("GAUSSIAN", 3.0)), 0.5)
@@ -0,0 +1,113 @@
+import bpy_stub
+import numpy as np
+import pytest
+
+import ovr_lipsync_release as addon
+from ovr_lipsync_release import tracks
+
+def make_track(frame_count = 500, frame_rate = 100.0):
+    rng = np.random.default_rng(0)
+    track = tracks.VisemeTrack(frame_rate, frame_count)
+    # Held values give sparse channels, noise gives dense ones
+    track.channels.append(tracks.TrackChannel("sil", np.arange(frame_count), np.repeat(rng.random(frame_count // 10), 10)))
+    track.channels.append(tracks.TrackChannel("aa", np.arange(frame_count), rng.random(frame_count)))
+    track.channels.append(tracks.TrackChannel("E", [0, 7, 300, frame_count - 1], [0.0, 0.5, 0.25, 1.0]))
+    return track
+
+def decode(track, layout, bits):
+    if (layout == "binary"):
+        return tracks.decode_binary(tracks.encode_binary(track, bits))
+    return tracks.decode_json(tracks.encode_json(track, bits))
+
+@pytest.mark.parametrize("layout", ["binary", "json"])
+@pytest.mark.parametrize("bits", tracks.QUANTIZATION_BITS)
+def test_track_round_trip(layout, bits):
+    track = make_track()
+    decoded = decode(track, layout, bits)
+    assert decoded.frame_rate == track.frame_rate
+    assert decoded.frame_count == track.frame_count
+    assert [channel.name for channel in decoded.channels] == [channel.name for channel in track.channels]
+    for original, channel in zip(track.channels, decoded.channels):
+        assert channel.frames[0] == original.frames[0] and channel.frames[-1] == original.frames[-1]
+        assert np.all(np.isin(channel.frames, original.frames))
+        # Dropped keys lie inside runs of equal quantized values, so interpolating the kept keys restores every key
+        step = (original.values.max() - original.values.min()) / ((1 << bits) - 1)
+        restored = np.interp(original.frames, channel.frames, channel.values)
+        assert np.abs(restored - original.values).max() <= step / 2 + 1e-6
+
+@pytest.mark.parametrize("bits", tracks.QUANTIZATION_BITS)
+def test_binary_and_json_hold_the_same_keys(bits):
+    track = make_track()
+    for binary, json in zip(decode(track, "binary", bits).channels, decode(track, "json", bits).channels):
+        assert np.array_equal(binary.frames, json.frames)
+        assert np.array_equal(binary.values, json.values)
+
+@pytest.mark.parametrize("layout", ["binary", "json"])
+def test_track_round_trip_with_long_gaps(layout):
+    # Gaps over 65535 frames do not fit the 16-bit frame differences
+    track = tracks.VisemeTrack(100.0, 200000, [tracks.TrackChannel("ou", [0, 5, 70000, 199999], [0.0, 1.0, 0.5, 0.0])])
+    channel = decode(track, layout, 16).channels[0]
+    assert list(channel.frames) == [0, 5, 70000, 199999]
+    assert np.allclose(channel.values, [0.0, 1.0, 0.5, 0.0], atol=1e-4)
+
+def test_sparse_channels_drop_held_keys():
+    decoded = decode(make_track(), "binary", 16)
+    assert len(decoded.channels[0].frames) < 0.3 * 500
+    assert len(decoded.channels[1].frames) == 500
+
+def test_save_track_picks_layout_from_extension(tmp_path):
+    track = make_track()
+    tracks.save_track(track, str(tmp_path / "track.json"), 8)
+    tracks.save_track(track, str(tmp_path / "track.ovlt"), 8)
+    assert (tmp_path / "track.json").read_bytes().startswith(b"{")
+    assert (tmp_path / "track.ovlt").read_bytes().startswith(tracks.TRACK_MAGIC)
+    for name in ("track.json", "track.ovlt"):
+        assert tracks.load_track(str(tmp_path / name)).frame_count == track.frame_count
+
+def test_decode_binary_rejects_other_data():
+    with pytest.raises(ValueError):
+        tracks.decode_binary(b"RIFF" + bytes(100))
+    with pytest.raises(ValueError):
+        tracks.decode_binary(tracks.encode_binary(make_track())[:-10])
+
+def test_simplify_keyframes_respects_tolerance():
+    frames = np.arange(1000, dtype=np.float64)
+    values = (np.sin(frames / 30.0) + np.random.default_rng(0).normal(0, 0.01, 1000)).astype(np.float32)
+    for tolerance in (0.01, 0.05, 0.2):
+        kept = addon.simplify_keyframes(frames, values, tolerance)
+        assert kept[0] == 0 and kept[-1] == 999
+        assert np.abs(np.interp(frames, frames[kept], values[kept]) - values).max() <= tolerance + 1e-6
+
+def test_simplify_keyframes_collapses_straight_lines():
+    frames = np.arange(100, dtype=np.float64)
+    assert list(addon.simplify_keyframes(frames, frames * 0.01, 1e-4)) == [0, 99]
+
+def make_mesh(names):
+    mesh = bpy_stub.Mesh("Mesh", ["key_" + name for name in names])
+    addon.set_viseme_mapping(mesh, {name: "key_" + name for name in names})
+    return mesh
+
+@pytest.mark.parametrize("scene_fps", [100, 24])
+def test_import_writes_track_keys(tmp_path, scene_fps):
+    track = make_track()
+    track_file_path = str(tmp_path / "track.ovlt")
+    tracks.save_track(track, track_file_path)
+    saved = tracks.load_track(track_file_path)
+    mesh = make_mesh([channel.name for channel in track.channels])
+    loaded, key_count, _, _, _, _ = addon.import_viseme_track(bpy_stub.Scene(scene_fps), [mesh], track_file_path, 10)
+    assert loaded.frame_count == track.frame_count
+    assert key_count == sum(len(channel.frames) for channel in saved.channels)
+    for channel in saved.channels:
+        points = addon.shapekey_fcurve(mesh.shape_keys.key_blocks.get("key_" + channel.name)).keyframe_points
+        assert np.allclose(points.co[:, 0], channel.frames * (scene_fps / track.frame_rate) + 10)
+        assert np.allclose(points.co[:, 1], channel.values)
+        assert np.all(points.interpolation == addon.INTERPOLATION_LINEAR)
+
+def test_import_sums_visemes_sharing_a_shapekey():
+    track = tracks.VisemeTrack(24.0, 100, [tracks.TrackChannel("aa", [0, 50, 99], [0.0, 0.5, 0.0]), tracks.TrackChannel("E", [0, 20, 99], [0.0, 0.25, 0.25])])
+    mesh = bpy_stub.Mesh("Mesh", ["mouth"])
+    addon.set_viseme_mapping(mesh, {"aa": "mouth", "E": "mouth"})
+    keyframes, _ = addon.build_track_keyframes(bpy_stub.Scene(24), [mesh], track, 0)
+    (_, frames, values), = keyframes
+    assert list(frames) == [0, 20, 50, 99]
+    assert np.allclose(values, [0.0, 0.45, 0.75, 0.25])